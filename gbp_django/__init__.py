@@ -1 +1,4 @@
-# This file makes the directory a Python package
\ No newline at end of file
+# This file makes the directory a Python package
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
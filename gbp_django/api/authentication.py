@@ -2,6 +2,7 @@ import os
 import json
 import requests
 import logging
+from .client import GBPClient, api_url
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.contrib.sessions.backends.db import SessionStore
@@ -11,18 +12,14 @@ logger = logging.getLogger(__name__)
 
 def get_business_account_id(access_token):
     """Fetch the Google Business Account ID for the authenticated user"""
-    url = "https://mybusinessbusinessinformation.googleapis.com/v1/accounts"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    url = api_url('business_information', 'accounts')
     
     try:
         logger.info("🏢 Fetching business account ID...")
         logger.debug(f"Making request to: {url}")
         logger.debug(f"Using token (first 10 chars): {access_token[:10]}...")
         
-        response = requests.get(url, headers=headers)
+        response = GBPClient(access_token).get('business_information', 'accounts')
         response.raise_for_status()
         
         accounts_data = response.json()
@@ -50,17 +47,13 @@ def get_business_locations(access_token, account_id):
         logger.error("❌ No account ID provided")
         return None
         
-    url = f"https://mybusinessbusinessinformation.googleapis.com/v1/{account_id}/locations"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    url = api_url('business_information', f"{account_id}/locations")
     
     try:
         logger.info(f"🏪 Fetching business locations for account: {account_id}")
         logger.debug(f"Making request to: {url}")
         
-        response = requests.get(url, headers=headers)
+        response = GBPClient(access_token).get('business_information', f"{account_id}/locations")
         response.raise_for_status()
         
         locations_data = response.json()
@@ -83,7 +76,7 @@ def get_business_locations(access_token, account_id):
 
 def get_access_token(auth_code, client_id, client_secret, redirect_uri):
     logger.info("\n🔑 Starting OAuth token exchange...")
-    url = "https://oauth2.googleapis.com/token"
+    url = api_url('oauth', 'token')
     payload = {
         "code": auth_code,
         "client_id": client_id,
@@ -95,7 +88,8 @@ def get_access_token(auth_code, client_id, client_secret, redirect_uri):
     print(f"🔐 Using client_id: {client_id[:8]}...")
     print(f"🔄 Redirect URI: {redirect_uri}")
     
-    response = requests.post(url, data=payload)
+    # Authorization codes are single-use, so only a 429 is retried
+    response = GBPClient().post('oauth', 'token', data=payload)
     response.raise_for_status()
     token_data = response.json()
     
@@ -114,7 +108,6 @@ def refresh_access_token(refresh_token, client_id, client_secret, redirect_uri=N
     Returns dict with new token info including calculated expiry timestamp
     """
     logger.info("\n🔄 Refreshing access token...")
-    url = "https://oauth2.googleapis.com/token"
     payload = {
         "client_id": client_id,
         "client_secret": client_secret,
@@ -124,7 +117,8 @@ def refresh_access_token(refresh_token, client_id, client_secret, redirect_uri=N
     }
     
     try:
-        response = requests.post(url, data=payload)
+        # Refreshing is safe to repeat
+        response = GBPClient().post('oauth', 'token', data=payload, idempotent=True)
         response.raise_for_status()
         token_data = response.json()
         # Add absolute expiration timestamp
@@ -139,16 +133,12 @@ def refresh_access_token(refresh_token, client_id, client_secret, redirect_uri=N
         raise
 def get_user_info(access_token):
     logger.info("\n👤 Fetching Google user info...")
-    url = "https://openidconnect.googleapis.com/v1/userinfo"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    url = api_url('openid', 'userinfo')
     
     try:
         logger.info(f"📡 Making userinfo request to: {url}")
         logger.debug(f"Using token (first 10 chars): {access_token[:10]}...")
-        response = requests.get(url, headers=headers)
+        response = GBPClient(access_token).get('openid', 'userinfo')
         response.raise_for_status()
         user_data = response.json()
         # Add fallback for email if not in response
@@ -175,8 +165,7 @@ def get_user_info(access_token):
             )
             session['google_token'] = new_token['access_token']
             session.save()
-            headers["Authorization"] = f"Bearer {new_token['access_token']}"
-            response = requests.get(url, headers=headers)
+            response = GBPClient(new_token['access_token']).get('openid', 'userinfo')
             response.raise_for_status()
             return response.json()
         else:
@@ -3,12 +3,14 @@ import json
 import asyncio
 import logging
 
+from asgiref.sync import sync_to_async
 from django.http import JsonResponse, HttpResponseNotFound, HttpResponseBadRequest
 from django.views.decorators.csrf import csrf_exempt
 
 from gbp_django.models import Business
 from gbp_django.utils.llm_reasoning import generate_compliance_reasoning
 from gbp_django.utils.automations import FallbackGBPAgent
+from gbp_django.utils.location_edits import queue_location_edit
 
 @csrf_exempt
 def automation_fallback(request, business_id):
@@ -52,7 +54,11 @@ def automation_fallback(request, business_id):
             target = action.get("target")
             details = action.get("details")
             logging.info(f"[{business.business_id} Automation] Processing action: {action}")
-            if target == "website" and action_type in ("update", "fallback_update"):
+            if target == "website" and action_type == "update" and details:
+                # Written through the API by the edit queue's worker
+                edit = await sync_to_async(queue_location_edit)(business, {"website_url": details}, source="automation")
+                results.append({"action": action, "result": {"status": "queued", "edit_id": edit.pk}})
+            elif target == "website" and action_type == "fallback_update":
                 result = await agent.update_business_info(
                     business_url=business.website_url,
                     new_hours=getattr(business, "hours", "Mon-Fri 09:00-17:00"),
@@ -1,36 +1,36 @@
 import time
 import random
+import hashlib
 import requests
 import json
+from .client import GBPClient, api_url, collect_pages, fan_out, invalidate_resource, user_scope
 from datetime import datetime, timedelta
+from django.utils.dateparse import parse_datetime
 
 # Log the module load and path to ensure the updated module is in use.
 print(f"[INFO] business_management module loaded from: {__file__}")
 print("[INFO] Using updated endpoints: Account details -> https://mybusinessaccountmanagement.googleapis.com/v1/accounts, Locations -> https://mybusinessbusinessinformation.googleapis.com/v1/{account_id}/locations")
 
+LOCATIONS_PAGE_SIZE = 100  # largest page the Business Information API allows
+
 
 # ======================
 # ACCOUNT & LOCATION FETCHING
 # ======================
 
-def get_account_details(access_token):
+def get_account_details(access_token, user_id=None):
     """
     Fetch the full account details using the My Business Account Management API.
     This endpoint is current and works with the 'mybusiness.account' scope.
+    Cached per user (``user_id``, the token owner).
     """
     print("\n[INFO] get_account_details: Using Google Business Profile API endpoint.")
-    url = "https://mybusinessbusinessinformation.googleapis.com/v1/accounts"
+    url = api_url('business_information', 'accounts')
     print(f"[DEBUG] get_account_details: GET URL: {url}")
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        print(f"[DEBUG] get_account_details: Response status code: {response.status_code}")
-        print(f"[DEBUG] get_account_details: Response headers: {response.headers}")
-        data = response.json()
+        # The account list depends on who is asking, so cache it per user
+        data = GBPClient(access_token).get_resource('business_information', 'accounts',
+                                                    scope=user_scope(user_id, access_token))
         print("[DEBUG] get_account_details: Response data:")
         print(json.dumps(data, indent=2))
         return data
@@ -41,12 +41,12 @@ def get_account_details(access_token):
         return {}
 
 
-def get_business_account_id(access_token):
+def get_business_account_id(access_token, user_id=None):
     """
     Obtain the first business account ID from the account details.
     """
     print("\n[INFO] get_business_account_id: Calling get_account_details()")
-    data = get_account_details(access_token)
+    data = get_account_details(access_token, user_id)
     accounts = data.get("accounts", [])
     if not accounts:
         print("[ERROR] get_business_account_id: No accounts found in account details.")
@@ -56,29 +56,29 @@ def get_business_account_id(access_token):
     return account_id
 
 
-def get_user_locations(access_token):
+def iter_locations(access_token, account_id, page_size=LOCATIONS_PAGE_SIZE):
+    """
+    Yield pages of an account's locations from the Business Information API,
+    following nextPageToken.
+    """
+    return GBPClient(access_token).iter_pages('business_information', f"{account_id}/locations",
+                                              page_size=page_size)
+
+
+def get_user_locations(access_token, user_id=None):
     """
     Fetch the list of locations associated with the business account
     using the Business Information API.
     """
     print("\n[INFO] get_user_locations: Fetching locations using the Business Information API.")
-    account_id = get_business_account_id(access_token)
+    account_id = get_business_account_id(access_token, user_id)
     if not account_id:
         print("[ERROR] get_user_locations: No valid account ID; cannot fetch locations.")
         return {"locations": []}
-    url = f"https://mybusinessbusinessinformation.googleapis.com/v1/{account_id}/locations"
+    url = api_url('business_information', f"{account_id}/locations")
     print(f"[DEBUG] get_user_locations: GET URL: {url}")
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        print(f"[DEBUG] get_user_locations: Response status code: {response.status_code}")
-        data = response.json()
-        print("[DEBUG] get_user_locations: Response data:")
-        print(json.dumps(data, indent=2))
+        data = collect_pages(iter_locations(access_token, account_id), 'locations')
         if not data.get('locations'):
             print("[WARNING] get_user_locations: No locations found in the response.")
         else:
@@ -91,31 +91,34 @@ def get_user_locations(access_token):
                 print(f"  • Address: {addr}")
         return data
     except requests.exceptions.HTTPError as e:
-        response_content = response.text if response else 'No response content'
         print(f"[ERROR] get_user_locations: HTTPError: {e}")
-        print(f"[ERROR] get_user_locations: Response content: {response_content}")
+        print(f"[ERROR] get_user_locations: Response content: {e.response.text}")
         return {"locations": []}
     except requests.exceptions.RequestException as e:
         print(f"[ERROR] get_user_locations: Request exception: {e}")
         return {"locations": []}
 
 
-def get_location_details(access_token, location_id):
+def fetch_location_details(access_token, location_id, user_id=None):
+    """
+    Fetch one location's details through the resource cache, raising on failure (used by
+    the concurrent fan-out). Cached per user (``user_id``, the token owner): what a
+    location returns depends on the caller's access to it, so one user's copy is never
+    served to another.
+    """
+    return GBPClient(access_token).get_resource('business_profile', location_id,
+                                                scope=user_scope(user_id, access_token))
+
+
+def get_location_details(access_token, location_id, user_id=None):
     """
     Fetch detailed information for a single location using the Business Information API.
     """
     print(f"\n[INFO] get_location_details: Fetching details for location: {location_id}")
-    url = f"https://businessprofile.googleapis.com/v1/{location_id}"
+    url = api_url('business_profile', location_id)
     print(f"[DEBUG] get_location_details: GET URL: {url}")
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        print(f"[DEBUG] get_location_details: Response status code: {response.status_code}")
-        data = response.json()
+        data = fetch_location_details(access_token, location_id, user_id)
         print("[DEBUG] get_location_details: Response data:")
         print(json.dumps(data, indent=2))
         return data
@@ -124,32 +127,40 @@ def get_location_details(access_token, location_id):
         return {}
 
 
-def get_all_business_details(access_token):
+def get_all_business_details(access_token, user_id=None):
     """
     Collect all available business details:
       - Full account details,
       - A list of locations (basic details),
-      - Detailed info for each location.
-    Returns a dictionary with keys: 'account_details', 'locations', 'detailed_locations'.
+      - Detailed info for each location, fetched concurrently.
+    Returns a dictionary with keys: 'account_details', 'locations', 'detailed_locations'
+    (in location order, {} where a fetch failed) and 'failed_locations'.
     """
     print("\n[INFO] get_all_business_details: Starting collection of all business details.")
-    account_details = get_account_details(access_token)
-    locations_data = get_user_locations(access_token)
-    detailed_locations = []
+    account_details = get_account_details(access_token, user_id)
+    locations_data = get_user_locations(access_token, user_id)
+    loc_ids = []
     for location in locations_data.get("locations", []):
-        loc_id = location.get("name")
-        if loc_id:
-            print(f"[INFO] get_all_business_details: Fetching details for location {loc_id}")
-            details = get_location_details(access_token, loc_id)
-            detailed_locations.append(details)
+        if location.get("name"):
+            loc_ids.append(location["name"])
         else:
             print("[WARNING] get_all_business_details: Encountered location without a 'name' field.")
+    print(f"[INFO] get_all_business_details: Fetching details for {len(loc_ids)} location(s)")
+    detailed_locations = []
+    failed_locations = []
+    for loc_id, (details, error) in zip(loc_ids, fan_out(lambda loc: fetch_location_details(access_token, loc, user_id), loc_ids)):
+        if error:
+            print(f"[ERROR] get_all_business_details: Failed to fetch details for {loc_id}: {error}")
+            failed_locations.append({"location": loc_id, "error": str(error)})
+        detailed_locations.append(details or {})
     all_details = {
         "account_details": account_details,
         "locations": locations_data.get("locations", []),
-        "detailed_locations": detailed_locations
+        "detailed_locations": detailed_locations,
+        "failed_locations": failed_locations
     }
-    print("[INFO] get_all_business_details: Completed collection of business details.")
+    print(f"[INFO] get_all_business_details: Completed collection of business details "
+          f"({len(failed_locations)} failure(s)).")
     return all_details
 
 
@@ -157,21 +168,23 @@ def get_all_business_details(access_token):
 # UPDATING BUSINESS DETAILS
 # ======================
 
-def update_business_details(access_token, location_id, update_data):
+def update_business_details(access_token, location_id, update_data, update_mask=None):
     """
     Update business details for a given location using the Business Information API.
+    Only the fields in ``update_mask`` (default: the keys of ``update_data``) are changed.
     """
     print(f"\n[INFO] update_business_details: Updating details for location: {location_id}")
-    url = f"https://mybusinessbusinessinformation.googleapis.com/v1/{location_id}?updateMask={','.join(update_data.keys())}"
-    print(f"[DEBUG] update_business_details: PATCH URL: {url}")
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    url = api_url('business_information', location_id)
+    params = {"updateMask": ",".join(update_mask or update_data.keys())}
+    print(f"[DEBUG] update_business_details: PATCH URL: {url} {params}")
     print("[DEBUG] update_business_details: Update payload:")
     print(json.dumps(update_data, indent=2))
     try:
-        response = requests.patch(url, headers=headers, json=update_data)
+        try:
+            response = GBPClient(access_token).patch('business_information', location_id, params=params, json=update_data)
+        finally:
+            # Even a failed PATCH may have been applied; don't keep serving the old copy
+            invalidate_resource(location_id)
         response.raise_for_status()
         result = response.json()
         print("[INFO] update_business_details: Update successful.")
@@ -200,34 +213,33 @@ def get_locations_with_verification(access_token, account_id):
     if not account_id.startswith("accounts/"):
         account_id = f"accounts/{account_id}"
         print(f"[DEBUG] get_locations_with_verification: Adjusted account ID: {account_id}")
-    url = f"https://mybusinessbusinessinformation.googleapis.com/v1/{account_id}/locations"
+    url = api_url('business_information', f"{account_id}/locations")
     print(f"[DEBUG] get_locations_with_verification: GET URL: {url}")
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    client = GBPClient(access_token)
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        locations_data = response.json()
-        print("[DEBUG] get_locations_with_verification: Locations response:")
-        print(json.dumps(locations_data, indent=2))
+        locations_data = collect_pages(iter_locations(access_token, account_id), 'locations')
 
         if 'locations' in locations_data:
             print(f"[INFO] get_locations_with_verification: Retrieved {len(locations_data['locations'])} location(s).")
-            for location in locations_data['locations']:
-                verification_url = f"https://mybusinessverifications.googleapis.com/v1/{location['name']}/verification"
-                print(f"[DEBUG] get_locations_with_verification: GET Verification URL: {verification_url}")
-                ver_response = requests.get(verification_url, headers=headers)
-                if ver_response.ok:
-                    ver_data = ver_response.json()
-                    location['verification_state'] = ver_data.get('state', 'UNVERIFIED')
-                    location['verification_method'] = ver_data.get('method', 'NONE')
-                    print(
-                        f"[INFO] Verification for {location['name']}: {location['verification_state']} via {location['verification_method']}")
-                else:
+
+            def fetch_verification(location):
+                response = client.get('verifications', f"{location['name']}/verification")
+                response.raise_for_status()
+                return response.json()
+
+            failed = []
+            results = fan_out(fetch_verification, locations_data['locations'])
+            for location, (ver_data, error) in zip(locations_data['locations'], results):
+                if error:
                     print(
-                        f"[WARNING] get_locations_with_verification: Could not retrieve verification for {location['name']}")
+                        f"[WARNING] get_locations_with_verification: Could not retrieve verification for {location['name']}: {error}")
+                    failed.append({"location": location['name'], "error": str(error)})
+                    continue
+                location['verification_state'] = ver_data.get('state', 'UNVERIFIED')
+                location['verification_method'] = ver_data.get('method', 'NONE')
+                print(
+                    f"[INFO] Verification for {location['name']}: {location['verification_state']} via {location['verification_method']}")
+            locations_data['failed_verifications'] = failed
         else:
             print("[WARNING] get_locations_with_verification: No 'locations' key in response.")
         return locations_data
@@ -250,79 +262,164 @@ get_locations = get_locations_with_verification
 # STORING DATA & CALCULATIONS (AS BEFORE)
 # ======================
 
-from django.db import transaction
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from ..models import Business
-import traceback
+from .upsert import bulk_upsert
+from ..models import Business, PendingLocationEdit
 
 
-@transaction.atomic
-def store_business_data(locations_data, user_id, access_token):
+# Business fields refreshed from the API when a location is re-imported
+LOCATION_UPDATE_FIELDS = [
+    'user_id', 'google_location_id', 'business_name', 'address', 'phone_number', 'website_url', 'category',
+    'description', 'verification_status', 'verification_method', 'is_verified', 'profile_photo_url',
+    'is_connected', 'remote_field_hashes', 'remote_update_time',
+]
+
+# Fields users edit through update_business that are written through the API:
+# (Business field, submitted key, updateMask path). Category isn't one: the API sets it
+# by category id (gcid), which isn't stored, so it stays on the browser-agent path.
+LOCATION_EDIT_FIELDS = [
+    ('business_name', 'business_name', 'title'),
+    ('address', 'address', 'storefrontAddress.addressLines'),
+    ('phone_number', 'phone', 'phoneNumbers.primaryPhone'),
+    ('website_url', 'website', 'websiteUri'),
+]
+
+
+def field_hash(value):
+    return hashlib.sha256(str(value or '').strip().encode('utf-8')).hexdigest()[:16]
+
+
+def remote_field_hashes(business):
+    """Hashes of the editable fields of a Business just read from Google"""
+    return {field: field_hash(getattr(business, field)) for field, _, _ in LOCATION_EDIT_FIELDS}
+
+
+def location_changes(business, submitted):
     """
-    Map each location from the API response to your Business model.
+    The submitted fields that differ from the business as last synced with Google:
+    (Business field, new value, updateMask path) tuples. Fields never synced are
+    compared with the local value.
     """
-    print("\n[INFO] store_business_data: Storing business data into the database.")
-    print(f"[INFO] store_business_data: Target user_id: {user_id}")
-    print(f"[INFO] store_business_data: Access token prefix: {access_token[:8]}...")
+    keys = {key: field for field, key, _ in LOCATION_EDIT_FIELDS}
+    return location_field_changes(business, {keys[key]: value for key, value in submitted.items() if key in keys})
 
-    stored_businesses = []
-    locations = locations_data.get('locations', [])
-    print(f"[INFO] store_business_data: Received {len(locations)} location(s) for processing.")
 
+def location_field_changes(business, values):
+    """``location_changes`` for values keyed by Business field"""
+    synced = business.remote_field_hashes or {}
+    changes = []
+    for field, _, mask in LOCATION_EDIT_FIELDS:
+        if field not in values:
+            continue
+        value = values[field]
+        if field_hash(value) != synced.get(field, field_hash(getattr(business, field))):
+            changes.append((field, value, mask))
+    return changes
+
+
+def location_patch(changes, remote=None):
+    """
+    PATCH body and updateMask for ``location_changes`` output. Business.address is
+    the first address line; the rest are taken from ``remote`` (the location as
+    Google has it), since the mask replaces the whole list.
+    """
+    body = {}
+    for _, value, mask in changes:
+        *parents, leaf = mask.split('.')
+        node = body
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        if leaf == 'addressLines':
+            lines = list(((remote or {}).get('storefrontAddress') or {}).get('addressLines') or [])
+            value = [value] + lines[1:]
+        node[leaf] = value
+    return body, [mask for _, _, mask in changes]
+
+
+def _business_row(location, user):
+    """Map a location from the API response to an unsaved Business"""
+    metadata = location.get('metadata', {})
+    profile = location.get('profile', {})
+    category = location.get('categories', {}).get('primaryCategory') or location.get('primaryCategory', {})
+    business = Business(
+        user=user,
+        business_id=location['name'],  # the location name is the unique business identifier
+        google_location_id=location['name'],
+        business_name=location.get('title', 'Unnamed Business'),
+        address=(location.get('storefrontAddress', {}).get('addressLines') or [''])[0],
+        phone_number=location.get('phoneNumbers', {}).get('primaryPhone') or location.get('regularPhone', ''),
+        website_url=location.get('websiteUri') or location.get('websiteUrl', ''),
+        category=category.get('displayName', ''),
+        description=profile.get('description', ''),
+        verification_status=location.get('verification_state', metadata.get('verificationState', 'UNVERIFIED')),
+        verification_method=location.get('verification_method', 'NONE'),
+        is_verified=metadata.get('verificationState', '') == 'VERIFIED',
+        profile_photo_url=profile.get('profilePhotoUrl', ''),
+        is_connected=True,
+    )
+    business.remote_field_hashes = remote_field_hashes(business)
+    business.remote_update_time = parse_datetime(location['updateTime']) if location.get('updateTime') else None
+    return business
+
+
+def _invalidate_businesses(businesses):
+    # bulk_create bypasses the post_save receiver that normally does this
+    from ..utils.llm_reasoning import invalidate_compliance_reasoning
+    for business in businesses:
+        invalidate_compliance_reasoning(business.business_id)
+
+
+def _keep_pending_edits(rows):
+    """
+    Re-apply edits not yet pushed to Google (utils.location_edits) onto freshly
+    mapped rows, so a re-import doesn't revert them. Their fields keep the sync
+    baseline the edit was made against, which the push checks for conflicts.
+    """
+    edits = (PendingLocationEdit.objects
+             .filter(business__business_id__in=[row.business_id for row in rows], status__in=('pending', 'pushing'))
+             .order_by('created_at')
+             .values_list('business__business_id', 'changes', 'business__remote_field_hashes'))
+    pending = {}
+    for business_id, changes, synced in edits:
+        merged, _ = pending.get(business_id, ({}, synced))
+        pending[business_id] = ({**merged, **changes}, synced or {})
+    for row in rows:
+        if row.business_id not in pending:
+            continue
+        changes, synced = pending[row.business_id]
+        for field, value in changes.items():
+            setattr(row, field, value)
+            if field in synced:
+                row.remote_field_hashes[field] = synced[field]
+
+
+def store_business_data(locations_data, user_id, access_token):
+    """
+    Map every location from the API response to a Business in one pass and upsert
+    them keyed on business_id, writing only locations whose fields changed. Returns
+    counts of created, updated and unchanged businesses.
+    """
+    counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+    locations = [location for location in locations_data.get('locations', []) if location.get('name')]
+    print(f"[INFO] store_business_data: Received {len(locations)} location(s) for user {user_id}.")
     if not locations:
-        print("[INFO] store_business_data: No location data available; exiting storage process.")
-        return stored_businesses
+        return counts
 
     User = get_user_model()
     try:
         user = User.objects.get(pk=user_id)
-        print(f"[INFO] store_business_data: Retrieved user: {user} (ID: {user_id})")
-    except Exception as e:
-        print(f"[ERROR] store_business_data: Failed to retrieve user with ID {user_id}: {e}")
-        return stored_businesses
-
-    for location in locations:
-        try:
-            location_id = location.get('name')
-            print(f"\n[INFO] store_business_data: Processing location with ID: {location_id}")
-            business_defaults = {
-                'user': user,
-                'google_location_id': location_id,
-                'business_name': location.get('title', 'Unnamed Business'),
-                'address': location.get('storefrontAddress', {}).get('addressLines', [''])[0],
-                'phone_number': location.get('regularPhone', ''),
-                'website_url': location.get('websiteUrl', ''),
-                'category': location.get('primaryCategory', {}).get('displayName', ''),
-                'description': location.get('profile', {}).get('description', ''),
-                'verification_status': location.get('verification_state',
-                                                    location.get('metadata', {}).get('verificationState',
-                                                                                     'UNVERIFIED')),
-                'verification_method': location.get('verification_method', 'NONE'),
-                'is_verified': location.get('metadata', {}).get('verificationState', '') == 'VERIFIED',
-                'profile_photo_url': location.get('profile', {}).get('profilePhotoUrl', ''),
-                'is_connected': True,
-            }
-            print("[INFO] store_business_data: Mapped business details:")
-            for key, value in business_defaults.items():
-                print(f"  - {key}: {value}")
-
-            # Use the location 'name' as the unique business identifier.
-            business_id = location_id
-            business_obj, created = Business.objects.update_or_create(
-                business_id=business_id,
-                defaults=business_defaults
-            )
-            action = 'Created' if created else 'Updated'
-            print(
-                f"[INFO] store_business_data: {action} business: {business_obj.business_name} (DB ID: {business_obj.id})")
-            stored_businesses.append(business_obj)
-        except Exception as e:
-            print(f"[ERROR] store_business_data: Error processing location {location.get('name')}: {e}")
-            traceback.print_exc()
-            continue
-
-    print(f"[INFO] store_business_data: Completed storage; total businesses stored/updated: {len(stored_businesses)}")
-    return stored_businesses
+    except User.DoesNotExist:
+        print(f"[ERROR] store_business_data: No user with ID {user_id}")
+        return counts
+
+    rows = [_business_row(location, user) for location in locations]
+    _keep_pending_edits(rows)
+    counts = bulk_upsert(Business, rows, 'business_id', LOCATION_UPDATE_FIELDS,
+                         settings.LOCATION_SYNC_BATCH_SIZE, on_write=_invalidate_businesses)
+    print(f"[INFO] store_business_data: {counts['created']} created, {counts['updated']} updated, "
+          f"{counts['unchanged']} unchanged.")
+    return counts
 
 
 def calculate_compliance_score(location_data):
@@ -0,0 +1,287 @@
+import hashlib
+import random
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .quota import get_quota_manager, quota_method_name
+
+logger = logging.getLogger(__name__)
+
+# Base URL of each Google API family the app talks to; settings.GBP_API_BASE_URL
+# serves them all from one host (e.g. benchmarks.gbp_emulator), and
+# settings.GBP_API_BASE_URLS overrides single families
+API_BASE_URLS = {
+    'v4': 'https://mybusiness.googleapis.com/v4',
+    'business_information': 'https://mybusinessbusinessinformation.googleapis.com/v1',
+    'account_management': 'https://mybusinessaccountmanagement.googleapis.com/v1',
+    'verifications': 'https://mybusinessverifications.googleapis.com/v1',
+    'business_profile': 'https://businessprofile.googleapis.com/v1',
+    'oauth': 'https://oauth2.googleapis.com',
+    'openid': 'https://openidconnect.googleapis.com/v1',
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'PATCH'}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def api_url(api, path=''):
+    """Absolute URL for ``path`` under the given API family"""
+    bases = dict(API_BASE_URLS)
+    if settings.GBP_API_BASE_URL:
+        bases = {family: f"{settings.GBP_API_BASE_URL.rstrip('/')}/{family}" for family in bases}
+    base = {**bases, **settings.GBP_API_BASE_URLS}[api].rstrip('/')
+    return f"{base}/{path.lstrip('/')}" if path else base
+
+
+def get_session():
+    """
+    Process-wide session, so connections (and their TLS handshakes) are reused across
+    calls. Created lazily so forked Celery workers each get their own pool.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=len(API_BASE_URLS),
+                                      pool_maxsize=settings.GBP_HTTP_POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def resource_cache_key(path, scope=''):
+    """Cache key for a resource; ``scope`` separates per-user views of the same path"""
+    return f"gbp:resource:{scope}:{path.strip('/')}"
+
+
+def _invalidated_key(path):
+    return f"gbp:resource-invalidated:{path.strip('/')}"
+
+
+def user_scope(user_id, access_token=None):
+    """
+    Cache scope for resources whose view depends on who is asking. Keyed by the
+    app user, so entries outlive the hourly token refresh; callers that can't say
+    who is asking fall back to the token itself.
+    """
+    if user_id is not None:
+        return f"user:{user_id}"
+    return 'token:' + hashlib.sha256(access_token.encode('utf-8')).hexdigest()[:16]
+
+
+def invalidate_resource(path, scope=''):
+    """
+    Drop a cached resource, e.g. after we changed it ourselves. Entries cached for
+    the same path under other scopes are invalidated too: the time is recorded per
+    path and entries fetched before it are refetched.
+    """
+    cache.delete(resource_cache_key(path, scope))
+    cache.set(_invalidated_key(path), time.time(), settings.GBP_RESOURCE_CACHE_MAX_AGE)
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - timezone.now()).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class GBPClient:
+    """
+    Thin wrapper over the shared session for Google Business Profile APIs: sets the
+    auth header and a default timeout, and retries rate-limited (429) and transient
+    (5xx, connection) failures with exponential backoff and full jitter, honouring
+    Retry-After. Non-idempotent requests (POST) are only retried on 429, which Google
+    returns before doing any work, unless the caller marks them idempotent.
+
+    Responses are returned as-is once retries are exhausted; callers keep using
+    raise_for_status(). Every attempt first takes a slot from the API family's quota
+    bucket, waiting for one if needed.
+    """
+
+    def __init__(self, access_token=None, timeout=None, max_retries=None, session=None, quota=None):
+        self.access_token = access_token
+        self.timeout = timeout or settings.GBP_HTTP_TIMEOUT
+        self.max_retries = settings.GBP_HTTP_MAX_RETRIES if max_retries is None else max_retries
+        self.session = session or get_session()
+        self.quota = quota or get_quota_manager()
+
+    def headers(self, extra=None):
+        # requests sets Content-Type from json=/data=
+        headers = {}
+        if self.access_token:
+            headers["Authorization"] = f"Bearer {self.access_token}"
+        headers.update(extra or {})
+        return headers
+
+    def backoff(self, attempt, retry_after=None):
+        """Delay before retry number ``attempt`` (0-based)"""
+        if retry_after is not None:
+            # The server told us when to come back; add a little jitter so callers don't stampede
+            return retry_after + random.uniform(0, settings.GBP_HTTP_BACKOFF_BASE)
+        ceiling = min(settings.GBP_HTTP_BACKOFF_MAX, settings.GBP_HTTP_BACKOFF_BASE * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def request(self, method, api, path='', idempotent=None, headers=None, quota_method=None, **kwargs):
+        method = method.upper()
+        url = api_url(api, path)
+        quota_method = quota_method or quota_method_name(method, path)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        kwargs.setdefault('timeout', self.timeout)
+        headers = self.headers(headers)
+
+        attempt = 0
+        while True:
+            self.quota.acquire(api, quota_method)
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f"{method} {url} failed ({e}); retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+            else:
+                status = response.status_code
+                if status not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                if status != 429 and not idempotent:
+                    return response
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if retry_after is not None and retry_after > settings.GBP_HTTP_BACKOFF_MAX:
+                    # Not worth holding a worker for; let the caller reschedule
+                    logger.warning(f"{method} {url} returned {status} with Retry-After {retry_after:.0f}s; giving up")
+                    return response
+                delay = self.backoff(attempt, retry_after)
+                logger.warning(f"{method} {url} returned {status}; retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def iter_pages(self, api, path='', page_size=None, params=None, **kwargs):
+        """
+        Yield each page (the decoded response body) of a list call, following
+        nextPageToken, so callers can process one page at a time in bounded memory.
+        Raises HTTPError on a failed page.
+        """
+        params = dict(params or {})
+        if page_size:
+            params['pageSize'] = page_size
+        while True:
+            response = self.get(api, path, params=params, **kwargs)
+            response.raise_for_status()
+            page = response.json()
+            yield page
+            token = page.get('nextPageToken')
+            if not token:
+                return
+            params['pageToken'] = token
+
+    def get_resource(self, api, path, scope=''):
+        """
+        GET a single resource through the resource cache. Entries younger than
+        GBP_RESOURCE_CACHE_TTL are served without a request; older ones are revalidated
+        with If-None-Match when the API gave an ETag (a 304 just renews the entry) and
+        refetched otherwise. Entries record the resource's updateTime when present.
+        ``scope`` keeps per-user views apart (see ``user_scope``). Raises HTTPError on failure.
+        """
+        key, invalidated_key = resource_cache_key(path, scope), _invalidated_key(path)
+        cached = cache.get_many([key, invalidated_key])
+        entry = cached.get(key)
+        if entry and entry['fetched_at'] <= cached.get(invalidated_key, 0):
+            entry = None
+        now = time.time()
+        if entry and now - entry['fetched_at'] < settings.GBP_RESOURCE_CACHE_TTL:
+            return entry['data']
+
+        headers = {'If-None-Match': entry['etag']} if entry and entry.get('etag') else None
+        response = self.get(api, path, headers=headers)
+        if entry and response.status_code == 304:
+            entry['fetched_at'] = now
+        else:
+            response.raise_for_status()
+            data = response.json()
+            entry = {
+                'data': data,
+                'etag': response.headers.get('ETag') or data.get('etag'),
+                'update_time': data.get('updateTime') or data.get('metadata', {}).get('updateTime'),
+                'fetched_at': now,
+            }
+        # Kept past the TTL so a stale entry can still be revalidated cheaply
+        cache.set(key, entry, settings.GBP_RESOURCE_CACHE_MAX_AGE)
+        return entry['data']
+
+    def get(self, api, path='', **kwargs):
+        return self.request('GET', api, path, **kwargs)
+
+    def post(self, api, path='', **kwargs):
+        return self.request('POST', api, path, **kwargs)
+
+    def put(self, api, path='', **kwargs):
+        return self.request('PUT', api, path, **kwargs)
+
+    def patch(self, api, path='', **kwargs):
+        return self.request('PATCH', api, path, **kwargs)
+
+    def delete(self, api, path='', **kwargs):
+        return self.request('DELETE', api, path, **kwargs)
+
+
+def collect_pages(pages, items_key):
+    """
+    Combine pages from GBPClient.iter_pages into one response-shaped dict: the first
+    page's fields with ``items_key`` holding the items of every page.
+    """
+    combined = {}
+    items = []
+    for page in pages:
+        if not combined:
+            combined = dict(page)
+        items.extend(page.get(items_key, []))
+    combined.pop('nextPageToken', None)
+    if items or items_key in combined:
+        combined[items_key] = items
+    return combined
+
+
+def fan_out(func, items, max_workers=None):
+    """
+    Call ``func(item)`` for every item on a bounded thread pool. The calls share the
+    pooled session and quota buckets, so concurrency only overlaps network waits.
+    Returns ``(result, error)`` pairs in the order of ``items``; exactly one of the two
+    is None, so one failed call doesn't lose the others.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def call(item):
+        try:
+            return func(item), None
+        except Exception as e:
+            return None, e
+
+    workers = min(max_workers or settings.GBP_FANOUT_WORKERS, len(items))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gbp-fanout') as pool:
+        return list(pool.map(call, items))
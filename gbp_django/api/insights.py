@@ -1,15 +1,43 @@
-import requests
+from datetime import datetime
+
+from .client import GBPClient, collect_pages
+
+# Daily metrics kept by utils.insights_store
+DAILY_METRICS = [
+    'QUERIES_DIRECT', 'QUERIES_INDIRECT', 'VIEWS_MAPS', 'VIEWS_SEARCH',
+    'ACTIONS_WEBSITE', 'ACTIONS_PHONE', 'ACTIONS_DRIVING_DIRECTIONS',
+]
 
 def request_insights(access_token, account_id, location_id, insights_request=None):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/insights"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(url, headers=headers, json=insights_request)
+    path = f"accounts/{account_id}/locations/{location_id}/insights"
+    response = GBPClient(access_token).get('v4', path, json=insights_request)
     response.raise_for_status()
     return response.json()
 
 def get_insights(access_token, account_id, location_id):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/insights"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    path = f"accounts/{account_id}/locations/{location_id}/insights"
+    return collect_pages(GBPClient(access_token).iter_pages('v4', path), 'locationMetrics')
+
+def daily_insights_request(start, end, metrics=None):
+    """Request body for daily values of ``metrics`` on the days from ``start`` up to (excluding) ``end``"""
+    return {
+        'basicRequest': {
+            'metricRequests': [{'metric': metric, 'options': ['AGGREGATED_DAILY']}
+                               for metric in metrics or DAILY_METRICS],
+            'timeRange': {'startTime': f"{start.isoformat()}T00:00:00Z", 'endTime': f"{end.isoformat()}T00:00:00Z"},
+        }
+    }
+
+def get_daily_metrics(access_token, account_id, location_id, start, end, metrics=None):
+    """(metric, date, value) for each day in [start, end) the API reports a value for"""
+    data = request_insights(access_token, account_id, location_id, daily_insights_request(start, end, metrics))
+    rows = []
+    for location_metrics in data.get('locationMetrics', []):
+        for metric_values in location_metrics.get('metricValues', []):
+            for value in metric_values.get('dimensionalValues', []):
+                day = value.get('timeDimension', {}).get('timeRange', {}).get('startTime')
+                if not day:
+                    continue
+                day = datetime.fromisoformat(day.replace('Z', '+00:00')).date()
+                rows.append((metric_values['metric'], day, int(value.get('value') or 0)))
+    return rows
@@ -1,31 +1,47 @@
-import requests
-from django.db import transaction
-from ..models import BusinessAttribute
-
-@transaction.atomic
-def store_photos(photos_data, account_id):
-    for photo in photos_data.get('mediaItems', []):
-        existing_photo = BusinessAttribute.objects.filter(business_id=account_id, key='photo', value=photo['name']).first()
-        if not existing_photo:
-            BusinessAttribute.objects.create(
-                business_id=account_id,
-                key='photo',
-                value=photo['name']
-            )
-
 import logging
+import requests
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from .client import GBPClient, collect_pages
+from .upsert import bulk_upsert
+from ..models import Media
 
 logger = logging.getLogger(__name__)
 
+PAGE_SIZE = 100  # largest page the API allows
+
+# Fields refreshed when a media item we already have comes back from the API
+MEDIA_UPDATE_FIELDS = ['media_format', 'category', 'google_url', 'thumbnail_url', 'description', 'create_time']
+
+
+def _media_row(item, account_id):
+    created = item.get('createTime')
+    return Media(
+        business_id=account_id,
+        media_id=item['name'],
+        media_format=item.get('mediaFormat', 'PHOTO'),
+        category=item.get('locationAssociation', {}).get('category'),
+        google_url=item.get('googleUrl') or item.get('sourceUrl', ''),
+        thumbnail_url=item.get('thumbnailUrl', ''),
+        description=item.get('description', ''),
+        create_time=parse_datetime(created) if created else None
+    )
+
+
+def store_photos(photos_data, account_id, batch_size=None):
+    """Upsert a page of media items; returns counts of created, updated and unchanged items"""
+    rows = (_media_row(item, account_id) for item in photos_data.get('mediaItems', []))
+    return bulk_upsert(Media, rows, 'media_id', MEDIA_UPDATE_FIELDS,
+                       batch_size or settings.MEDIA_SYNC_BATCH_SIZE)
+
 def upload_photo(access_token, account_id, location_id, photo_data):
     logger.info(f"Starting media upload for location {location_id}")
     logger.debug(f"Request payload keys: {photo_data.keys()}")
     
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/media"
-    headers = {"Authorization": f"Bearer {access_token}"}
+    path = f"accounts/{account_id}/locations/{location_id}/media"
     
     try:
-        response = requests.post(url, headers=headers, json=photo_data)
+        response = GBPClient(access_token).post('v4', path, json=photo_data)
         response.raise_for_status()
         logger.info(f"Media upload successful - Status: {response.status_code}")
         logger.debug(f"API response: {response.json()}")
@@ -35,15 +51,15 @@ def upload_photo(access_token, account_id, location_id, photo_data):
         raise
 
 def delete_photo(access_token, account_id, location_id, media_id):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/media/{media_id}"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.delete(url, headers=headers)
+    path = f"accounts/{account_id}/locations/{location_id}/media/{media_id}"
+    response = GBPClient(access_token).delete('v4', path)
     response.raise_for_status()
     return response.status_code == 204
 
+def iter_photos(access_token, account_id, location_id, page_size=PAGE_SIZE, params=None):
+    """Yield pages of media items for a location, following nextPageToken"""
+    path = f"accounts/{account_id}/locations/{location_id}/media"
+    return GBPClient(access_token).iter_pages('v4', path, page_size=page_size, params=params)
+
 def get_photos(access_token, account_id, location_id):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/media"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return collect_pages(iter_photos(access_token, account_id, location_id), 'mediaItems')
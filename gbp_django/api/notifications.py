@@ -0,0 +1,35 @@
+import hmac
+import logging
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from gbp_django.utils.push_notifications import InvalidNotification, decode_push_envelope, handle_notification
+
+logger = logging.getLogger(__name__)
+
+
+@csrf_exempt
+def pubsub_push(request):
+    """
+    Pub/Sub push endpoint for Business Profile notifications. The subscription's push
+    URL carries ``?token=<GBP_PUSH_VERIFICATION_TOKEN>``. Any 2xx acknowledges the
+    message, so notifications we can't act on are acknowledged too; only bad
+    requests are refused.
+    """
+    if request.method != "POST":
+        return HttpResponseBadRequest("Only POST method is allowed.")
+
+    expected = settings.GBP_PUSH_VERIFICATION_TOKEN
+    if not expected or not hmac.compare_digest(request.GET.get('token', ''), expected):
+        return HttpResponseForbidden("Invalid push token.")
+
+    try:
+        notification = decode_push_envelope(request.body)
+    except InvalidNotification as e:
+        logger.warning(str(e))
+        # Redelivering a malformed message won't fix it
+        return HttpResponse(status=204)
+
+    return JsonResponse(handle_notification(notification))
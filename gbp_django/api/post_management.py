@@ -1,60 +1,62 @@
-import requests
-from django.db import transaction
+import logging
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from .client import GBPClient, collect_pages
+from .upsert import bulk_upsert
 from ..models import Post
 
-@transaction.atomic
-def store_posts(posts_data, account_id):
-    print(f"\n[DEBUG] Starting post storage for account: {account_id}")
-    print(f"[DEBUG] Raw posts data: {posts_data}")
-    stored_posts = []
-    try:
-        local_posts = posts_data.get('localPosts', [])
-        print(f"[DEBUG] Found {len(local_posts)} posts to process")
-        for post in local_posts:
-            post_data = {
-                'business_id': account_id,
-                'post_id': post['name'],
-                'post_type': post.get('topicType', 'STANDARD'),
-                'content': post.get('summary', ''),
-                'media_url': post.get('media', [{}])[0].get('sourceUrl', '') if post.get('media') else '',
-                'scheduled_at': post.get('scheduledTime', None),
-                'status': post.get('state', 'PUBLISHED')
-            }
-            
-            post_obj, created = Post.objects.update_or_create(
-                post_id=post['name'],
-                defaults=post_data
-            )
-            stored_posts.append(post_obj)
-            print(f"[INFO] Successfully stored/updated post: {post['name']}")
-    except Exception as e:
-        print(f"[ERROR] Failed to store post data: {str(e)}")
-    return stored_posts
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100  # largest page the API allows
+
+# Fields refreshed when a post we already have comes back from the API
+POST_UPDATE_FIELDS = ['post_type', 'content', 'media_url', 'scheduled_at', 'status']
+
+
+def _post_row(post, account_id):
+    media = post.get('media') or [{}]
+    scheduled = post.get('scheduledTime')
+    return Post(
+        business_id=account_id,
+        post_id=post['name'],
+        post_type=post.get('topicType', 'STANDARD'),
+        content=post.get('summary', ''),
+        media_url=media[0].get('sourceUrl') or media[0].get('googleUrl', ''),
+        scheduled_at=parse_datetime(scheduled) if scheduled else None,
+        status=post.get('state', 'PUBLISHED')
+    )
+
+
+def store_posts(posts_data, account_id, batch_size=None):
+    """Upsert a page of posts; returns counts of created, updated and unchanged posts"""
+    local_posts = posts_data.get('localPosts', [])
+    counts = bulk_upsert(Post, (_post_row(post, account_id) for post in local_posts), 'post_id',
+                         POST_UPDATE_FIELDS, batch_size or settings.POST_SYNC_BATCH_SIZE)
+    logger.info(f"Stored {len(local_posts)} posts for business {account_id}: {counts}")
+    return counts
 
 def create_post(access_token, account_id, location_id, post_data):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/localPosts"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.post(url, headers=headers, json=post_data)
+    path = f"accounts/{account_id}/locations/{location_id}/localPosts"
+    response = GBPClient(access_token).post('v4', path, json=post_data)
     response.raise_for_status()
     return response.json()
 
 def update_post(access_token, account_id, location_id, post_id, update_data):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/localPosts/{post_id}"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.patch(url, headers=headers, json=update_data)
+    path = f"accounts/{account_id}/locations/{location_id}/localPosts/{post_id}"
+    response = GBPClient(access_token).patch('v4', path, json=update_data)
     response.raise_for_status()
     return response.json()
 
 def delete_post(access_token, account_id, location_id, post_id):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/localPosts/{post_id}"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.delete(url, headers=headers)
+    path = f"accounts/{account_id}/locations/{location_id}/localPosts/{post_id}"
+    response = GBPClient(access_token).delete('v4', path)
     response.raise_for_status()
     return response.status_code == 204
 
+def iter_posts(access_token, account_id, location_id, page_size=PAGE_SIZE, params=None):
+    """Yield pages of posts for a location, following nextPageToken"""
+    path = f"accounts/{account_id}/locations/{location_id}/localPosts"
+    return GBPClient(access_token).iter_pages('v4', path, page_size=page_size, params=params)
+
 def get_posts(access_token, account_id, location_id):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/localPosts"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return collect_pages(iter_posts(access_token, account_id, location_id), 'localPosts')
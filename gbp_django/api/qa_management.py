@@ -1,47 +1,63 @@
-import requests
-from django.db import transaction
+from django.conf import settings
+from .client import GBPClient, collect_pages
+from .upsert import bulk_upsert
 from ..models import QandA
 
-@transaction.atomic
-def store_questions_and_answers(qa_data, account_id):
-    for question in qa_data.get('questions', []):
-        existing_qa = QandA.objects.filter(question=question['name']).first()
-        if not existing_qa:
-            QandA.objects.create(
-                business_id=account_id,
-                question=question.get('text', ''),
-                answer=question.get('answers', [{}])[0].get('text', '') if question.get('answers') else '',
-                answered=bool(question.get('answers'))
-            )
-        else:
-            existing_qa.answer = question.get('answers', [{}])[0].get('text', '') if question.get('answers') else ''
-            existing_qa.answered = bool(question.get('answers'))
-            existing_qa.save()
+PAGE_SIZE = 10  # largest page the API allows
+
+# Fields refreshed when a question we already have comes back from the API
+QA_UPDATE_FIELDS = ['question', 'answer', 'answered']
+
+
+def _qanda_row(question, account_id):
+    answers = question.get('topAnswers') or question.get('answers') or []
+    return QandA(
+        business_id=account_id,
+        question_id=question['name'],
+        question=question.get('text', ''),
+        answer=answers[0].get('text', '') if answers else '',
+        answered=bool(answers)
+    )
+
+
+def store_questions_and_answers(qa_data, account_id, batch_size=None):
+    """
+    Upsert a page of questions keyed by their Google resource name. New and removed
+    answers land in the batch's single set-based write; returns counts of created,
+    updated and unchanged questions.
+    """
+    rows = (_qanda_row(question, account_id) for question in qa_data.get('questions', []))
+    return bulk_upsert(QandA, rows, 'question_id', QA_UPDATE_FIELDS,
+                       batch_size or settings.QA_SYNC_BATCH_SIZE)
 
 def post_question(access_token, account_id, location_id, question_data):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/questions"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.post(url, headers=headers, json=question_data)
+    path = f"accounts/{account_id}/locations/{location_id}/questions"
+    response = GBPClient(access_token).post('v4', path, json=question_data)
     response.raise_for_status()
     return response.json()
 
+def _question_path(account_id, location_id, question_id):
+    # Synced questions are keyed by their full resource name (accounts/*/locations/*/questions/*)
+    if question_id.startswith('accounts/'):
+        return question_id
+    return f"accounts/{account_id}/locations/{location_id}/questions/{question_id}"
+
 def answer_question(access_token, account_id, location_id, question_id, answer_data):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/questions/{question_id}/answers"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.post(url, headers=headers, json=answer_data)
+    path = f"{_question_path(account_id, location_id, question_id)}/answers"
+    response = GBPClient(access_token).post('v4', path, json=answer_data)
     response.raise_for_status()
     return response.json()
 
 def delete_question_or_answer(access_token, account_id, location_id, question_id):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/questions/{question_id}"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.delete(url, headers=headers)
+    path = _question_path(account_id, location_id, question_id)
+    response = GBPClient(access_token).delete('v4', path)
     response.raise_for_status()
     return response.status_code == 204
 
+def iter_questions(access_token, account_id, location_id, page_size=PAGE_SIZE, params=None):
+    """Yield pages of questions for a location, following nextPageToken"""
+    path = f"accounts/{account_id}/locations/{location_id}/questions"
+    return GBPClient(access_token).iter_pages('v4', path, page_size=page_size, params=params)
+
 def get_questions_and_answers(access_token, account_id, location_id):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/questions"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return collect_pages(iter_questions(access_token, account_id, location_id), 'questions')
@@ -0,0 +1,149 @@
+import threading
+import time
+import logging
+from collections import Counter
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Atomically refill the bucket and reserve one token. The bucket may go negative:
+# each caller reserves a slot and is told how long to wait for it, so callers queue
+# in arrival order instead of polling. A reservation that would wait longer than
+# max_wait is not taken. Uses the Redis clock so every process agrees on time.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = math.max(0, (1 - tokens) / rate)
+if wait > max_wait then
+    return '-1'
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate + max_wait) + 1)
+return tostring(wait)
+"""
+
+USAGE_RETENTION = 24 * 3600  # seconds of per-minute usage kept in Redis
+
+
+class QuotaExhausted(requests.exceptions.RequestException):
+    """A call would have had to wait longer than GBP_QUOTA_MAX_WAIT for quota"""
+
+
+def quota_method_name(http_method, path):
+    """
+    Quota accounting name for a call, with resource ids collapsed:
+    GET accounts/1/locations/2/reviews -> "GET accounts/*/locations/*/reviews"
+    """
+    segments = path.split('?')[0].strip('/').split('/')
+    return f"{http_method.upper()} " + '/'.join('*' if i % 2 else s for i, s in enumerate(segments))
+
+
+class LocalQuotaBackend:
+    """Buckets and usage counters for a single process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.usage_by_minute = {}
+
+    def reserve(self, api, rate, capacity, max_wait):
+        with self.lock:
+            now = time.monotonic()
+            tokens, ts = self.buckets.get(api, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            wait = max(0.0, (1 - tokens) / rate)
+            if wait > max_wait:
+                return None
+            self.buckets[api] = (tokens - 1, now)
+            return wait
+
+    def record(self, api, method, minute):
+        with self.lock:
+            self.usage_by_minute.setdefault(minute, Counter())[f"{api}:{method}"] += 1
+            for old in [m for m in self.usage_by_minute if m < minute - USAGE_RETENTION // 60]:
+                del self.usage_by_minute[old]
+
+    def usage(self, minute):
+        with self.lock:
+            return dict(self.usage_by_minute.get(minute, {}))
+
+
+class RedisQuotaBackend:
+    """Buckets and usage counters shared by every web and worker process"""
+
+    def __init__(self, url):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def reserve(self, api, rate, capacity, max_wait):
+        wait = float(self.script(keys=[f"gbp:quota:bucket:{api}"], args=[rate, capacity, max_wait]))
+        return None if wait < 0 else wait
+
+    def record(self, api, method, minute):
+        key = f"gbp:quota:usage:{minute}"
+        pipe = self.redis.pipeline()
+        pipe.hincrby(key, f"{api}:{method}", 1)
+        pipe.expire(key, USAGE_RETENTION)
+        pipe.execute()
+
+    def usage(self, minute):
+        return {k.decode(): int(v) for k, v in self.redis.hgetall(f"gbp:quota:usage:{minute}").items()}
+
+
+class QuotaManager:
+    """
+    Client-side token buckets per API family, sized from settings.GBP_API_QUOTAS
+    (requests per minute, burst). acquire() blocks until the call may go out, so a
+    run across many businesses queues behind the quota instead of collecting 429s.
+    Families without a configured quota are not limited but are still counted.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or (RedisQuotaBackend(settings.REDIS_URL) if settings.REDIS_URL
+                                   else LocalQuotaBackend())
+
+    def acquire(self, api, method):
+        quota = settings.GBP_API_QUOTAS.get(api)
+        if quota and settings.GBP_QUOTA_ENABLED:
+            per_minute, burst = quota
+            wait = self.backend.reserve(api, per_minute / 60.0, burst, settings.GBP_QUOTA_MAX_WAIT)
+            if wait is None:
+                raise QuotaExhausted(f"{api} quota exhausted for {method}; "
+                                     f"no slot within {settings.GBP_QUOTA_MAX_WAIT}s")
+            if wait > 0:
+                logger.debug(f"Waiting {wait:.2f}s for {api} quota ({method})")
+                time.sleep(wait)
+        self.backend.record(api, method, int(time.time() // 60))
+
+    def usage(self, minutes=1):
+        """Calls per "api:METHOD path" over the last ``minutes`` whole minutes, current included"""
+        current = int(time.time() // 60)
+        totals = Counter()
+        for minute in range(current - minutes + 1, current + 1):
+            totals.update(self.backend.usage(minute))
+        return dict(totals)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_quota_manager():
+    """Process-wide quota manager, created on first use"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = QuotaManager()
+    return _manager
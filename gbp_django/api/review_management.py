@@ -1,48 +1,65 @@
-import requests
-from gbp_django.models import Review
-from django.db import transaction
+from django.conf import settings
+from .client import GBPClient, collect_pages
+from .upsert import bulk_upsert
 from ..models import Review
 
-@transaction.atomic
-def store_reviews(reviews_data, account_id):
-    reviews = reviews_data.get('reviews', [])
-    for review in reviews:
-        existing_review = Review.objects.filter(review_id=review['name']).first()
-        if not existing_review:
-            Review.objects.create(
-                business_id=account_id,
-                review_id=review['name'],
-                reviewer_name=review.get('reviewer', {}).get('displayName', 'Anonymous'),
-                reviewer_profile_url=review.get('reviewer', {}).get('profilePhotoUrl', ''),
-                rating=review.get('starRating', 0),
-                content=review.get('comment', ''),
-                responded=review.get('responded', False),
-                response=review.get('response', {}).get('comment', '')
-            )
-        else:
-            existing_review.rating = review.get('starRating', 0)
-            existing_review.content = review.get('comment', '')
-            existing_review.responded = review.get('responded', False)
-            existing_review.response = review.get('response', {}).get('comment', '')
-            existing_review.save()
+PAGE_SIZE = 50  # largest page the API allows
+
+# The v4 API reports ratings as enum names
+STAR_RATINGS = {'ONE': 1, 'TWO': 2, 'THREE': 3, 'FOUR': 4, 'FIVE': 5}
+
+# Fields refreshed when a review we already have comes back from the API
+REVIEW_UPDATE_FIELDS = ['rating', 'content', 'responded', 'response']
+
+
+def _star_rating(value):
+    if isinstance(value, str):
+        return STAR_RATINGS.get(value.upper(), int(value) if value.isdigit() else 0)
+    return int(value or 0)
+
+
+def _review_row(review, account_id):
+    reply = review.get('reviewReply') or review.get('response') or {}
+    return Review(
+        business_id=account_id,
+        review_id=review['name'],
+        reviewer_name=review.get('reviewer', {}).get('displayName', 'Anonymous'),
+        reviewer_profile_url=review.get('reviewer', {}).get('profilePhotoUrl', ''),
+        rating=_star_rating(review.get('starRating', 0)),
+        content=review.get('comment', ''),
+        responded=review.get('responded', bool(reply.get('comment'))),
+        response=reply.get('comment', '')
+    )
+
+
+def store_reviews(reviews_data, account_id, batch_size=None):
+    """Upsert a page of reviews; returns counts of created, updated and unchanged reviews"""
+    rows = (_review_row(review, account_id) for review in reviews_data.get('reviews', []))
+    return bulk_upsert(Review, rows, 'review_id', REVIEW_UPDATE_FIELDS,
+                       batch_size or settings.REVIEW_SYNC_BATCH_SIZE)
+
+def _review_path(account_id, location_id, review_id):
+    # Synced reviews are keyed by their full resource name (accounts/*/locations/*/reviews/*)
+    if review_id.startswith('accounts/'):
+        return review_id
+    return f"accounts/{account_id}/locations/{location_id}/reviews/{review_id}"
 
 def respond_to_review(access_token, account_id, location_id, review_id, response_data):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/reviews/{review_id}/reply"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.put(url, headers=headers, json=response_data)
+    path = f"{_review_path(account_id, location_id, review_id)}/reply"
+    response = GBPClient(access_token).put('v4', path, json=response_data)
     response.raise_for_status()
     return response.json()
 
 def delete_review_reply(access_token, account_id, location_id, review_id):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/reviews/{review_id}/reply"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.delete(url, headers=headers)
+    path = f"{_review_path(account_id, location_id, review_id)}/reply"
+    response = GBPClient(access_token).delete('v4', path)
     response.raise_for_status()
     return response.status_code == 204
 
+def iter_reviews(access_token, account_id, location_id, page_size=PAGE_SIZE, params=None):
+    """Yield pages of reviews for a location, following nextPageToken"""
+    path = f"accounts/{account_id}/locations/{location_id}/reviews"
+    return GBPClient(access_token).iter_pages('v4', path, page_size=page_size, params=params)
+
 def get_reviews(access_token, account_id, location_id):
-    url = f"https://mybusiness.googleapis.com/v4/accounts/{account_id}/locations/{location_id}/reviews"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return collect_pages(iter_reviews(access_token, account_id, location_id), 'reviews')
@@ -0,0 +1,47 @@
+from django.db import transaction
+
+
+@transaction.atomic
+def bulk_upsert(model, rows, unique_field, update_fields, batch_size, on_write=None):
+    """
+    Upsert unsaved ``rows`` of ``model`` keyed by ``unique_field`` (a Google resource
+    name), in batches: one SELECT to find what changed and one INSERT ... ON CONFLICT
+    per batch. Rows identical to the stored copy in ``update_fields`` are not written.
+    Returns counts of created, updated and unchanged rows.
+
+    bulk_create sends no save signals; ``on_write`` is called with each batch's
+    written rows for callers that need to react to changes.
+    """
+    rows = list(rows)
+    counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+    for start in range(0, len(rows), batch_size):
+        batch = {}
+        for row in rows[start:start + batch_size]:
+            batch[getattr(row, unique_field)] = row  # last copy wins within a batch
+
+        existing = {
+            values[0]: values[1:]
+            for values in model.objects.filter(**{f"{unique_field}__in": list(batch)})
+                                       .values_list(unique_field, *update_fields)
+        }
+        changed = []
+        for key, row in batch.items():
+            if key not in existing:
+                counts['created'] += 1
+            elif existing[key] != tuple(getattr(row, field) for field in update_fields):
+                counts['updated'] += 1
+            else:
+                counts['unchanged'] += 1
+                continue
+            changed.append(row)
+
+        if changed:
+            model.objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=[unique_field],
+                update_fields=list(update_fields) + ['updated_at']
+            )
+            if on_write:
+                on_write(changed)
+    return counts
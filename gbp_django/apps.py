@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class GbpDjangoConfig(AppConfig):
+    name = 'gbp_django'
+    default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - registers receivers
@@ -0,0 +1 @@
+# Offline benchmark tooling (stub model servers and measurement harnesses)
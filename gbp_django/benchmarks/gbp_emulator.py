@@ -0,0 +1,637 @@
+"""
+Local emulator of the Google Business Profile APIs the app talks to.
+
+Serves accounts, locations (Business Information and Business Profile), reviews,
+local posts, media, Q&A, verifications and insights from seeded in-memory data,
+plus OAuth token refresh and userinfo, with Google-style pagination, configurable
+latency, injected 429s and per-family quotas. Sync, posting and review automation
+can then be exercised and load-tested without touching Google.
+
+    python -m gbp_django.benchmarks.gbp_emulator --port 8089 --locations 50 --reviews 200 \\
+        --latency lognormal:80,0.4 --error-rate 0.02 --quota 300
+
+and point the app at it:
+
+    GBP_API_BASE_URL=http://127.0.0.1:8089
+
+Every API family is served under ``/<family>`` (``/v4``, ``/business_information``,
+``/verifications``, ...), matching the keys of ``gbp_django.api.client.API_BASE_URLS``.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .llm_stub_server import LatencyModel
+
+logger = logging.getLogger(__name__)
+
+FAMILIES = ('v4', 'business_information', 'account_management', 'verifications', 'business_profile',
+            'oauth', 'openid')
+
+# (default, maximum) page sizes of the real list calls
+PAGE_SIZES = {
+    'accounts': (20, 20),
+    'locations': (10, 100),
+    'reviews': (50, 50),
+    'localPosts': (20, 100),
+    'mediaItems': (100, 2500),
+    'questions': (10, 10),
+}
+
+STAR_RATINGS = ['ONE', 'TWO', 'THREE', 'FOUR', 'FIVE']
+INSIGHT_METRICS = ['QUERIES_DIRECT', 'QUERIES_INDIRECT', 'VIEWS_MAPS', 'VIEWS_SEARCH',
+                   'ACTIONS_WEBSITE', 'ACTIONS_PHONE', 'ACTIONS_DRIVING_DIRECTIONS']
+CATEGORIES = ['Coffee shop', 'Plumber', 'Dentist', 'Hair salon', 'Bakery', 'Auto repair shop']
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def timestamp(moment: datetime) -> str:
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def daily_metric_value(location_id: str, metric: str, day: date) -> int:
+    """Deterministic daily value of an insights metric, with a weekly cycle"""
+    digest = hashlib.blake2b(f"{location_id}:{metric}:{day.isoformat()}".encode(), digest_size=4).digest()
+    base = 20 + INSIGHT_METRICS.index(metric) * 7
+    weekend = 1.4 if day.weekday() >= 5 else 1.0
+    return int((base + int.from_bytes(digest, 'big') % base) * weekend)
+
+
+class EmulatorError(Exception):
+    def __init__(self, status: int, message: str, reason: str = 'INVALID_ARGUMENT', headers: Optional[Dict] = None):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.headers = headers or {}
+
+    def body(self) -> Dict:
+        return {'error': {'code': self.status, 'message': str(self), 'status': self.reason}}
+
+
+class GBPDataset:
+    """In-memory accounts, locations and per-location collections, seeded deterministically"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.accounts: Dict[str, Dict] = {}
+        self.locations: Dict[str, Dict] = {}  # location id -> Business Information location
+        self.location_accounts: Dict[str, str] = {}  # location id -> account id
+        self.versions: Counter = Counter()  # location id -> ETag version
+        self.verifications: Dict[str, Dict] = {}
+        self.reviews: Dict[str, List[Dict]] = {}
+        self.posts: Dict[str, List[Dict]] = {}
+        self.media: Dict[str, List[Dict]] = {}
+        self.questions: Dict[str, List[Dict]] = {}
+        self._ids = Counter()
+
+    def next_id(self, kind: str) -> str:
+        with self.lock:
+            self._ids[kind] += 1
+            return f"{kind[0]}{self._ids[kind]}"
+
+    def seed(self, accounts: int = 1, locations: int = 5, reviews: int = 20, posts: int = 5, media: int = 10,
+             questions: int = 3, seed: int = 0) -> 'GBPDataset':
+        """Add ``locations`` locations per account, each with the given number of items"""
+        rng = random.Random(seed)
+        with self.lock:
+            for a in range(accounts):
+                account_id = str(100 + len(self.accounts))
+                self.accounts[account_id] = {
+                    'name': f"accounts/{account_id}",
+                    'accountName': f"Agency {account_id}",
+                    'type': 'LOCATION_GROUP' if a else 'ORGANIZATION',
+                    'verificationState': 'VERIFIED',
+                }
+                for _ in range(locations):
+                    self.add_location(account_id, rng, reviews, posts, media, questions)
+        return self
+
+    def add_location(self, account_id: str, rng: random.Random, reviews: int = 0, posts: int = 0, media: int = 0,
+                     questions: int = 0) -> str:
+        location_id = str(1000 + len(self.locations))
+        updated = EPOCH + timedelta(days=rng.randint(0, 120))
+        state = rng.choice(['VERIFIED'] * 4 + ['UNVERIFIED'])
+        self.locations[location_id] = {
+            'name': f"locations/{location_id}",
+            'title': f"Business {location_id}",
+            'storefrontAddress': {'addressLines': [f"{rng.randint(1, 999)} Main St"], 'locality': 'Springfield',
+                                  'regionCode': 'US', 'postalCode': f"{rng.randint(10000, 99999)}"},
+            'regularPhone': f"555-{rng.randint(1000, 9999)}",
+            'phoneNumbers': {'primaryPhone': f"555-{rng.randint(1000, 9999)}"},
+            'websiteUrl': f"https://business{location_id}.example.com",
+            'websiteUri': f"https://business{location_id}.example.com",
+            'primaryCategory': {'displayName': rng.choice(CATEGORIES)},
+            'profile': {'description': f"Family-run business number {location_id}."},
+            'regularHours': {'periods': [{'openDay': 'MONDAY', 'openTime': '09:00',
+                                          'closeDay': 'MONDAY', 'closeTime': '17:00'}]},
+            'metadata': {'verificationState': state},
+            'updateTime': timestamp(updated),
+        }
+        self.location_accounts[location_id] = account_id
+        self.versions[location_id] = 1
+        self.verifications[location_id] = {'name': f"locations/{location_id}/verification", 'state': state,
+                                           'method': 'EMAIL' if state == 'VERIFIED' else 'NONE'}
+        prefix = f"accounts/{account_id}/locations/{location_id}"
+        self.reviews[location_id] = []
+        for n in range(reviews):
+            created = EPOCH + timedelta(hours=rng.randint(0, 24 * 365))
+            review = {
+                'name': f"{prefix}/reviews/{self.next_id('review')}",
+                'reviewer': {'displayName': f"Customer {n}"},
+                'starRating': rng.choice(STAR_RATINGS[1:] + ['FIVE', 'FIVE']),
+                'comment': f"Visit {n}: {rng.choice(['great service', 'a bit slow', 'friendly staff', 'will return'])}",
+                'createTime': timestamp(created),
+                'updateTime': timestamp(created),
+            }
+            review['reviewId'] = review['name'].rsplit('/', 1)[-1]
+            if rng.random() < 0.3:
+                review['reviewReply'] = {'comment': 'Thank you!', 'updateTime': timestamp(created + timedelta(days=1))}
+            self.reviews[location_id].append(review)
+        self.posts[location_id] = [{
+            'name': f"{prefix}/localPosts/{self.next_id('post')}",
+            'summary': f"Update {n} from business {location_id}",
+            'topicType': rng.choice(['STANDARD', 'EVENT', 'OFFER']),
+            'state': 'LIVE',
+            'createTime': timestamp(updated - timedelta(days=n)),
+            'updateTime': timestamp(updated - timedelta(days=n)),
+        } for n in range(posts)]
+        self.media[location_id] = [{
+            'name': f"{prefix}/media/{self.next_id('media')}",
+            'mediaFormat': 'PHOTO',
+            'locationAssociation': {'category': rng.choice(['EXTERIOR', 'INTERIOR', 'PRODUCT', 'TEAMS'])},
+            'googleUrl': f"https://lh3.example.com/{location_id}/{n}.jpg",
+            'thumbnailUrl': f"https://lh3.example.com/{location_id}/{n}-thumb.jpg",
+            'createTime': timestamp(updated - timedelta(days=n)),
+        } for n in range(media)]
+        self.questions[location_id] = []
+        for n in range(questions):
+            asked = updated - timedelta(days=n)
+            question = {
+                'name': f"{prefix}/questions/{self.next_id('question')}",
+                'author': {'displayName': f"Visitor {n}"},
+                'text': f"Question {n}: are you open on holidays?",
+                'createTime': timestamp(asked),
+                'updateTime': timestamp(asked),
+                'totalAnswerCount': 0,
+            }
+            if n % 2:
+                question['topAnswers'] = [{'text': 'Yes, 10am to 4pm.', 'author': {'type': 'MERCHANT'}}]
+                question['totalAnswerCount'] = 1
+            self.questions[location_id].append(question)
+        return location_id
+
+
+class GBPEmulator:
+    """
+    Threaded HTTP server over a :class:`GBPDataset`. Usable as a context manager:
+
+        with GBPEmulator(latency='normal:50,10', error_rate=0.01) as emulator:
+            settings.GBP_API_BASE_URL = emulator.url
+
+    ``error_rate`` answers that fraction of API calls with 429 RESOURCE_EXHAUSTED and a
+    ``Retry-After``; ``quota`` caps calls per minute per API family (a number, or a dict
+    by family) the way the Google Cloud project quota does; ``fail_next`` scripts
+    specific failures. Calls are counted per "METHOD family" in ``request_counts``.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, dataset: Optional[GBPDataset] = None,
+                 latency: str = 'fixed:0', error_rate: float = 0.0, retry_after: float = 1.0,
+                 quota=None, require_auth: bool = True, seed: int = 0):
+        self.dataset = dataset if dataset is not None else GBPDataset().seed(seed=seed)
+        self.latency = LatencyModel(latency, seed=seed)
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.quota = quota
+        self.require_auth = require_auth
+        self.request_counts = Counter()
+        self.throttled = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._scripted: List[Tuple[str, int, int]] = []  # (path prefix, status, remaining)
+        self._windows: Dict[str, Tuple[int, int]] = {}  # family -> (minute, calls)
+        self._httpd = ThreadingHTTPServer((host, port), _EmulatorRequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.emulator = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'GBPEmulator':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='gbp-emulator', daemon=True)
+        self._thread.start()
+        logger.info(f"GBP emulator listening on {self.url}")
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> 'GBPEmulator':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def fail_next(self, path_prefix: str, status: int = 429, count: int = 1) -> None:
+        """Answer the next ``count`` calls whose path starts with ``path_prefix`` with ``status``"""
+        with self._lock:
+            self._scripted.append((path_prefix, status, count))
+
+    def _scripted_status(self, path: str) -> Optional[int]:
+        with self._lock:
+            for i, (prefix, status, remaining) in enumerate(self._scripted):
+                if path.startswith(prefix):
+                    if remaining <= 1:
+                        del self._scripted[i]
+                    else:
+                        self._scripted[i] = (prefix, status, remaining - 1)
+                    return status
+        return None
+
+    def admit(self, method: str, family: str, path: str) -> None:
+        """Count the call and apply scripted failures, random 429s and the family quota"""
+        with self._lock:
+            self.request_counts[f"{method} {family}"] += 1
+        status = self._scripted_status(path)
+        if status:
+            raise EmulatorError(status, 'Scripted failure', 'RESOURCE_EXHAUSTED' if status == 429 else 'UNAVAILABLE',
+                                {'Retry-After': str(self.retry_after)} if status == 429 else None)
+        if family in ('oauth', 'openid'):
+            return
+        with self._lock:
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.throttled[family] += 1
+                raise EmulatorError(429, 'Injected rate limit', 'RESOURCE_EXHAUSTED',
+                                    {'Retry-After': str(self.retry_after)})
+            limit = self.quota.get(family) if isinstance(self.quota, dict) else self.quota
+            if limit:
+                minute = int(time.time() // 60)
+                window, calls = self._windows.get(family, (minute, 0))
+                calls = calls + 1 if window == minute else 1
+                self._windows[family] = (minute, calls)
+                if calls > limit:
+                    self.throttled[family] += 1
+                    raise EmulatorError(429, f"Quota exceeded for quota metric '{family} requests per minute'",
+                                        'RESOURCE_EXHAUSTED', {'Retry-After': str(60 - int(time.time()) % 60)})
+
+    # ------------------------------------------------------------------ routing
+
+    def handle(self, method: str, family: str, path: str, query: Dict, body: Dict, headers) -> Tuple[int, Dict, Dict]:
+        """Return (status, body, headers) for a call; raises EmulatorError"""
+        if family not in ('oauth',) and self.require_auth and not (headers.get('Authorization') or '').startswith('Bearer '):
+            raise EmulatorError(401, 'Request is missing required authentication credential', 'UNAUTHENTICATED')
+        self.admit(method, family, path)
+        time.sleep(self.latency.sample())
+        for route_method, route_family, pattern, handler in ROUTES:
+            if route_method == method and route_family in (family, '*'):
+                match = pattern.fullmatch(path)
+                if match:
+                    return getattr(self, handler)(query=query, body=body, headers=headers, **match.groupdict())
+        raise EmulatorError(404, f"Unknown route {method} /{family}/{path}", 'NOT_FOUND')
+
+    def _location(self, location: str) -> Dict:
+        found = self.dataset.locations.get(location)
+        if not found:
+            raise EmulatorError(404, f"Location {location} not found", 'NOT_FOUND')
+        return found
+
+    def _collection(self, store: Dict[str, List[Dict]], location: str) -> List[Dict]:
+        self._location(location)
+        return store.setdefault(location, [])
+
+    @staticmethod
+    def _page(items: List[Dict], key: str, query: Dict, extra: Optional[Dict] = None) -> Tuple[int, Dict, Dict]:
+        default, maximum = PAGE_SIZES[key]
+        try:
+            size = min(int(query.get('pageSize') or default), maximum)
+            offset = int(query.get('pageToken') or 0)
+        except ValueError:
+            raise EmulatorError(400, 'Invalid pageSize or pageToken')
+        body = dict(extra or {})
+        body[key] = items[offset:offset + size]
+        if offset + size < len(items):
+            body['nextPageToken'] = str(offset + size)
+        return 200, body, {}
+
+    @staticmethod
+    def _ordered(items: List[Dict], query: Dict) -> List[Dict]:
+        if (query.get('orderBy') or '').replace('+', ' ') == 'updateTime desc':
+            return sorted(items, key=lambda item: item.get('updateTime', ''), reverse=True)
+        return list(items)
+
+    @staticmethod
+    def _find(items: List[Dict], item_id: str) -> Dict:
+        for item in items:
+            if item['name'].rsplit('/', 1)[-1] == item_id:
+                return item
+        raise EmulatorError(404, f"{item_id} not found", 'NOT_FOUND')
+
+    # accounts and locations
+
+    def list_accounts(self, query, **kwargs):
+        with self.dataset.lock:
+            return self._page(list(self.dataset.accounts.values()), 'accounts', query)
+
+    def list_locations(self, account, query, **kwargs):
+        with self.dataset.lock:
+            if account not in self.dataset.accounts:
+                raise EmulatorError(404, f"Account {account} not found", 'NOT_FOUND')
+            locations = [loc for lid, loc in self.dataset.locations.items()
+                         if self.dataset.location_accounts[lid] == account]
+            return self._page(locations, 'locations', query)
+
+    def get_location(self, location, headers, **kwargs):
+        with self.dataset.lock:
+            data = self._location(location)
+            etag = f'"{location}-{self.dataset.versions[location]}"'
+        if headers.get('If-None-Match') == etag:
+            return 304, {}, {'ETag': etag}
+        return 200, data, {'ETag': etag}
+
+    def get_location_information(self, location, query, headers, **kwargs):
+        # The Business Information API refuses locations.get without a readMask
+        if not query.get('readMask'):
+            raise EmulatorError(400, 'readMask is required')
+        return self.get_location(location, headers)
+
+    def patch_location(self, location, query, body, **kwargs):
+        mask = [field for field in (query.get('updateMask') or '').split(',') if field]
+        if not mask:
+            raise EmulatorError(400, 'updateMask is required')
+        with self.dataset.lock:
+            data = self._location(location)
+            for field in mask:
+                # Only the masked path changes; sibling fields are kept
+                *parents, leaf = field.split('.')
+                source, target = body, data
+                for parent in parents:
+                    source = source.get(parent) if isinstance(source, dict) else None
+                    target = target.setdefault(parent, {})
+                if isinstance(source, dict) and leaf in source:
+                    target[leaf] = source[leaf]
+            data['updateTime'] = timestamp(datetime.now(timezone.utc))
+            self.dataset.versions[location] += 1
+            return 200, data, {}
+
+    def get_verification(self, location, **kwargs):
+        with self.dataset.lock:
+            self._location(location)
+            return 200, self.dataset.verifications[location], {}
+
+    # reviews
+
+    def list_reviews(self, location, query, **kwargs):
+        with self.dataset.lock:
+            reviews = self._collection(self.dataset.reviews, location)
+            ratings = [STAR_RATINGS.index(r['starRating']) + 1 for r in reviews]
+            extra = {'averageRating': round(sum(ratings) / len(ratings), 1) if ratings else 0,
+                     'totalReviewCount': len(reviews)}
+            return self._page(self._ordered(reviews, query), 'reviews', query, extra)
+
+    def put_reply(self, location, review, body, **kwargs):
+        with self.dataset.lock:
+            item = self._find(self._collection(self.dataset.reviews, location), review)
+            now = timestamp(datetime.now(timezone.utc))
+            item['reviewReply'] = {'comment': body.get('comment', ''), 'updateTime': now}
+            item['updateTime'] = now
+            return 200, item['reviewReply'], {}
+
+    def delete_reply(self, location, review, **kwargs):
+        with self.dataset.lock:
+            item = self._find(self._collection(self.dataset.reviews, location), review)
+            item.pop('reviewReply', None)
+            item['updateTime'] = timestamp(datetime.now(timezone.utc))
+            return 204, {}, {}
+
+    # posts, media and Q&A
+
+    def _create(self, store, kind, account, location, body):
+        with self.dataset.lock:
+            items = self._collection(store, location)
+            now = timestamp(datetime.now(timezone.utc))
+            collection = {'post': 'localPosts', 'media': 'media', 'question': 'questions'}[kind]
+            item = dict(body, name=f"accounts/{account}/locations/{location}/{collection}/{self.dataset.next_id(kind)}",
+                        createTime=now, updateTime=now)
+            items.insert(0, item)
+            return 200, item, {}
+
+    def _delete(self, store, location, item_id):
+        with self.dataset.lock:
+            items = self._collection(store, location)
+            items.remove(self._find(items, item_id))
+            return 204, {}, {}
+
+    def list_posts(self, location, query, **kwargs):
+        with self.dataset.lock:
+            return self._page(self._collection(self.dataset.posts, location), 'localPosts', query)
+
+    def create_post(self, account, location, body, **kwargs):
+        status, item, headers = self._create(self.dataset.posts, 'post', account, location, body)
+        item.setdefault('state', 'LIVE')
+        return status, item, headers
+
+    def patch_post(self, location, post, body, **kwargs):
+        with self.dataset.lock:
+            item = self._find(self._collection(self.dataset.posts, location), post)
+            item.update({k: v for k, v in body.items() if k != 'name'})
+            item['updateTime'] = timestamp(datetime.now(timezone.utc))
+            return 200, item, {}
+
+    def delete_post(self, location, post, **kwargs):
+        return self._delete(self.dataset.posts, location, post)
+
+    def list_media(self, location, query, **kwargs):
+        with self.dataset.lock:
+            return self._page(self._collection(self.dataset.media, location), 'mediaItems', query,
+                              {'totalMediaItemCount': len(self.dataset.media[location])})
+
+    def create_media(self, account, location, body, **kwargs):
+        status, item, headers = self._create(self.dataset.media, 'media', account, location, body)
+        item.setdefault('mediaFormat', 'PHOTO')
+        item.setdefault('googleUrl', body.get('sourceUrl', ''))
+        return status, item, headers
+
+    def delete_media(self, location, media, **kwargs):
+        return self._delete(self.dataset.media, location, media)
+
+    def list_questions(self, location, query, **kwargs):
+        with self.dataset.lock:
+            questions = self._collection(self.dataset.questions, location)
+            return self._page(self._ordered(questions, query), 'questions', query,
+                              {'totalSize': len(questions)})
+
+    def create_question(self, account, location, body, **kwargs):
+        return self._create(self.dataset.questions, 'question', account, location, body)
+
+    def answer_question(self, location, question, body, **kwargs):
+        with self.dataset.lock:
+            item = self._find(self._collection(self.dataset.questions, location), question)
+            answer = dict(body.get('answer') or body, author={'type': 'MERCHANT'},
+                          updateTime=timestamp(datetime.now(timezone.utc)))
+            item['topAnswers'] = [answer] + item.get('topAnswers', [])
+            item['totalAnswerCount'] = len(item['topAnswers'])
+            item['updateTime'] = answer['updateTime']
+            return 200, answer, {}
+
+    def delete_question(self, location, question, **kwargs):
+        return self._delete(self.dataset.questions, location, question)
+
+    # insights
+
+    def get_insights(self, location, query, body, **kwargs):
+        self._location(location)
+        time_range = (body.get('basicRequest') or body).get('timeRange') or {}
+        end = (datetime.fromisoformat((query.get('endTime') or time_range.get('endTime') or '').replace('Z', '+00:00')).date()
+               if (query.get('endTime') or time_range.get('endTime')) else date.today())
+        start = (datetime.fromisoformat((query.get('startTime') or time_range.get('startTime')).replace('Z', '+00:00')).date()
+                 if (query.get('startTime') or time_range.get('startTime')) else end - timedelta(days=30))
+        days = [start + timedelta(days=n) for n in range((end - start).days)]
+        metrics = [{
+            'metric': metric,
+            'dimensionalValues': [{
+                'metricOption': 'AGGREGATED_DAILY',
+                'timeDimension': {'timeRange': {'startTime': f"{day.isoformat()}T00:00:00Z"}},
+                'value': str(daily_metric_value(location, metric, day)),
+            } for day in days],
+        } for metric in INSIGHT_METRICS]
+        account = self.dataset.location_accounts[location]
+        return 200, {'locationMetrics': [{'locationName': f"accounts/{account}/locations/{location}",
+                                          'timeZone': 'UTC', 'metricValues': metrics}]}, {}
+
+    # auth
+
+    def token(self, body, **kwargs):
+        if not body.get('refresh_token') and not body.get('code'):
+            raise EmulatorError(400, 'Missing refresh_token or code', 'invalid_request')
+        return 200, {'access_token': f"emulated-{self.dataset.next_id('token')}", 'expires_in': 3600,
+                     'token_type': 'Bearer', 'scope': 'https://www.googleapis.com/auth/business.manage'}, {}
+
+    def tokeninfo(self, query, **kwargs):
+        if not query.get('access_token'):
+            raise EmulatorError(400, 'Missing access_token', 'invalid_request')
+        return 200, {'scope': 'https://www.googleapis.com/auth/business.manage', 'expires_in': 3600}, {}
+
+    def userinfo(self, **kwargs):
+        return 200, {'sub': 'emulated-user', 'email': 'owner@example.com', 'name': 'Emulated Owner'}, {}
+
+
+_A = r'accounts/(?P<account>[^/]+)'
+_L = r'locations/(?P<location>[^/]+)'
+ROUTES = [(method, family, re.compile(pattern), handler) for method, family, pattern, handler in [
+    ('GET', 'business_information', r'accounts', 'list_accounts'),
+    ('GET', 'account_management', r'accounts', 'list_accounts'),
+    ('GET', 'business_information', f'{_A}/locations', 'list_locations'),
+    ('GET', 'business_information', _L, 'get_location_information'),
+    ('PATCH', 'business_information', _L, 'patch_location'),
+    ('GET', 'business_profile', _L, 'get_location'),
+    ('GET', 'verifications', f'{_L}/verification', 'get_verification'),
+    ('GET', 'v4', f'{_A}/{_L}/reviews', 'list_reviews'),
+    ('PUT', 'v4', f'{_A}/{_L}/reviews/(?P<review>[^/]+)/reply', 'put_reply'),
+    ('DELETE', 'v4', f'{_A}/{_L}/reviews/(?P<review>[^/]+)/reply', 'delete_reply'),
+    ('GET', 'v4', f'{_A}/{_L}/localPosts', 'list_posts'),
+    ('POST', 'v4', f'{_A}/{_L}/localPosts', 'create_post'),
+    ('PATCH', 'v4', f'{_A}/{_L}/localPosts/(?P<post>[^/]+)', 'patch_post'),
+    ('DELETE', 'v4', f'{_A}/{_L}/localPosts/(?P<post>[^/]+)', 'delete_post'),
+    ('GET', 'v4', f'{_A}/{_L}/media', 'list_media'),
+    ('POST', 'v4', f'{_A}/{_L}/media', 'create_media'),
+    ('DELETE', 'v4', f'{_A}/{_L}/media/(?P<media>[^/]+)', 'delete_media'),
+    ('GET', 'v4', f'{_A}/{_L}/questions', 'list_questions'),
+    ('POST', 'v4', f'{_A}/{_L}/questions', 'create_question'),
+    ('POST', 'v4', f'{_A}/{_L}/questions/(?P<question>[^/]+)/answers(?::upsert)?', 'answer_question'),
+    ('DELETE', 'v4', f'{_A}/{_L}/questions/(?P<question>[^/]+)', 'delete_question'),
+    ('GET', 'v4', f'{_A}/{_L}/insights', 'get_insights'),
+    ('POST', 'oauth', r'token', 'token'),
+    ('GET', 'oauth', r'tokeninfo', 'tokeninfo'),
+    ('GET', 'openid', r'userinfo', 'userinfo'),
+]]
+
+
+class _EmulatorRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug("GBP emulator: " + format % args)
+
+    def _send_json(self, status: int, body: Dict, headers: Optional[Dict] = None) -> None:
+        data = b'' if status in (204, 304) else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self):
+        parts = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        family, _, path = parts.path.lstrip('/').partition('/')
+        try:
+            if 'json' in (self.headers.get('Content-Type') or '') or raw.startswith(b'{'):
+                body = json.loads(raw or b'{}')
+            else:
+                body = {k: v[-1] for k, v in parse_qs(raw.decode()).items()}
+            if family not in FAMILIES:
+                raise EmulatorError(404, f"Unknown API family {family}", 'NOT_FOUND')
+            status, payload, headers = self.server.emulator.handle(self.command, family, path, query, body,
+                                                                   self.headers)
+        except json.JSONDecodeError:
+            status, payload, headers = 400, EmulatorError(400, 'Invalid JSON body').body(), {}
+        except EmulatorError as e:
+            status, payload, headers = e.status, e.body(), e.headers
+        self._send_json(status, payload, headers)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local Google Business Profile API emulator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--accounts', type=int, default=1)
+    parser.add_argument('--locations', type=int, default=5, help='per account')
+    parser.add_argument('--reviews', type=int, default=20, help='per location')
+    parser.add_argument('--posts', type=int, default=5, help='per location')
+    parser.add_argument('--media', type=int, default=10, help='per location')
+    parser.add_argument('--questions', type=int, default=3, help='per location')
+    parser.add_argument('--latency', default='fixed:0', help='e.g. lognormal:80,0.4 (ms)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='seconds, sent with injected 429s')
+    parser.add_argument('--quota', type=int, default=0, help='calls per minute per API family (0: unlimited)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    dataset = GBPDataset().seed(args.accounts, args.locations, args.reviews, args.posts, args.media,
+                                args.questions, seed=args.seed)
+    emulator = GBPEmulator(args.host, args.port, dataset, latency=args.latency, error_rate=args.error_rate,
+                           retry_after=args.retry_after, quota=args.quota or None, seed=args.seed)
+    print(f"GBP_API_BASE_URL={emulator.url}")
+    print(f"Accounts: {', '.join(a['name'] for a in dataset.accounts.values())}")
+    try:
+        emulator._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator._httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
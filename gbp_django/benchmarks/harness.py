@@ -0,0 +1,386 @@
+"""
+Deterministic end-to-end benchmark harness for the model-bound code paths.
+
+Runs ``answer_question``, ``store_file_content`` and the automation reply/reasoning
+helpers against :class:`StubLLMServer` and reports throughput and p50/p95/p99 per
+path, so optimisations can be compared run-to-run without live Groq/Ollama calls.
+
+    DJANGO_SETTINGS_MODULE=gbp_django.settings \
+        python -m gbp_django.benchmarks.harness --chat-latency lognormal:120,0.4 --output bench.json
+
+The CLI builds a throwaway test database; from tests call :func:`run_model_benchmarks`
+inside the test transaction instead. :class:`EmulatorMixin` and
+:class:`ScriptedServerMixin` point the API clients of a test at the GBP emulator or
+at a scripted HTTP server.
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .gbp_emulator import GBPDataset, GBPEmulator
+from .llm_stub_server import StubLLMServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERIES = [
+    "What are the key features of your business automation platform?",
+    "How do I verify my business profile?",
+    "Can you help me optimize my business listing?",
+    "What's the best way to respond to customer reviews?",
+    "How can I improve my local SEO ranking?",
+]
+
+DEFAULT_DOCUMENTS = [
+    ("services.txt",
+     "GBP Automation Pro manages Google Business Profiles for agencies.\n\n"
+     "Key features include automated weekly posts, review responses within 72 hours, "
+     "monthly Q&A updates and photo uploads. " * 4),
+    ("verification.txt",
+     "Business verification can be completed by postcard, phone or email.\n\n"
+     "Verified profiles rank better in local search and unlock insights reporting. " * 4),
+    ("seo.txt",
+     "Local SEO improves with complete categories, accurate hours and regular posts.\n\n"
+     "Respond to every review and keep the business description up to date. " * 4),
+]
+
+DEFAULT_REVIEWS = [
+    (5, "Fantastic service, the team was quick and friendly."),
+    (4, "Good experience overall but parking was difficult."),
+    (2, "Waited too long for a reply to my booking request."),
+    (1, "The order arrived late and nobody answered the phone."),
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile (``pct`` in 0-100) of ``values``."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(name: str, latencies: List[float], wall_time: float, errors: int = 0) -> Dict[str, Any]:
+    """Summarise per-call latencies (seconds) into a report row in milliseconds."""
+    count = len(latencies)
+    return {
+        'name': name,
+        'count': count,
+        'errors': errors,
+        'wall_time_s': round(wall_time, 4),
+        'throughput_per_s': round(count / wall_time, 3) if wall_time > 0 else 0.0,
+        'mean_ms': round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3) if count else 0.0,
+    }
+
+
+def measure(name: str, fn: Callable[[Any], Any], inputs: Iterable[Any], concurrency: int = 1) -> Dict[str, Any]:
+    """
+    Call ``fn`` once per input and summarise the latencies.
+
+    With ``concurrency > 1`` calls run on a thread pool; each thread then uses its own
+    database connection, so only use that outside a test transaction.
+    """
+    latencies = []
+    errors = 0
+
+    def timed_call(item):
+        start = time.perf_counter()
+        try:
+            fn(item)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(timed_call, inputs))
+    else:
+        outcomes = [timed_call(item) for item in inputs]
+    wall_time = time.perf_counter() - started
+
+    for latency, error in outcomes:
+        if error is not None:
+            errors += 1
+            logger.warning(f"[BENCHMARK] {name} call failed: {error}")
+        else:
+            latencies.append(latency)
+    return summarize(name, latencies, wall_time, errors)
+
+
+def create_benchmark_business(email: str = 'benchmark@example.com'):
+    """Create the user and verified business the benchmark paths run against."""
+    from django.contrib.auth import get_user_model
+    from ..models import Business
+
+    user, _ = get_user_model().objects.get_or_create(email=email)
+    business, _ = Business.objects.get_or_create(
+        business_id='benchmark-business',
+        defaults={
+            'user': user,
+            'business_name': 'Benchmark Coffee Co',
+            'category': 'Coffee shop',
+            'address': '1 Benchmark Way',
+            'phone_number': '555-0100',
+            'website_url': 'https://benchmark.example.com',
+            'is_verified': True,
+            'is_connected': True,
+        }
+    )
+    return business
+
+
+def run_model_benchmarks(business, queries: Optional[List[str]] = None,
+                         documents: Optional[List[tuple]] = None,
+                         reviews: Optional[List[tuple]] = None,
+                         iterations: int = 1, concurrency: int = 1) -> Dict[str, Dict[str, Any]]:
+    """
+    Drive the model-bound paths for ``business`` and return one summary per path.
+
+    Documents are ingested first so that the RAG queries have chunks to retrieve.
+    """
+    from ..utils.file_processor import store_file_content
+    from ..utils.google_oauth import generate_answer, generate_review_response
+    from ..utils.llm_reasoning import generate_compliance_reasoning
+    from ..utils.rag_utils import answer_question, generate_review_responses
+
+    queries = (queries or DEFAULT_QUERIES) * iterations
+    documents = documents or DEFAULT_DOCUMENTS
+    reviews = (reviews or DEFAULT_REVIEWS) * iterations
+    business_id = business.business_id
+
+    results = {}
+    results['store_file_content'] = measure(
+        'store_file_content',
+        lambda doc: store_file_content(business_id, io.BytesIO(doc[1].encode('utf-8')), doc[0]),
+        documents,
+        concurrency,
+    )
+    results['answer_question'] = measure(
+        'answer_question',
+        lambda query: answer_question(query=query, business_id=business_id, chat_history=[]),
+        queries,
+        concurrency,
+    )
+    results['automation_qa_answer'] = measure(
+        'automation_qa_answer',
+        lambda query: generate_answer(query, business_id),
+        queries,
+        concurrency,
+    )
+    results['automation_review_response'] = measure(
+        'automation_review_response',
+        lambda review: generate_review_response(review[0], review[1], business_id),
+        reviews,
+        concurrency,
+    )
+    results['automation_review_batch'] = measure(
+        'automation_review_batch',
+        lambda batch: generate_review_responses(batch, business_id),
+        [[{'rating': rating, 'content': content} for rating, content in reviews]],
+    )
+    batch_wall_time = results['automation_review_batch']['wall_time_s']
+    results['automation_review_batch']['reviews_per_s'] = round(len(reviews) / batch_wall_time, 3) \
+        if batch_wall_time else 0.0
+    results['compliance_reasoning'] = measure(
+        'compliance_reasoning',
+        lambda _: generate_compliance_reasoning({
+            'business_id': business_id,
+            'business_name': business.business_name,
+            'website': business.website_url,
+            'compliance_score': business.compliance_score,
+        }),
+        range(iterations),
+        concurrency,
+    )
+    return results
+
+
+def run_conversation_benchmark(business, questions: Optional[List[str]] = None, conversations: int = 3,
+                               warm_up: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Hold ``conversations`` multi-turn chats through ``answer_question`` and compare the
+    first turn (possibly a cold model) with follow-up turns (warm model, cached prefix).
+    """
+    from ..utils.model_interface import OllamaModel
+    from ..utils.rag_utils import answer_question
+
+    questions = questions or DEFAULT_QUERIES
+    if warm_up:
+        OllamaModel().warm_up()
+
+    first_turns, repeat_turns = [], []
+    started = time.perf_counter()
+    for _ in range(conversations):
+        chat_history = []
+        for turn, question in enumerate(questions):
+            start = time.perf_counter()
+            answer_question(query=question, business_id=business.business_id, chat_history=chat_history)
+            (first_turns if turn == 0 else repeat_turns).append(time.perf_counter() - start)
+    wall_time = time.perf_counter() - started
+    return {
+        'first_turn': summarize('first_turn', first_turns, wall_time),
+        'repeat_turns': summarize('repeat_turns', repeat_turns, wall_time),
+    }
+
+
+@contextmanager
+def stubbed_models(chat_latency: str = 'fixed:0', embedding_latency: str = 'fixed:0', seed: int = 0,
+                   **stub_options):
+    """
+    Start a :class:`StubLLMServer` and point every model client and the media
+    storage at local, throwaway targets for the duration of the block.
+    ``stub_options`` (load_latency, prompt_eval_ms_per_token, ...) go to the stub.
+    """
+    from django.test import override_settings
+
+    with StubLLMServer(chat_latency=chat_latency, embedding_latency=embedding_latency, seed=seed,
+                       **stub_options) as stub, \
+            tempfile.TemporaryDirectory(prefix='gbp-bench-media-') as media_root, \
+            override_settings(
+                OLLAMA_BASE_URL=stub.ollama_base_url,
+                GROQ_BASE_URL=stub.groq_base_url,
+                GROQ_API_KEY='stub-key',
+                OPENAI_BASE_URL=stub.openai_base_url,
+                MEDIA_ROOT=media_root,
+            ):
+        yield stub
+
+
+class EmulatorMixin:
+    """TestCase mixin serving every API family from a seeded :class:`GBPEmulator`"""
+
+    def start_emulator(self, **kwargs):
+        from django.core.cache import cache
+        from django.test import override_settings
+
+        self.dataset = GBPDataset().seed(accounts=1, locations=3, reviews=120, posts=4, media=5, questions=12)
+        self.emulator = GBPEmulator(dataset=self.dataset, **kwargs).start()
+        self.addCleanup(self.emulator.stop)
+        overrides = override_settings(GBP_API_BASE_URL=self.emulator.url, GBP_API_BASE_URLS={},
+                                      GBP_HTTP_BACKOFF_BASE=0.001, GBP_HTTP_MAX_RETRIES=3, GBP_API_QUOTAS={})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        cache.clear()
+
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    """
+    Replies with the next scripted status for the path, then 200 once the script runs
+    out. The body is looked up by full path (query included), defaulting to an echo.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        with server.lock:
+            server.requests.append((self.command, self.path, self.headers.get('Authorization')))
+            server.client_ports.add(self.client_address[1])
+            script = server.scripts.get(self.path.split('?')[0], [])
+            status, headers = script.pop(0) if script else (200, {})
+            server.headers_seen.append(dict(self.headers))
+        body = b'' if status == 304 else json.dumps(server.bodies.get(self.path, {'path': self.path})).encode()
+        self.send_response(status)
+        for name, value in {**server.response_headers.get(self.path, {}), **headers}.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+class ScriptedServerMixin:
+    """TestCase mixin serving every API family from a :class:`ScriptedHandler` server"""
+
+    def start_server(self):
+        from django.test import override_settings
+        from ..api.client import API_BASE_URLS
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ScriptedHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.client_ports = set()
+        self.server.scripts = {}
+        self.server.bodies = {}
+        self.server.headers_seen = []
+        self.server.response_headers = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        overrides = override_settings(GBP_API_BASE_URLS={api: f"{base}/{api}" for api in API_BASE_URLS})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark model-bound paths against the LLM stub server')
+    parser.add_argument('--chat-latency', default='fixed:50')
+    parser.add_argument('--embedding-latency', default='fixed:5')
+    parser.add_argument('--load-latency', default='fixed:0', help='Simulated Ollama cold model load (ms)')
+    parser.add_argument('--prompt-eval-ms-per-token', type=float, default=0.0)
+    parser.add_argument('--warm-up', action='store_true', help='Warm up Ollama before the conversation benchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gbp_django.settings')
+    import django
+    django.setup()
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with stubbed_models(args.chat_latency, args.embedding_latency, args.seed,
+                            load_latency=args.load_latency,
+                            prompt_eval_ms_per_token=args.prompt_eval_ms_per_token) as stub:
+            business = create_benchmark_business()
+            conversation = run_conversation_benchmark(business, conversations=args.iterations,
+                                                      warm_up=args.warm_up)
+            results = run_model_benchmarks(business, iterations=args.iterations, concurrency=args.concurrency)
+            report = {
+                'config': vars(args),
+                'results': results,
+                'conversation': conversation,
+                'stub_requests': dict(stub.request_counts),
+            }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
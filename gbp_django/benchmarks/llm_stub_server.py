@@ -0,0 +1,515 @@
+"""
+Local stand-in for the Ollama, OpenAI and Groq HTTP APIs.
+
+Serves deterministic chat completions and embeddings with configurable latency so
+the model-bound code paths (RAG answers, file ingestion, automation replies) can be
+exercised and benchmarked in CI or offline.
+
+    python -m gbp_django.benchmarks.llm_stub_server --port 11500 --chat-latency lognormal:120,0.4
+
+and point the app at it:
+
+    OLLAMA_BASE_URL=http://127.0.0.1:11500/api
+    GROQ_BASE_URL=http://127.0.0.1:11500
+    OPENAI_BASE_URL=http://127.0.0.1:11500/v1
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_EMBEDDING_DIMENSIONS = 768  # nomic-embed-text, doubled to 1536 by OllamaModel
+OPENAI_EMBEDDING_DIMENSIONS = 1536
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def deterministic_embedding(text: str, dimensions: int = OPENAI_EMBEDDING_DIMENSIONS) -> List[float]:
+    """
+    Hashing-trick bag-of-words embedding.
+
+    Identical texts map to identical unit vectors and texts sharing vocabulary get a
+    proportionally higher cosine similarity, which is enough for retrieval to behave
+    sensibly without a real embedding model.
+    """
+    counts = Counter(_TOKEN_RE.findall((text or '').lower()))
+    vector = [0.0] * dimensions
+    for token, count in counts.items():
+        digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+        vector[int.from_bytes(digest, 'big') % dimensions] += 1.0 + math.log(count)
+    norm = math.sqrt(sum(v * v for v in vector))
+    if not norm:
+        vector[0] = 1.0
+        return vector
+    return [v / norm for v in vector]
+
+
+class LatencyModel:
+    """
+    Samples simulated service time from a spec string (all values in milliseconds):
+
+        fixed:50            always 50ms
+        uniform:20,80       uniform between 20ms and 80ms
+        normal:50,10        gaussian with mean 50ms and stddev 10ms, clamped at 0
+        lognormal:50,0.5    median 50ms with log-space sigma 0.5 (long right tail)
+    """
+
+    DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+    def __init__(self, spec: str = 'fixed:0', seed: Optional[int] = None):
+        name, _, raw_args = spec.partition(':')
+        if name not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{name}', expected one of {self.DISTRIBUTIONS}")
+        args = [float(a) for a in raw_args.split(',') if a.strip()] or [0.0]
+        expected_args = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}[name]
+        if len(args) != expected_args:
+            raise ValueError(f"Latency spec '{spec}' needs {expected_args} argument(s)")
+        self.spec = spec
+        self.name = name
+        self.args = args
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        """Return the next simulated latency in seconds."""
+        with self._lock:
+            if self.name == 'fixed':
+                millis = self.args[0]
+            elif self.name == 'uniform':
+                millis = self._random.uniform(self.args[0], self.args[1])
+            elif self.name == 'normal':
+                millis = self._random.gauss(self.args[0], self.args[1])
+            else:
+                millis = self.args[0] * math.exp(self.args[1] * self._random.gauss(0.0, 1.0))
+        return max(millis, 0.0) / 1000.0
+
+
+def _prompt_text(payload: Dict) -> str:
+    parts = [str(m.get('content', '')) for m in payload.get('messages') or []]
+    parts.append(str(payload.get('prompt', '') or ''))
+    return '\n'.join(parts)
+
+
+def _render_chat(messages: List[Dict]) -> str:
+    """Flatten chat messages the way a chat template would, for prefix comparisons."""
+    return ''.join(f"<|{m.get('role')}|>\n{m.get('content', '')}\n" for m in messages)
+
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+def parse_keep_alive(value) -> Optional[float]:
+    """Seconds for an Ollama ``keep_alive`` value ("30m", "1h30m", 300, "-1"); None means forever."""
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        value = str(value).strip()
+        try:
+            seconds = float(value)
+        except ValueError:
+            parts = _DURATION_RE.findall(value)
+            if not parts or ''.join(n + u for n, u in parts) != value:
+                raise ValueError(f"Invalid keep_alive duration: {value!r}")
+            seconds = sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+    return None if seconds < 0 else seconds
+
+
+def _last_user_message(payload: Dict) -> str:
+    for message in reversed(payload.get('messages') or []):
+        if message.get('role') == 'user':
+            return str(message.get('content', ''))
+    return str(payload.get('prompt', '') or '')
+
+
+def default_responder(payload: Dict) -> str:
+    """
+    Deterministic completion text for a chat/generate payload.
+
+    "valid JSON array" prompts get one reply per numbered entry (batched review replies).
+    JSON-mode and "valid JSON" prompts get a small compliance plan in the schema the
+    reasoning pipeline expects; feedback rounds ("executed_actions") get an empty plan
+    so feedback loops terminate. Everything else gets a short echo of the question.
+    """
+    prompt_text = _prompt_text(payload)
+    digest = hashlib.sha1(prompt_text.encode('utf-8')).hexdigest()[:8]
+    last_message = _last_user_message(payload)
+    if 'valid json array' in last_message.lower():
+        # Batched replies: one item per numbered entry in the request
+        numbers = [int(n) for n in re.findall(r'"index":\s*(\d+)', last_message.split('Reviews:', 1)[-1])]
+        return json.dumps([{'index': n, 'reply': f'Stub reply {digest}-{n}'} for n in numbers])
+    wants_json = ((payload.get('response_format') or {}).get('type') == 'json_object'
+                  or 'valid json' in prompt_text.lower())
+    if wants_json:
+        actions = []
+        if 'executed_actions' not in prompt_text:
+            actions = [{
+                'type': 'log',
+                'target': 'website',
+                'details': f'stub-plan-{digest}',
+                'risk_score': 1,
+                'confidence': 0.9,
+                'eta': '2025-01-01T00:00:00Z',
+                'dependencies': []
+            }]
+        return json.dumps({
+            'reasoning': f'Stub compliance analysis {digest}.',
+            'steps': [{
+                'instruction': 'Verify the business website is reachable.',
+                'expected_outcome': 'Website verified.'
+            }],
+            'actions': actions,
+            'questions': []
+        })
+    question = ' '.join(last_message.split())[:160]
+    return f"Stub response {digest}: thank you for asking about {question}"
+
+
+class StubLLMServer:
+    """
+    Threaded HTTP server speaking enough of the Ollama, OpenAI and Groq APIs for the
+    app's model clients. Usable as a context manager:
+
+        with StubLLMServer(chat_latency='normal:80,15') as stub:
+            settings.OLLAMA_BASE_URL = stub.ollama_base_url
+
+    Ollama routes also model what makes real Ollama latency bimodal: a model that is not
+    resident pays ``load_latency`` and stays loaded for the request's ``keep_alive``
+    (default 5m), and chat prompts pay ``prompt_eval_ms_per_token`` only for the part that
+    does not share a prefix with the previous prompt + reply (the KV cache). Each chat is
+    logged in ``prompt_eval_log``.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, chat_latency: str = 'fixed:0',
+                 embedding_latency: str = 'fixed:0', seed: int = 0,
+                 responder: Optional[Callable[[Dict], str]] = None, load_latency: str = 'fixed:0',
+                 prompt_eval_ms_per_token: float = 0.0, default_keep_alive='5m'):
+        self.chat_latency = LatencyModel(chat_latency, seed=seed)
+        self.embedding_latency = LatencyModel(embedding_latency, seed=seed + 1)
+        self.load_latency = LatencyModel(load_latency, seed=seed + 2)
+        self.prompt_eval_ms_per_token = prompt_eval_ms_per_token
+        self.default_keep_alive = default_keep_alive
+        self.responder = responder or default_responder
+        self.request_counts = Counter()
+        self.keep_alive_seen = {}
+        self.prompt_eval_log = []
+        self._counts_lock = threading.Lock()
+        self._model_lock = threading.Lock()
+        self._resident = {}
+        self._prefix_cache = {}
+        self._httpd = ThreadingHTTPServer((host, port), _StubRequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def ollama_base_url(self) -> str:
+        return f"{self.url}/api"
+
+    @property
+    def groq_base_url(self) -> str:
+        return self.url
+
+    @property
+    def openai_base_url(self) -> str:
+        return f"{self.url}/v1"
+
+    def start(self) -> 'StubLLMServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='llm-stub-server', daemon=True)
+        self._thread.start()
+        logger.info(f"LLM stub server listening on {self.url}")
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> 'StubLLMServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def record(self, route: str, amount: int = 1) -> None:
+        with self._counts_lock:
+            self.request_counts[route] += amount
+
+    def is_resident(self, model: str) -> bool:
+        with self._model_lock:
+            return self._is_resident(model, time.monotonic())
+
+    def _is_resident(self, model: str, now: float) -> bool:
+        if model not in self._resident:
+            return False
+        expiry = self._resident[model]
+        return expiry is None or expiry > now
+
+    def _ensure_loaded(self, payload: Dict) -> float:
+        """Simulate loading ``payload['model']`` if it is not resident; returns the load time."""
+        model = payload.get('model')
+        keep_alive = payload.get('keep_alive', self.default_keep_alive)
+        ttl = parse_keep_alive(keep_alive)
+        with self._model_lock:
+            self.keep_alive_seen[model] = keep_alive
+            load_time = 0.0
+            if not self._is_resident(model, time.monotonic()):
+                # Loads are serialised, like a single Ollama runner
+                load_time = self.load_latency.sample()
+                time.sleep(load_time)
+                self._prefix_cache.pop(model, None)
+                self.record('model_loads')
+            now = time.monotonic()
+            self._resident[model] = None if ttl is None else now + ttl
+        return load_time
+
+    def _evaluate_prompt(self, model: str, prompt: str) -> Dict[str, int]:
+        """Charge prompt evaluation for the part of ``prompt`` not covered by the cached prefix."""
+        with self._model_lock:
+            cached_text = self._prefix_cache.get(model, '')
+        cached_chars = len(os.path.commonprefix([cached_text, prompt]))
+        evaluated = (len(prompt) - cached_chars) // 4
+        cached = cached_chars // 4
+        time.sleep(evaluated * self.prompt_eval_ms_per_token / 1000.0)
+        with self._counts_lock:
+            self.prompt_eval_log.append({'model': model, 'evaluated_tokens': evaluated, 'cached_tokens': cached})
+        self.record('prompt_tokens_evaluated', evaluated)
+        self.record('prompt_tokens_cached', cached)
+        return {'evaluated': evaluated, 'cached': cached}
+
+    def _remember_prefix(self, model: str, text: str) -> None:
+        with self._model_lock:
+            if self._is_resident(model, time.monotonic()):
+                self._prefix_cache[model] = text
+
+    # ---- response builders -------------------------------------------------
+
+    def ollama_chat(self, payload: Dict) -> Dict:
+        model = payload.get('model')
+        load_time = self._ensure_loaded(payload)
+        created_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        messages = payload.get('messages') or []
+        if not messages:
+            # Ollama's documented way to preload a model: a chat with no messages
+            return {'model': model, 'created_at': created_at, 'message': {'role': 'assistant', 'content': ''},
+                    'done_reason': 'load', 'done': True, 'load_duration': int(load_time * 1e9)}
+
+        prompt = _render_chat(messages)
+        tokens = self._evaluate_prompt(model, prompt)
+        time.sleep(self.chat_latency.sample())
+        content = self.responder(payload)
+        self._remember_prefix(model, prompt + _render_chat([{'role': 'assistant', 'content': content}]))
+        return {
+            'model': model,
+            'created_at': created_at,
+            'message': {'role': 'assistant', 'content': content},
+            'done': True,
+            'load_duration': int(load_time * 1e9),
+            'prompt_eval_count': tokens['evaluated'],
+            'eval_count': len(content) // 4,
+        }
+
+    def ollama_generate(self, payload: Dict) -> Dict:
+        model = payload.get('model')
+        load_time = self._ensure_loaded(payload)
+        prompt = f"{payload.get('system', '')}\n{payload.get('prompt', '')}"
+        tokens = self._evaluate_prompt(model, prompt)
+        time.sleep(self.chat_latency.sample())
+        content = self.responder(payload)
+        self._remember_prefix(model, prompt + content)
+        return {
+            'model': model,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'response': content,
+            'done': True,
+            'load_duration': int(load_time * 1e9),
+            'prompt_eval_count': tokens['evaluated'],
+        }
+
+    def ollama_embeddings(self, payload: Dict) -> Dict:
+        self._ensure_loaded(payload)
+        time.sleep(self.embedding_latency.sample())
+        return {'embedding': deterministic_embedding(payload.get('prompt', ''), OLLAMA_EMBEDDING_DIMENSIONS)}
+
+    def ollama_embed(self, payload: Dict) -> Dict:
+        inputs = payload.get('input', '')
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        self._ensure_loaded(payload)
+        time.sleep(self.embedding_latency.sample())
+        return {
+            'model': payload.get('model'),
+            'embeddings': [deterministic_embedding(text, OLLAMA_EMBEDDING_DIMENSIONS) for text in inputs],
+        }
+
+    def chat_completion(self, payload: Dict) -> Dict:
+        time.sleep(self.chat_latency.sample())
+        content = self.responder(payload)
+        prompt_tokens = len(_prompt_text(payload)) // 4
+        completion_tokens = len(content) // 4
+        return {
+            'id': f"chatcmpl-stub-{self.request_counts['chat_completions']}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': payload.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'logprobs': None,
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        }
+
+    def chat_completion_chunks(self, payload: Dict) -> List[Dict]:
+        completion = self.chat_completion(payload)
+        content = completion['choices'][0]['message']['content']
+        pieces = re.findall(r'\S+\s*', content) or ['']
+        chunks = []
+        for index, piece in enumerate(pieces):
+            chunks.append({
+                'id': completion['id'],
+                'object': 'chat.completion.chunk',
+                'created': completion['created'],
+                'model': completion['model'],
+                'choices': [{
+                    'index': 0,
+                    'delta': {'role': 'assistant', 'content': piece} if index == 0 else {'content': piece},
+                    'logprobs': None,
+                    'finish_reason': 'stop' if index == len(pieces) - 1 else None,
+                }],
+            })
+        return chunks
+
+    def openai_embeddings(self, payload: Dict) -> Dict:
+        inputs = payload.get('input', '')
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        time.sleep(self.embedding_latency.sample())
+        return {
+            'object': 'list',
+            'model': payload.get('model', 'stub'),
+            'data': [
+                {'object': 'embedding', 'index': index, 'embedding': deterministic_embedding(text)}
+                for index, text in enumerate(inputs)
+            ],
+            'usage': {'prompt_tokens': 0, 'total_tokens': 0},
+        }
+
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    POST_ROUTES = {
+        '/api/chat': ('ollama_chat', 'ollama_chat'),
+        '/api/generate': ('ollama_generate', 'ollama_generate'),
+        '/api/embeddings': ('ollama_embeddings', 'ollama_embeddings'),
+        '/api/embed': ('ollama_embed', 'ollama_embeddings'),
+        '/v1/chat/completions': ('chat_completion', 'chat_completions'),
+        '/openai/v1/chat/completions': ('chat_completion', 'chat_completions'),
+        '/v1/embeddings': ('openai_embeddings', 'openai_embeddings'),
+        '/openai/v1/embeddings': ('openai_embeddings', 'openai_embeddings'),
+    }
+
+    def log_message(self, format, *args):
+        logger.debug("LLM stub: " + format % args)
+
+    def _send_json(self, status: int, body: Dict) -> None:
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_event_stream(self, chunks: List[Dict]) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/api/tags':
+            self._send_json(200, {'models': [{'name': 'llama3.2:1b'}, {'name': 'nomic-embed-text'}]})
+        elif path in ('/v1/models', '/openai/v1/models'):
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'stub', 'object': 'model'}]})
+        else:
+            self._send_json(404, {'error': f'Unknown route {path}'})
+
+    def do_POST(self):
+        path = self.path.split('?', 1)[0]
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {'error': 'Invalid JSON body'})
+            return
+
+        route = self.POST_ROUTES.get(path)
+        if not route:
+            self._send_json(404, {'error': f'Unknown route {path}'})
+            return
+
+        stub = self.server.stub
+        handler_name, counter = route
+        stub.record(counter)
+        if handler_name == 'chat_completion' and payload.get('stream'):
+            self._send_event_stream(stub.chat_completion_chunks(payload))
+            return
+        self._send_json(200, getattr(stub, handler_name)(payload))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline Ollama/OpenAI/Groq-compatible stub server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11500)
+    parser.add_argument('--chat-latency', default='fixed:0', help='e.g. lognormal:120,0.4 (ms)')
+    parser.add_argument('--embedding-latency', default='fixed:0', help='e.g. normal:15,3 (ms)')
+    parser.add_argument('--load-latency', default='fixed:0', help='Ollama cold model load, e.g. fixed:4000 (ms)')
+    parser.add_argument('--prompt-eval-ms-per-token', type=float, default=0.0,
+                        help='Ollama cost per uncached prompt token (ms)')
+    parser.add_argument('--default-keep-alive', default='5m')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    stub = StubLLMServer(args.host, args.port, args.chat_latency, args.embedding_latency, args.seed,
+                         load_latency=args.load_latency, prompt_eval_ms_per_token=args.prompt_eval_ms_per_token,
+                         default_keep_alive=args.default_keep_alive)
+    print(f"OLLAMA_BASE_URL={stub.ollama_base_url}")
+    print(f"GROQ_BASE_URL={stub.groq_base_url}")
+    print(f"OPENAI_BASE_URL={stub.openai_base_url}")
+    try:
+        stub._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub._httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Local stand-in for the Pub/Sub push subscription that delivers Business Profile
+notifications. Wraps notifications the way Pub/Sub does and POSTs them to the
+app's push endpoint, so the push ingestion path can be exercised without Google.
+
+    python -m gbp_django.benchmarks.pubsub_publisher \\
+        --url http://127.0.0.1:8000/api/google/notifications/ --token "$GBP_PUSH_VERIFICATION_TOKEN" \\
+        --type NEW_REVIEW --location accounts/123/locations/456 --count 20 --interval 0.05
+"""
+
+import argparse
+import base64
+import itertools
+import json
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+_message_ids = itertools.count(1)
+
+
+def build_push_envelope(notification: Dict, message_id: Optional[str] = None,
+                        subscription: str = 'projects/local/subscriptions/gbp-notifications') -> Dict:
+    """Wrap a notification the way a Pub/Sub push subscription delivers it"""
+    return {
+        'message': {
+            'data': base64.b64encode(json.dumps(notification).encode()).decode(),
+            'messageId': message_id or str(next(_message_ids)),
+            'publishTime': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'attributes': {},
+        },
+        'subscription': subscription,
+    }
+
+
+def notification(kind: str, location: str, resource_id: Optional[str] = None) -> Dict:
+    """A notification payload of the given type for a location (accounts/*/locations/*)"""
+    payload = {'type': kind, 'location': location}
+    collection = {'REVIEW': 'reviews', 'QUESTION': 'questions', 'ANSWER': 'questions', 'MEDIA': 'media'}
+    for suffix, path in collection.items():
+        if kind.endswith(suffix):
+            payload[suffix.lower()] = f"{location}/{path}/{resource_id or int(time.time() * 1000)}"
+    return payload
+
+
+def publish(url: str, token: str, notifications: List[Dict], interval: float = 0.0,
+            session: Optional[requests.Session] = None) -> List[requests.Response]:
+    """POST each notification to the push endpoint, as Pub/Sub would, and return the responses"""
+    session = session or requests.Session()
+    responses = []
+    for payload in notifications:
+        responses.append(session.post(url, params={'token': token}, json=build_push_envelope(payload), timeout=10))
+        if interval:
+            time.sleep(interval)
+    return responses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Push Business Profile notifications to a local endpoint')
+    parser.add_argument('--url', default='http://127.0.0.1:8000/api/google/notifications/')
+    parser.add_argument('--token', required=True, help='GBP_PUSH_VERIFICATION_TOKEN of the app')
+    parser.add_argument('--type', default='NEW_REVIEW', help='e.g. NEW_REVIEW, NEW_QUESTION, GOOGLE_UPDATE')
+    parser.add_argument('--location', required=True, help='accounts/<account>/locations/<location>')
+    parser.add_argument('--count', type=int, default=1)
+    parser.add_argument('--interval', type=float, default=0.0, help='seconds between messages')
+    args = parser.parse_args(argv)
+
+    payloads = [notification(args.type, args.location) for _ in range(args.count)]
+    for response in publish(args.url, args.token, payloads, args.interval):
+        print(response.status_code, response.text)
+
+
+if __name__ == '__main__':
+    main()
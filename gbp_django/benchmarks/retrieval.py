@@ -0,0 +1,386 @@
+"""
+Retrieval quality-vs-latency benchmark over synthetic knowledge bases.
+
+A seeded generator writes documents of Zipf-distributed filler text with planted
+"facts" (sentences made of rare keywords) plus distractor sentences that reuse some
+of those keywords. Each query targets one fact, so the relevant chunks are known
+exactly: the chunks containing every keyword of the fact.
+
+Every retrieval configuration is scored on recall@k, MRR and per-query latency, and
+compared with the exact-scan baseline for the same chunking/fan-out/threshold (what
+pgvector does without an index). Chunks are produced by the production chunker and
+query rephrasings by ``rag_utils.build_query_prompts``; embeddings come from the
+deterministic stub embedder, so similarity thresholds are on that embedder's scale.
+
+    DJANGO_SETTINGS_MODULE=gbp_django.settings \
+        python -m gbp_django.benchmarks.retrieval --documents 200 --output retrieval.json
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .harness import summarize
+from .llm_stub_server import _TOKEN_RE, deterministic_embedding
+
+# Mirrors search_knowledge_base: four rephrasings, results concatenated in prompt order
+DEFAULT_CONFIG = {
+    'name': 'baseline',
+    'index': 'exact',         # 'exact' full scan or 'ivf' (inverted lists, like ivfflat)
+    'nlist': None,            # ivf lists, defaults to sqrt(num_chunks)
+    'nprobe': 4,              # ivf lists probed per query
+    'fan_out': 4,             # number of query rephrasings embedded and searched
+    'merge': 'concat',        # 'concat' (production) or 'max' (dedupe, best score wins)
+    'top_k': 20,
+    'min_similarity': 0.0,
+    'chunk_size': 2000,
+    'min_chunk_size': 200,
+    'overlap': 100,
+}
+
+DEFAULT_CONFIGS = [
+    {'name': 'production'},
+    {'name': 'single_prompt', 'fan_out': 1},
+    {'name': 'max_merge_top5', 'merge': 'max', 'top_k': 5},
+    {'name': 'threshold_0.1', 'min_similarity': 0.1},
+    {'name': 'chunk_800', 'chunk_size': 800},
+    {'name': 'ivf_nprobe4', 'index': 'ivf', 'nprobe': 4},
+    {'name': 'ivf_nprobe1', 'index': 'ivf', 'nprobe': 1},
+]
+
+_CONSONANTS = 'bcdfghjklmnprstvz'
+_VOWELS = 'aeiou'
+
+
+def _make_words(count: int, rng: random.Random, exclude: Sequence[str] = ()) -> List[str]:
+    """Generate ``count`` unique pronounceable pseudo-words."""
+    seen = set(exclude)
+    words = []
+    while len(words) < count:
+        word = ''.join(rng.choice(_CONSONANTS) + rng.choice(_VOWELS) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def generate_corpus(num_documents: int = 50, paragraphs_per_document: int = 8,
+                    sentences_per_paragraph: Tuple[int, int] = (3, 7),
+                    facts_per_document: int = 2, distractors_per_fact: int = 2,
+                    vocab_size: int = 3000, seed: int = 0) -> Dict[str, Any]:
+    """
+    Build a synthetic knowledge base with known answers.
+
+    Returns ``{'params', 'documents', 'queries'}``; each query carries the ``keywords``
+    a chunk must contain to count as relevant.
+    """
+    rng = random.Random(seed)
+    vocabulary = _make_words(vocab_size, rng)
+    num_facts = num_documents * facts_per_document
+    keyword_pool = _make_words(num_facts * 4, rng, exclude=vocabulary)
+    cum_weights = []
+    total = 0.0
+    for rank in range(vocab_size):
+        total += 1.0 / (rank + 1)
+        cum_weights.append(total)
+
+    def filler(n):
+        return rng.choices(vocabulary, cum_weights=cum_weights, k=n)
+
+    def sentence(words):
+        return ' '.join(words).capitalize() + '.'
+
+    documents = []
+    for doc_index in range(num_documents):
+        paragraphs = [
+            [sentence(filler(rng.randint(6, 14))) for _ in range(rng.randint(*sentences_per_paragraph))]
+            for _ in range(paragraphs_per_document)
+        ]
+        documents.append({'file_name': f'doc_{doc_index:05d}.txt', 'paragraphs': paragraphs})
+
+    def plant(doc_index, text):
+        paragraph = rng.choice(documents[doc_index]['paragraphs'])
+        paragraph.insert(rng.randint(0, len(paragraph)), text)
+
+    queries = []
+    for fact_index in range(num_facts):
+        doc_index = fact_index // facts_per_document
+        keywords = keyword_pool[fact_index * 4:(fact_index + 1) * 4]
+        words = filler(4)
+        plant(doc_index, sentence([keywords[0], words[0], keywords[1], words[1], keywords[2], keywords[3], words[2]]))
+
+        for _ in range(distractors_per_fact):
+            other = rng.randrange(num_documents)
+            shared = rng.sample(keywords, 2)
+            plant(other, sentence(filler(3) + shared + filler(4)))
+
+        asked = rng.sample(keywords, 3) + filler(2)
+        rng.shuffle(asked)
+        queries.append({
+            'query_id': fact_index,
+            'text': f"What do you know about {' '.join(asked)}?",
+            'keywords': keywords,
+            'file_name': documents[doc_index]['file_name'],
+        })
+
+    for document in documents:
+        document['text'] = '\n\n'.join(' '.join(p) for p in document.pop('paragraphs'))
+
+    return {
+        'params': {
+            'num_documents': num_documents,
+            'paragraphs_per_document': paragraphs_per_document,
+            'facts_per_document': facts_per_document,
+            'distractors_per_fact': distractors_per_fact,
+            'vocab_size': vocab_size,
+            'seed': seed,
+        },
+        'documents': documents,
+        'queries': queries,
+    }
+
+
+def _embed_matrix(texts: List[str]) -> np.ndarray:
+    return np.asarray([deterministic_embedding(text) for text in texts], dtype=np.float32)
+
+
+class ExactIndex:
+    """Full scan over every chunk, the sequential-scan plan pgvector uses without an index."""
+
+    def __init__(self, matrix: np.ndarray, **kwargs):
+        self.matrix = matrix
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        scores = self.matrix @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+
+class IVFIndex:
+    """Inverted-file index (spherical k-means lists, probe the nearest ``nprobe``), like ivfflat."""
+
+    def __init__(self, matrix: np.ndarray, nlist: Optional[int] = None, seed: int = 0,
+                 iterations: int = 10, **kwargs):
+        self.matrix = matrix
+        nlist = max(1, min(nlist or int(np.sqrt(len(matrix))), len(matrix)))
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(len(matrix), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(matrix @ centroids.T, axis=1)
+            for list_id in range(nlist):
+                members = matrix[assignment == list_id]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[list_id] = centroid / norm if norm else centroid
+        self.centroids = centroids
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+        self.lists = [np.flatnonzero(assignment == list_id) for list_id in range(nlist)]
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = 4) -> List[Tuple[int, float]]:
+        probe = np.argsort(-(self.centroids @ query))[:nprobe]
+        candidates = np.concatenate([self.lists[list_id] for list_id in probe])
+        if not len(candidates):
+            return []
+        scores = self.matrix[candidates] @ query
+        order = np.argsort(-scores)[:k]
+        return [(int(candidates[i]), float(scores[i])) for i in order]
+
+
+INDEXES = {'exact': ExactIndex, 'ivf': IVFIndex}
+
+
+def _chunk_corpus(corpus: Dict[str, Any], config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    from ..utils.file_processor import chunk_paragraphs, split_paragraphs
+
+    chunks = []
+    for document in corpus['documents']:
+        pieces = chunk_paragraphs(split_paragraphs(document['text']), config['chunk_size'],
+                                  config['min_chunk_size'], config['overlap'])
+        for position, text in enumerate(pieces):
+            chunks.append({'file_name': document['file_name'], 'position': position, 'text': text,
+                           'tokens': set(_TOKEN_RE.findall(text.lower()))})
+    return chunks
+
+
+def _merge(result_lists: List[List[Tuple[int, float]]], merge: str, top_k: int) -> List[Tuple[int, float]]:
+    if merge == 'concat':
+        return [hit for hits in result_lists for hit in hits]
+    best = {}
+    for hits in result_lists:
+        for chunk_id, score in hits:
+            if score > best.get(chunk_id, -1.0):
+                best[chunk_id] = score
+    return sorted(best.items(), key=lambda hit: -hit[1])[:top_k]
+
+
+def _run_queries(corpus, chunks, index, config, query_embeddings) -> Dict[str, Any]:
+    """Search every query against ``index``; returns ranked chunk ids and timings per query."""
+    rankings, raw_counts, search_times, total_times = [], [], [], []
+    search_kwargs = {'nprobe': config['nprobe']} if config['index'] == 'ivf' else {}
+    started = time.perf_counter()
+    for query in corpus['queries']:
+        embeddings, embed_time = query_embeddings[query['query_id']]
+        search_start = time.perf_counter()
+        result_lists = []
+        for embedding in embeddings:
+            hits = index.search(embedding, config['top_k'], **search_kwargs)
+            result_lists.append([hit for hit in hits if hit[1] >= config['min_similarity']])
+        merged = _merge(result_lists, config['merge'], config['top_k'])
+        search_time = time.perf_counter() - search_start
+
+        ranked = list(dict.fromkeys(chunk_id for chunk_id, _ in merged))
+        rankings.append(ranked)
+        raw_counts.append(len(merged))
+        search_times.append(search_time)
+        total_times.append(embed_time + search_time)
+    return {
+        'rankings': rankings,
+        'raw_counts': raw_counts,
+        'search_times': search_times,
+        'total_times': total_times,
+        'wall_time': time.perf_counter() - started,
+    }
+
+
+def _quality(corpus, chunks, rankings, top_k) -> Dict[str, Any]:
+    ks = sorted({k for k in (1, 5, 10, top_k) if k <= top_k})
+    recall = {k: [] for k in ks}
+    reciprocal_ranks = []
+    unanswerable = 0
+    for query, ranked in zip(corpus['queries'], rankings):
+        keywords = set(query['keywords'])
+        relevant = {i for i, chunk in enumerate(chunks) if keywords <= chunk['tokens']}
+        if not relevant:
+            unanswerable += 1
+            continue
+        for k in ks:
+            recall[k].append(len(relevant.intersection(ranked[:k])) / len(relevant))
+        rank = next((position for position, chunk_id in enumerate(ranked, 1) if chunk_id in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    return {
+        'recall_at_k': {str(k): round(float(np.mean(values)), 4) if values else 0.0 for k, values in recall.items()},
+        'mrr': round(float(np.mean(reciprocal_ranks)), 4) if reciprocal_ranks else 0.0,
+        'unanswerable_queries': unanswerable,
+    }
+
+
+def run_retrieval_benchmark(corpus: Dict[str, Any], configs: Optional[List[Dict[str, Any]]] = None,
+                            seed: int = 0) -> Dict[str, Any]:
+    """Score each configuration against the corpus and its exact-scan baseline."""
+    from ..utils.rag_utils import build_query_prompts
+
+    configs = [{**DEFAULT_CONFIG, **config} for config in (configs or DEFAULT_CONFIGS)]
+    chunk_cache, index_cache, embedding_cache = {}, {}, {}
+    results = []
+
+    for config in configs:
+        if config['index'] not in INDEXES:
+            raise ValueError(f"Unknown index type: {config['index']}")
+        if config['merge'] not in ('concat', 'max'):
+            raise ValueError(f"Unknown merge strategy: {config['merge']}")
+
+        chunk_key = (config['chunk_size'], config['min_chunk_size'], config['overlap'])
+        if chunk_key not in chunk_cache:
+            chunks = _chunk_corpus(corpus, config)
+            chunk_cache[chunk_key] = (chunks, _embed_matrix([chunk['text'] for chunk in chunks]))
+        chunks, matrix = chunk_cache[chunk_key]
+
+        if config['fan_out'] not in embedding_cache:
+            query_embeddings = {}
+            for query in corpus['queries']:
+                start = time.perf_counter()
+                prompts = build_query_prompts(query['text'], config['fan_out'])
+                query_embeddings[query['query_id']] = (_embed_matrix(prompts), time.perf_counter() - start)
+            embedding_cache[config['fan_out']] = query_embeddings
+        query_embeddings = embedding_cache[config['fan_out']]
+
+        def build(index_type):
+            key = chunk_key + (index_type, config['nlist'])
+            if key not in index_cache:
+                start = time.perf_counter()
+                index = INDEXES[index_type](matrix, nlist=config['nlist'], seed=seed)
+                index_cache[key] = (index, time.perf_counter() - start)
+            return index_cache[key]
+
+        index, build_time = build(config['index'])
+        run = _run_queries(corpus, chunks, index, config, query_embeddings)
+        exact_run = run if config['index'] == 'exact' else _run_queries(
+            corpus, chunks, build('exact')[0], {**config, 'index': 'exact'}, query_embeddings)
+
+        overlap = [
+            len(set(ranked[:config['top_k']]) & set(exact[:config['top_k']])) / len(exact[:config['top_k']])
+            if exact else 1.0
+            for ranked, exact in zip(run['rankings'], exact_run['rankings'])
+        ]
+        latency = summarize(config['name'], run['total_times'], run['wall_time'])
+        search_latency = summarize(config['name'], run['search_times'], run['wall_time'])
+        exact_search = summarize('exact', exact_run['search_times'], exact_run['wall_time'])
+        duplicates = sum(raw - len(ranked) for raw, ranked in zip(run['raw_counts'], run['rankings']))
+
+        results.append({
+            'config': dict(config),
+            'num_chunks': len(chunks),
+            'index_build_s': round(build_time, 4),
+            **_quality(corpus, chunks, run['rankings'], config['top_k']),
+            'overlap_with_exact': round(float(np.mean(overlap)), 4) if overlap else 1.0,
+            'avg_results_returned': round(float(np.mean(run['raw_counts'])), 2),
+            'duplicate_results': duplicates,
+            'latency': latency,
+            'search_latency': search_latency,
+            'exact_search_p50_ms': exact_search['p50_ms'],
+            'search_speedup_vs_exact': round(exact_search['p50_ms'] / search_latency['p50_ms'], 3)
+            if search_latency['p50_ms'] else None,
+        })
+
+    return {
+        'corpus': {**corpus['params'], 'num_queries': len(corpus['queries'])},
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark retrieval quality vs latency on a synthetic corpus')
+    parser.add_argument('--documents', type=int, default=50)
+    parser.add_argument('--paragraphs', type=int, default=8)
+    parser.add_argument('--facts-per-document', type=int, default=2)
+    parser.add_argument('--distractors-per-fact', type=int, default=2)
+    parser.add_argument('--vocab-size', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--configs', help='JSON file with a list of config overrides (see DEFAULT_CONFIG)')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gbp_django.settings')
+    import django
+    django.setup()
+
+    configs = None
+    if args.configs:
+        with open(args.configs) as f:
+            configs = json.load(f)
+
+    corpus = generate_corpus(num_documents=args.documents, paragraphs_per_document=args.paragraphs,
+                             facts_per_document=args.facts_per_document,
+                             distractors_per_fact=args.distractors_per_fact,
+                             vocab_size=args.vocab_size, seed=args.seed)
+    report = run_retrieval_benchmark(corpus, configs, seed=args.seed)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
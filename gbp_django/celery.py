@@ -0,0 +1,24 @@
+import os
+import threading
+
+from celery import Celery
+from celery.signals import worker_ready
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gbp_django.settings')
+
+app = Celery('gbp_django')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks(['gbp_django.tasks'])
+
+
+@worker_ready.connect
+def warm_up_models(sender=None, **kwargs):
+    """Load the Ollama models when a worker starts so the first task does not pay the model load."""
+    from django.conf import settings
+
+    if not settings.OLLAMA_ENABLED:
+        return
+    from .utils.model_interface import OllamaModel
+
+    # Loading can take several seconds; don't hold up the worker accepting tasks
+    threading.Thread(target=OllamaModel().warm_up, name='ollama-warm-up', daemon=True).start()
@@ -128,6 +128,9 @@ class Business(models.Model):
     is_verified = models.BooleanField(default=False)
     business_hours = models.JSONField(default=dict, blank=True)
     business_attributes = models.JSONField(default=dict, blank=True)
+    # Hash of each editable field as last seen at (or written to) Google, keyed by field name
+    remote_field_hashes = models.JSONField(default=dict, blank=True)
+    remote_update_time = models.DateTimeField(null=True, blank=True)  # updateTime of the location at that point
     services_offered = models.JSONField(default=list, blank=True)
     is_connected = models.BooleanField(default=False)  # Indicates if connected via Google OAuth
     email_settings = models.JSONField(default=dict, help_text="Email notification preferences", blank=True)
@@ -225,17 +228,34 @@ class Review(models.Model):
     content = models.TextField(blank=True, null=True)
     responded = models.BooleanField(default=False)
     response = models.TextField(blank=True, null=True)
+    # Reply drafted by the automation; set once, so a review is drafted and handled a single time
+    draft_response = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
 class QandA(models.Model):
     business = models.ForeignKey(Business, on_delete=models.CASCADE)
+    # Google resource name (accounts/*/locations/*/questions/*); empty for questions
+    # we only know about locally
+    question_id = models.CharField(max_length=255, unique=True, blank=True, null=True)
     question = models.TextField()
     answer = models.TextField(blank=True, null=True)
     answered = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+class Media(models.Model):
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='media_items')
+    media_id = models.CharField(max_length=255, unique=True)  # Google resource name
+    media_format = models.CharField(max_length=50, default='PHOTO')
+    category = models.CharField(max_length=50, blank=True, null=True)
+    google_url = models.TextField(blank=True, null=True)
+    thumbnail_url = models.TextField(blank=True, null=True)
+    description = models.TextField(blank=True, null=True)
+    create_time = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
 class FAQ(models.Model):
     business = models.ForeignKey(Business, on_delete=models.CASCADE)
     question = models.TextField()
@@ -397,6 +417,155 @@ class Task(models.Model):
             return self.next_run
         return base_time  # Fallback to current time if no valid schedule
 
+    class Meta:
+        indexes = [
+            # Only schedulable rows are indexed, so the due-task scan (tasks.scheduler)
+            # reads just the tasks that are due
+            models.Index(fields=['next_run'], name='task_due_next_run_idx',
+                         condition=models.Q(is_active=True, status='PENDING')),
+            # ... and the stale-claim check reads only running ones
+            models.Index(fields=['last_run'], name='task_running_last_run_idx',
+                         condition=models.Q(is_active=True, status='RUNNING')),
+        ]
+
+
+class ComplianceAction(models.Model):
+    """
+    One action from a compliance reasoning plan, persisted so an interrupted
+    feedback loop can pick up where it stopped instead of re-planning.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+        ('SKIPPED', 'Skipped')
+    ]
+
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='compliance_actions')
+    run_id = models.CharField(max_length=32, db_index=True)
+    iteration = models.IntegerField(default=0)
+    action_key = models.CharField(max_length=64, help_text="Hash of type, target and details")
+    action_type = models.CharField(max_length=50)
+    target = models.CharField(max_length=255, blank=True, default='')
+    payload = models.JSONField(default=dict, help_text="Action as emitted by the reasoning model")
+    dependencies = models.JSONField(default=list, blank=True, help_text="Resolved action keys")
+    risk_score = models.IntegerField(null=True, blank=True)
+    eta = models.CharField(max_length=64, blank=True, default='')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    result = models.JSONField(null=True, blank=True)
+    error_message = models.TextField(blank=True, null=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('run_id', 'action_key')
+        indexes = [
+            models.Index(fields=['business', 'status']),
+        ]
+
+
+class SyncWatermark(models.Model):
+    """
+    How far incremental sync of one resource (reviews, posts, ...) of a location has
+    got, plus metrics of the last run. ``page_token`` and ``pending_update_time``
+    are only set while a run is in progress, so an interrupted run can resume.
+    """
+    RESOURCE_CHOICES = [
+        ('reviews', 'Reviews'),
+        ('questions', 'Questions'),
+        ('posts', 'Posts'),
+        ('media', 'Media')
+    ]
+
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='sync_watermarks')
+    resource = models.CharField(max_length=20, choices=RESOURCE_CHOICES)
+    last_update_time = models.DateTimeField(null=True, blank=True, help_text="Newest updateTime stored")
+    page_token = models.TextField(blank=True, default='')
+    pending_update_time = models.DateTimeField(null=True, blank=True)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    last_duration = models.FloatField(null=True, blank=True, help_text="Seconds")
+    last_fetched = models.IntegerField(default=0, help_text="Items returned by the API")
+    last_stored = models.IntegerField(default=0, help_text="Items created or updated")
+    lag_seconds = models.FloatField(null=True, blank=True, help_text="Oldest change picked up, relative to its updateTime")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('business', 'resource')
+
+
+class InsightMetric(models.Model):
+    """One day's value of one Business Profile insights metric for a location."""
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='insight_metrics')
+    metric = models.CharField(max_length=50)  # e.g. VIEWS_SEARCH, ACTIONS_PHONE
+    date = models.DateField()
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('business', 'metric', 'date')
+        indexes = [
+            models.Index(fields=['metric', 'date']),
+        ]
+
+
+class InsightRollup(models.Model):
+    """
+    Precomputed sum of an insights metric over all of a user's locations for a day or
+    a week (starting Monday), maintained by utils.insights_store for agency charts.
+    """
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'Week')
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='insight_rollups')
+    metric = models.CharField(max_length=50)
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    value = models.BigIntegerField(default=0)
+    location_count = models.IntegerField(default=0, help_text="Locations reporting in the period")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'metric', 'period', 'period_start')
+
+
+class PendingLocationEdit(models.Model):
+    """
+    Local edits of a location waiting to be written to Google (utils.location_edits).
+    Edits queued while one is pending merge into it; a worker pushes the merged
+    fields as one PATCH once ``push_after`` has passed.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('pushing', 'Pushing'),
+        ('applied', 'Applied'),
+        ('conflict', 'Conflict'),
+        ('failed', 'Failed')
+    ]
+
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='pending_edits')
+    changes = models.JSONField(default=dict, help_text="New values keyed by Business field")
+    sources = models.JSONField(default=list, blank=True, help_text="Where the merged edits came from")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    base_update_time = models.DateTimeField(null=True, blank=True, help_text="Location updateTime the edit was based on")
+    push_after = models.DateTimeField()
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    conflict = models.JSONField(null=True, blank=True, help_text="Values changed at Google meanwhile, by field")
+    applied_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['business', 'status']),
+            models.Index(fields=['status', 'push_after']),
+        ]
+
 
 class EmailLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -100,6 +101,49 @@ DATABASES = {
     }
 }
 
+# Cache - shared between web and Celery processes when REDIS_URL is set
+REDIS_URL = os.getenv('REDIS_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Celery - the automation sweep's chord needs a result backend
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL)
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', REDIS_URL)
+CELERY_RESULT_EXPIRES = 24 * 3600
+
+# Periodic tasks, read by `celery -A gbp_django beat` at startup
+CELERY_BEAT_SCHEDULE = {
+    'automate-all-business-tasks': {
+        'task': 'gbp_django.tasks.tasks.automate_all_business_tasks',
+        'schedule': timedelta(days=1),
+    },
+    # Fallback polling for locations whose push notifications went missing
+    'sync-stale-locations': {
+        'task': 'gbp_django.tasks.tasks.sync_stale_locations',
+        'schedule': timedelta(hours=1),
+    },
+    'sync-insights': {
+        'task': 'gbp_django.tasks.tasks.sync_insights',
+        'schedule': timedelta(days=1),
+    },
+    # Safety net for queued location edits whose scheduled push was lost
+    'push-due-location-edits': {
+        'task': 'gbp_django.tasks.tasks.push_due_location_edits',
+        'schedule': timedelta(minutes=5),
+    },
+    # Claims Task rows whose next_run has passed; safe to run from several beats
+    'dispatch-due-tasks': {
+        'task': 'gbp_django.tasks.tasks.dispatch_due_tasks',
+        'schedule': timedelta(minutes=1),
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = []
@@ -138,6 +182,67 @@ SUPPORT_EMAIL_SUBJECT_PREFIX = '[SUPPORT/FEEDBACK]'
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 LLM_MODEL = os.getenv('LLM_MODEL', 'groq')  # 'groq' or 'ollama'
 
+# Model endpoints - point these at gbp_django.benchmarks.llm_stub_server for offline runs
+OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434/api')
+GROQ_BASE_URL = os.getenv('GROQ_BASE_URL')  # None uses the Groq SDK default
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')  # None uses the OpenAI SDK default
+
+# Ollama unloads idle models after 5 minutes by default; keep them resident between chats
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')  # duration string, seconds, or -1 to pin forever
+OLLAMA_NUM_CTX = int(os.getenv('OLLAMA_NUM_CTX', 8192))
+OLLAMA_WARM_UP_TIMEOUT = int(os.getenv('OLLAMA_WARM_UP_TIMEOUT', 120))  # seconds, first load can be slow
+LLM_HISTORY_WINDOW = 6  # chat history is dropped in blocks of this many messages to keep prompt prefixes stable
+REVIEW_REPLY_BATCH_SIZE = int(os.getenv('REVIEW_REPLY_BATCH_SIZE', 10))  # reviews answered per LLM call
+REVIEW_SYNC_BATCH_SIZE = int(os.getenv('REVIEW_SYNC_BATCH_SIZE', 500))  # reviews upserted per statement
+QA_SYNC_BATCH_SIZE = int(os.getenv('QA_SYNC_BATCH_SIZE', 500))  # questions upserted per statement
+POST_SYNC_BATCH_SIZE = int(os.getenv('POST_SYNC_BATCH_SIZE', 500))  # posts upserted per statement
+MEDIA_SYNC_BATCH_SIZE = int(os.getenv('MEDIA_SYNC_BATCH_SIZE', 500))  # media items upserted per statement
+LOCATION_SYNC_BATCH_SIZE = int(os.getenv('LOCATION_SYNC_BATCH_SIZE', 500))  # locations upserted per statement
+INSIGHTS_SYNC_BATCH_SIZE = int(os.getenv('INSIGHTS_SYNC_BATCH_SIZE', 1000))  # insights values upserted per statement
+COMPLIANCE_REASONING_CACHE_TTL = int(os.getenv('COMPLIANCE_REASONING_CACHE_TTL', 7 * 24 * 3600))  # 0 disables
+COMPLIANCE_MAX_PARALLEL_ACTIONS = int(os.getenv('COMPLIANCE_MAX_PARALLEL_ACTIONS', 3))  # per business
+COMPLIANCE_MAX_ITERATIONS = int(os.getenv('COMPLIANCE_MAX_ITERATIONS', 5))  # plan + feedback rounds
+
+# Google Business Profile HTTP client (gbp_django.api.client)
+GBP_API_BASE_URL = os.getenv('GBP_API_BASE_URL')  # serve every API family from <url>/<family>, e.g. the local emulator
+GBP_API_BASE_URLS = {}  # per API family overrides, e.g. {'v4': 'http://localhost:8089/v4'}
+GBP_HTTP_TIMEOUT = (5, 30)  # connect, read seconds
+GBP_HTTP_MAX_RETRIES = int(os.getenv('GBP_HTTP_MAX_RETRIES', 4))
+GBP_HTTP_BACKOFF_BASE = 0.5  # seconds, doubled per retry with full jitter
+GBP_HTTP_BACKOFF_MAX = 30  # longest single wait; longer Retry-After values are returned to the caller
+GBP_HTTP_POOL_SIZE = int(os.getenv('GBP_HTTP_POOL_SIZE', 20))  # connections kept per API host
+GBP_FANOUT_WORKERS = int(os.getenv('GBP_FANOUT_WORKERS', 8))  # concurrent per-location calls, keep <= pool size
+GBP_RESOURCE_CACHE_TTL = int(os.getenv('GBP_RESOURCE_CACHE_TTL', 15 * 60))  # serve cached locations/accounts without asking
+GBP_RESOURCE_CACHE_MAX_AGE = 24 * 3600  # keep entries this long for conditional revalidation
+
+# Client-side quota (gbp_django.api.quota): (requests per minute, burst) per API family,
+# matching the project's quotas in the Google Cloud console. Shared via Redis when REDIS_URL is set.
+GBP_QUOTA_ENABLED = True
+GBP_API_QUOTAS = {
+    'v4': (300, 10),
+    'business_information': (300, 10),
+    'account_management': (300, 10),
+    'verifications': (300, 10),
+    'business_profile': (300, 10),
+}
+GBP_QUOTA_MAX_WAIT = 60  # seconds a call may queue for quota before QuotaExhausted is raised
+GBP_TOKEN_REFRESH_MARGIN = 5 * 60  # refresh access tokens in the background this long before expiry
+GBP_TOKEN_REFRESH_LOCK_TIMEOUT = 30  # seconds one process may hold a user's refresh lock
+GBP_PUSH_VERIFICATION_TOKEN = os.getenv('GBP_PUSH_VERIFICATION_TOKEN')  # ?token= on the Pub/Sub push URL
+GBP_PUSH_COALESCE_SECONDS = 30  # notifications for a location within this window share one sync
+GBP_SYNC_FALLBACK_HOURS = 6  # poll locations that haven't synced (by push or otherwise) for this long
+GBP_INSIGHTS_BACKFILL_DAYS = 90  # days of insights fetched for a newly linked location
+GBP_INSIGHTS_REFETCH_DAYS = 3  # recent days re-read on every run, as Google revises them
+GBP_EDIT_COALESCE_SECONDS = 10  # local edits of a location within this window go to Google as one PATCH
+GBP_EDIT_MAX_ATTEMPTS = 5  # pushes of an edit before it is marked failed
+GBP_EDIT_RETRY_BASE = 30  # seconds before the first retry of a failed push, doubled per attempt
+GBP_EDIT_PUSH_TIMEOUT = 10 * 60  # seconds an edit may stay 'pushing' before another push takes it over
+GBP_TASK_SCAN_BATCH_SIZE = 100  # due tasks claimed per scheduler transaction
+GBP_TASK_MAX_RETRIES = 3  # consecutive failed runs before a scheduled task is marked failed
+GBP_TASK_CLAIM_TIMEOUT = 10 * 60  # seconds an unrenewed claim holds before the task is dispatched again
+GBP_TASK_CLAIM_TIMEOUTS = {'REVIEW': 20 * 60, 'QA': 20 * 60}  # per task type overrides of the above
+GBP_AUTOMATION_CONCURRENCY = int(os.getenv('GBP_AUTOMATION_CONCURRENCY', 8))  # shards the automation sweep runs in parallel
+
 SOCIALACCOUNT_ADAPTER = 'gbp_django.adapters.CustomSocialAccountAdapter'
 
 SOCIALACCOUNT_PROVIDERS = {
@@ -231,6 +336,8 @@ LOGGING = {
 
 # Centralized redirect URI
 GOOGLE_OAUTH2_REDIRECT_URI = 'https://gbp.backus.agency/google/callback/'
+GOOGLE_OAUTH2_CLIENT_ID = os.getenv('CLIENT_ID')
+GOOGLE_OAUTH2_CLIENT_SECRET = os.getenv('CLIENT_SECRET')
 
 LOGIN_REDIRECT_URL = '/'
 ACCOUNT_EMAIL_VERIFICATION = 'none'
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Business
+
+
+@receiver([post_save, post_delete], sender=Business)
+def invalidate_business_caches(sender, instance, **kwargs):
+    """
+    Results derived from a business profile are stale once it changes. Queryset
+    .update() bypasses signals, so call the invalidation helpers directly there.
+    """
+    from .utils.llm_reasoning import invalidate_compliance_reasoning
+
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'embedding'}:
+        return  # derived data only, the profile itself did not change
+
+    invalidate_compliance_reasoning(instance.business_id)
@@ -1,8 +1,20 @@
+import logging
+import time
+from collections import Counter
 from datetime import datetime, timedelta
 from django.conf import settings
-from ..models import Business, Task
+from django.utils import timezone
+from ..models import AutomationLog, Business, Review, Task
 from ..utils.email_service import EmailService
 
+logger = logging.getLogger(__name__)
+
+# What the periodic sweep runs for every business, in order
+AUTOMATION_STEPS = ('monitor_reviews', 'monitor_questions', 'check_compliance', 'generate_weekly_report')
+
+# Task.task_type of each handle_task type
+TASK_TYPES = {'post': 'POST', 'review': 'REVIEW', 'qa': 'QA', 'account_status': 'COMPLIANCE'}
+
 
 class AutomationManager:
     def __init__(self, business):
@@ -10,6 +22,20 @@ class AutomationManager:
         self.email_service = EmailService()
         self.preferences = business.get_email_preferences()
 
+    def run_all(self):
+        """Run every automation step; a failing step is reported and doesn't stop the rest"""
+        result = {'business': self.business.business_id, 'completed': [], 'failed': {}}
+        started = time.monotonic()
+        for step in AUTOMATION_STEPS:
+            try:
+                getattr(self, step)()
+                result['completed'].append(step)
+            except Exception as e:
+                logger.exception(f"Automation step {step} failed for {self.business.business_id}")
+                result['failed'][step] = str(e)
+        result['duration'] = round(time.monotonic() - started, 3)
+        return result
+
     def handle_task(self, task_type, content):
         """Handle task based on automation settings"""
         automation_level = self._get_automation_level(task_type)
@@ -42,47 +68,42 @@ class AutomationManager:
         )
 
     def _request_approval(self, task_type, content):
-        """Create approval request"""
-        task = Task.objects.create(
+        """
+        Hold drafted content for the owner's approval. It is kept as a one-off Task
+        that the due-task scanner executes once the auto-approve window has passed;
+        deactivating the task rejects it.
+        """
+        Task.objects.create(
             business=self.business,
-            type=task_type,
-            content=content,
-            status='pending',
-            auto_approve_at=datetime.now() + timedelta(
-                hours=self.preferences.get('auto_approve_hours', 24)
-            )
+            task_type=TASK_TYPES.get(task_type, 'POST'),
+            frequency='CUSTOM',
+            next_run=timezone.now() + timedelta(hours=self.preferences.get('auto_approve_hours', 24)),
+            parameters=content,
+            content=content.get('generated') if isinstance(content, dict) else content,
         )
 
-        self.email_service.send_content_approval(
+        self.email_service.send_task_notification(
             self.business,
             task_type,
-            content,
-            task.id
+            content
         )
 
     def _execute_task(self, task_type, content):
         """Execute automated task with RAG context"""
         from ..utils.rag_utils import get_relevant_context
         
-        # Get relevant knowledge base context
-        rag_context = get_relevant_context(
-            query=content,
-            business_id=self.business.business_id,
-            min_similarity=0.6
-        )
-        
-        # Create task with RAG-enhanced content
-        task = Task.objects.create(
-            business=self.business,
-            type=task_type,
-            content={
-                'original': content,
-                'rag_context': rag_context,
-                'generated': self._generate_task_content(task_type, content, rag_context)
-            },
-            status='completed',
-            executed_at=datetime.now()
-        )
+        if isinstance(content, dict) and 'generated' in content:
+            # Already drafted (batched review replies), no per-item retrieval needed
+            rag_context = content.get('rag_context', '')
+            generated = content['generated']
+        else:
+            # Get relevant knowledge base context
+            rag_context = get_relevant_context(
+                query=content,
+                business_id=self.business.business_id,
+                min_similarity=0.6
+            )
+            generated = self._generate_task_content(task_type, content, rag_context)
 
         if task_type == 'post':
             self._create_post(content)
@@ -93,15 +114,26 @@ class AutomationManager:
         elif task_type == 'account_status':
             self._check_account_status()
 
-        self._send_execution_report(task)
+        # Record what was done once it has been done
+        details = {'original': content, 'rag_context': rag_context, 'generated': generated}
+        executed_at = timezone.now()
+        AutomationLog.objects.create(
+            business_id=self.business.business_id,
+            action_type='AUTO_RESPONSE' if task_type in ('review', 'qa') else 'SCHEDULED_TASK',
+            details=details,
+            status='COMPLETED',
+            user_id=str(self.business.user_id),
+            executed_at=executed_at
+        )
+        self._send_execution_report(task_type, details, executed_at)
 
-    def _send_execution_report(self, task):
+    def _send_execution_report(self, task_type, content, executed_at):
         """Send report of automated action"""
         self.email_service.send_automation_report(
             self.business,
-            task.type,
-            task.content,
-            task.executed_at
+            task_type,
+            content,
+            executed_at
         )
 
     def check_compliance(self):
@@ -134,9 +166,48 @@ class AutomationManager:
 
     def monitor_reviews(self):
         """Monitor and respond to reviews"""
-        new_reviews = self.business.get_new_reviews()
-        for review in new_reviews:
-            self._execute_task('review', review)
+        from ..utils.rag_utils import generate_review_responses
+
+        # Reviews with a draft are already posted or waiting on the owner
+        new_reviews = list(Review.objects.filter(business=self.business, responded=False,
+                                                 draft_response__isnull=True))
+        if not new_reviews:
+            return
+
+        # Draft all replies up front: one knowledge base lookup and one LLM call per batch
+        replies = generate_review_responses(
+            [{'rating': review.rating, 'content': review.content} for review in new_reviews],
+            self.business.business_id
+        )
+        for review, reply in zip(new_reviews, replies):
+            if not reply:
+                continue  # drafting failed; tried again on the next sweep
+            self.handle_task('review', {
+                'review_id': review.review_id,
+                'rating': review.rating,
+                'content': review.content,
+                'generated': reply,
+            })
+            Review.objects.filter(pk=review.pk).update(draft_response=reply)
+
+    def _respond_to_review(self, content):
+        """Post a drafted reply to Google and mark the review as responded"""
+        from ..api.review_management import respond_to_review
+        from ..utils.token_manager import get_access_token
+
+        if Review.objects.filter(review_id=content['review_id'], responded=True).exists():
+            return  # answered at Google while the draft waited for approval
+        respond_to_review(
+            access_token=get_access_token(self.business.user_id),
+            account_id=self.business.business_id,
+            location_id=self.business.business_id,
+            review_id=content['review_id'],
+            response_data={'comment': content['generated']}
+        )
+        Review.objects.filter(review_id=content['review_id']).update(
+            responded=True,
+            response=content['generated']
+        )
 
     def monitor_questions(self):
         """Monitor and answer new Q&A"""
@@ -167,3 +238,24 @@ class AutomationManager:
             self.business,
             report_data
         )
+
+
+def shard(items, count):
+    """Split ``items`` round-robin into at most ``count`` non-empty lists"""
+    count = max(1, min(count, len(items)))
+    return [list(items[i::count]) for i in range(count)] if items else []
+
+
+def summarize_automation(results):
+    """Totals of AutomationManager.run_all results, for the end of a sweep"""
+    results = list(results)
+    failed = {r['business']: r['failed'] for r in results if r['failed']}
+    return {
+        'businesses': len(results),
+        'succeeded': len(results) - len(failed),
+        'failed': failed,
+        'step_failures': dict(Counter(step for steps in failed.values() for step in steps)),
+        'total_duration': round(sum(r['duration'] for r in results), 3),
+        'slowest': [(r['business'], r['duration'])
+                    for r in sorted(results, key=lambda r: r['duration'], reverse=True)[:5]],
+    }
@@ -0,0 +1,206 @@
+"""
+Runs Task rows when their ``next_run`` arrives.
+
+``dispatch_due_tasks`` (every minute, from CELERY_BEAT_SCHEDULE) claims due tasks
+in batches with ``SELECT ... FOR UPDATE SKIP LOCKED``: concurrent scanners skip
+rows another one holds instead of waiting on them, so several can run without a
+task being dispatched twice. In the claiming transaction each task is marked
+RUNNING and its ``next_run`` advanced with ``Task.calculate_next_run``; the worker
+task queued on commit runs it and puts it back to PENDING (or COMPLETED for
+one-off tasks). The partial index on ``next_run`` over active, pending tasks keeps
+the scan proportional to the tasks that are due.
+
+The claim time is kept in ``last_run`` and works as a lease: a task still RUNNING
+its type's claim timeout (GBP_TASK_CLAIM_TIMEOUTS, else GBP_TASK_CLAIM_TIMEOUT)
+after its claim (the dispatch was lost, or the worker died) is claimed and
+dispatched again, without advancing ``next_run`` a second time. A running task
+renews its lease every third of the timeout, so long runs aren't taken over;
+a run whose lease was taken over anyway leaves the outcome to the newer one.
+"""
+import logging
+import threading
+from typing import List, Optional
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Task
+
+logger = logging.getLogger(__name__)
+
+# Task.task_type -> AutomationManager method run for it; other types go through handle_task
+TASK_RUNNERS = {
+    'REVIEW': 'monitor_reviews',
+    'QA': 'monitor_questions',
+    'COMPLIANCE': 'check_compliance',
+}
+
+
+def due_tasks(now=None):
+    now = now or timezone.now()
+    return Task.objects.filter(is_active=True, status='PENDING', next_run__lte=now)
+
+
+def claim_timeout(task_type: str) -> float:
+    """Seconds a claim of this task type holds without being renewed"""
+    return settings.GBP_TASK_CLAIM_TIMEOUTS.get(task_type, settings.GBP_TASK_CLAIM_TIMEOUT)
+
+
+def stale_tasks(now=None):
+    """Tasks whose claim expired: not renewed within their type's claim timeout"""
+    now = now or timezone.now()
+    overrides = settings.GBP_TASK_CLAIM_TIMEOUTS
+    expired = Q(last_run__lte=now - timedelta(seconds=settings.GBP_TASK_CLAIM_TIMEOUT)) & ~Q(task_type__in=list(overrides))
+    for task_type, timeout in overrides.items():
+        expired |= Q(task_type=task_type, last_run__lte=now - timedelta(seconds=timeout))
+    return Task.objects.filter(expired, is_active=True, status='RUNNING')
+
+
+class Lease:
+    """
+    Keeps a claimed task's lease while it runs by moving ``last_run`` forward from
+    a background thread. ``claimed_at`` is the lease's current value; ``lost`` is
+    set once another scanner took the task over.
+    """
+
+    def __init__(self, task: Task):
+        self.task_pk, self.claimed_at, self.lost = task.pk, task.last_run, False
+        self.interval = claim_timeout(task.task_type) / 3
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._keep, daemon=True, name=f'task-lease-{task.pk}')
+
+    def __enter__(self) -> 'Lease':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def renew(self) -> bool:
+        now = timezone.now()
+        held = Task.objects.filter(pk=self.task_pk, status='RUNNING', last_run=self.claimed_at)
+        if held.update(last_run=now):
+            self.claimed_at = now
+        else:
+            self.lost = True
+        return not self.lost
+
+    def _keep(self) -> None:
+        try:
+            while not self._stop.wait(self.interval) and self.renew():
+                pass
+        except Exception:
+            logger.exception(f"Renewing the lease of task {self.task_pk} failed")
+        finally:
+            # Connections are per thread; don't leave this one open
+            connections.close_all()
+
+
+def _advance(task: Task, now) -> Optional[object]:
+    """
+    The run after this one: the first occurrence after ``now``, so a scheduler
+    outage runs a task once rather than once per missed occurrence. None for
+    one-off tasks (CUSTOM without a later date).
+    """
+    def following():
+        value = task.calculate_next_run()
+        # CUSTOM schedules combine a date and time into a naive datetime
+        return timezone.make_aware(value) if value and timezone.is_naive(value) else value
+
+    current, upcoming = task.next_run, following()
+    while upcoming and upcoming > current and upcoming <= now:
+        task.next_run = current = upcoming
+        upcoming = following()
+    return upcoming if upcoming and upcoming > current else None
+
+
+def claim_due_tasks(batch_size: Optional[int] = None, now=None) -> List[int]:
+    """
+    Claim up to ``batch_size`` due tasks: mark them RUNNING, advance ``next_run``
+    and queue each for a worker once the transaction commits. Stale claims are
+    taken over first. Returns the claimed ids.
+    """
+    from .tasks import execute_scheduled_task
+
+    now = now or timezone.now()
+    batch_size = batch_size or settings.GBP_TASK_SCAN_BATCH_SIZE
+    claimed = []
+    with transaction.atomic():
+        stale = list(stale_tasks(now).select_for_update(skip_locked=True, of=('self',))
+                     .order_by('last_run')[:batch_size])
+        for task in stale:
+            logger.warning(f"Task {task.pk} claimed at {task.last_run} never finished; dispatching it again")
+            task.last_run = now
+            task.save(update_fields=['last_run'])
+            claimed.append(task.pk)
+
+        tasks = list(due_tasks(now).select_for_update(skip_locked=True, of=('self',))
+                     .select_related('business').order_by('next_run')[:batch_size - len(stale)])
+        for task in tasks:
+            task.last_run = now
+            try:
+                task.next_run = _advance(task, now)
+                task.status = 'RUNNING'
+            except ValueError as e:
+                # calculate_next_run refuses unverified businesses
+                logger.warning(f"Pausing task {task.pk}: {e}")
+                task.status = 'PAUSED'
+                task.save(update_fields=['status'])
+                continue
+            task.save(update_fields=['status', 'next_run', 'last_run'])
+            claimed.append(task.pk)
+        for pk in claimed:
+            transaction.on_commit(lambda pk=pk: execute_scheduled_task.delay(pk))
+    return claimed
+
+
+def dispatch_due_tasks(batch_size: Optional[int] = None, now=None) -> int:
+    """Claim and dispatch every due task, a batch per transaction; returns how many"""
+    batch_size = batch_size or settings.GBP_TASK_SCAN_BATCH_SIZE
+    total = 0
+    while True:
+        claimed = claim_due_tasks(batch_size, now)
+        total += len(claimed)
+        if len(claimed) < batch_size:
+            return total
+
+
+def run_scheduled_task(task_pk: int) -> str:
+    """Run a claimed task and record the outcome; returns the task's new status"""
+    from .automation_manager import AutomationManager
+
+    task = Task.objects.select_related('business').filter(pk=task_pk, status='RUNNING').first()
+    if not task:
+        return 'skipped'
+    lease = Lease(task)
+    try:
+        with lease:
+            manager = AutomationManager(task.business)
+            runner = TASK_RUNNERS.get(task.task_type)
+            if isinstance(task.parameters, dict) and 'generated' in task.parameters:
+                # Drafted content held for approval (AutomationManager._request_approval)
+                manager._execute_task(task.task_type.lower(), task.parameters)
+            elif runner:
+                getattr(manager, runner)()
+            else:
+                manager.handle_task(task.task_type.lower(), task.parameters)
+    except Exception:
+        logger.exception(f"Scheduled task {task.pk} ({task.task_type}) failed")
+        task.retry_count += 1
+        failed = task.retry_count >= settings.GBP_TASK_MAX_RETRIES
+        task.status = 'FAILED' if failed or not task.next_run else 'PENDING'
+    else:
+        task.retry_count = 0
+        task.status = 'PENDING' if task.next_run else 'COMPLETED'
+
+    # Outcomes are only written while this run still holds the claim
+    claim = Task.objects.filter(pk=task.pk, status='RUNNING', last_run=lease.claimed_at)
+    if lease.lost or not claim.update(status=task.status, retry_count=task.retry_count):
+        logger.warning(f"Task {task.pk} was claimed again while running; leaving its outcome to that run")
+        return 'superseded'
+    return task.status
@@ -1,29 +1,127 @@
+import logging
+
 from celery import shared_task
 from ..models import Business
-from .automation_manager import AutomationManager
-from django_celery_beat.models import PeriodicTask, IntervalSchedule
-
-# Create schedule
-schedule, _ = IntervalSchedule.objects.get_or_create(
-    every=1,
-    period=IntervalSchedule.DAYS,  # Adjust as needed
-)
+from .automation_manager import AutomationManager, shard, summarize_automation
 
-# Create periodic task
-PeriodicTask.objects.get_or_create(
-    interval=schedule,
-    name='Automate All Business Tasks',
-    task='gbp_django.tasks.automate_all_business_tasks',
-)
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def automate_all_business_tasks():
-    """Automates tasks for all businesses."""
-    businesses = Business.objects.all()
-    for business in businesses:
-        manager = AutomationManager(business)
-        manager.monitor_reviews()
-        manager.monitor_questions()
-        manager.check_compliance()
-        manager.generate_weekly_report()
+    """
+    Fan the automation sweep out as a chord: the businesses are split into
+    GBP_AUTOMATION_CONCURRENCY shards, each run as its own task on any worker, and
+    summarize_automation_run reports once all are done. At most that many shards
+    run at once, so the sweep can't starve other work on the queue.
+    """
+    from celery import chord
+    from django.conf import settings
+
+    business_pks = list(Business.objects.order_by('pk').values_list('pk', flat=True))
+    shards = shard(business_pks, settings.GBP_AUTOMATION_CONCURRENCY)
+    if shards:
+        chord([automate_business_shard.s(pks) for pks in shards])(summarize_automation_run.s())
+    return {'businesses': len(business_pks), 'shards': len(shards)}
+
+
+@shared_task
+def automate_business_shard(business_pks):
+    """Run the automation steps for a shard of businesses, one after another."""
+    return [AutomationManager(business).run_all()
+            for business in Business.objects.filter(pk__in=business_pks).order_by('pk')]
+
+
+@shared_task
+def summarize_automation_run(shard_results):
+    """Chord callback of automate_all_business_tasks: log and return totals of the sweep."""
+    summary = summarize_automation(result for results in shard_results for result in results)
+    logger.info(f"Automation sweep: {summary['succeeded']}/{summary['businesses']} businesses completed, "
+                f"step failures {summary['step_failures']}, {summary['total_duration']}s of work")
+    return summary
+
+
+@shared_task
+def sync_location_task(business_pk, account_id, location_id, resources):
+    """Targeted incremental sync of one location, queued by a push notification or the fallback sweep."""
+    from ..utils.push_notifications import release_sync
+    from ..utils.sync_engine import sync_location
+
+    release_sync(business_pk, resources)
+    business = Business.objects.filter(pk=business_pk).first()
+    if not business:
+        return {}
+    results = sync_location(business, account_id, location_id, resources=resources)
+    if results.get('reviews', {}).get('stored'):
+        # Reply to new reviews now rather than at the next daily sweep
+        AutomationManager(business).monitor_reviews()
+    return results
+
+
+@shared_task
+def sync_stale_locations():
+    """
+    Safety net for missed push notifications: queue a sync of every resource that
+    hasn't synced within GBP_SYNC_FALLBACK_HOURS.
+    """
+    from datetime import timedelta
+    from django.conf import settings
+    from django.utils import timezone
+    from ..models import SyncWatermark
+    from ..utils.sync_engine import RESOURCES, location_path_ids
+
+    cutoff = timezone.now() - timedelta(hours=settings.GBP_SYNC_FALLBACK_HOURS)
+    fresh = set(SyncWatermark.objects.filter(last_synced_at__gte=cutoff).values_list('business_id', 'resource'))
+    queued = 0
+    for business in Business.objects.filter(is_connected=True).only('id', 'business_id', 'google_location_id',
+                                                                    'google_account_id'):
+        stale = [name for name in RESOURCES if (business.id, name) not in fresh]
+        try:
+            account_id, location_id = location_path_ids(business)
+        except ValueError:
+            continue
+        if stale:
+            sync_location_task.delay(business.id, account_id, location_id, stale)
+            queued += 1
+    return queued
+
+
+@shared_task
+def sync_insights():
+    """Fetch the new days of insights for every connected location and refresh the rollups."""
+    from ..utils.insights_store import sync_all_insights
+
+    results = sync_all_insights()
+    return {'locations': len(results), 'failed': sum(1 for result in results.values() if 'error' in result)}
+
+
+@shared_task
+def push_location_edit_task(edit_pk):
+    """Write a queued location edit to Google (see utils.location_edits)."""
+    from ..utils.location_edits import push_location_edit
+
+    return push_location_edit(edit_pk)
+
+
+@shared_task
+def push_due_location_edits():
+    """Push queued location edits that are overdue."""
+    from ..utils.location_edits import push_due_location_edits as push_due
+
+    return push_due()
+
+
+@shared_task
+def execute_scheduled_task(task_pk):
+    """Run a Task claimed by the due-task scanner (see tasks.scheduler)."""
+    from .scheduler import run_scheduled_task
+
+    return run_scheduled_task(task_pk)
+
+
+@shared_task
+def dispatch_due_tasks():
+    """Claim Task rows whose next_run has passed and queue them for workers."""
+    from .scheduler import dispatch_due_tasks as dispatch_due
+
+    return dispatch_due()
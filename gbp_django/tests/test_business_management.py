@@ -1,8 +1,16 @@
-from django.test import TestCase
-from django.contrib.auth import get_user_model
-from gbp_django.models import Business
-from gbp_django.api.business_management import store_business_data
 import json
+import time
+
+from django.test import RequestFactory, TestCase
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from gbp_django.models import Business, PendingLocationEdit
+from gbp_django.api.business_management import (
+    location_changes, location_patch, remote_field_hashes, store_business_data
+)
+from gbp_django.benchmarks.harness import EmulatorMixin
+from gbp_django.utils.location_edits import push_location_edit
+from gbp_django.utils.token_manager import get_token_manager
 
 User = get_user_model()
 
@@ -15,76 +23,87 @@ class BusinessManagementTests(TestCase):
             google_id='test123'
         )
         
-        # Sample business data from Google API
+        # Sample locations from the Business Information API
         self.business_data = {
-            'accounts': [{
-                'name': 'test-business-1',
-                'accountName': 'Test Business',
-                'primaryOwner': {'email': 'test@example.com'},
-                'organizationInfo': {
-                    'address': {'formattedAddress': '123 Test St'},
-                    'primaryPhone': '555-0123',
-                    'websiteUrl': 'https://test.com',
-                    'primaryCategory': {'displayName': 'Test Category'}
-                }
+            'locations': [{
+                'name': 'locations/test-business-1',
+                'title': 'Test Business',
+                'storefrontAddress': {'addressLines': ['123 Test St']},
+                'regularPhone': '555-0123',
+                'websiteUrl': 'https://test.com',
+                'primaryCategory': {'displayName': 'Test Category'},
+                'metadata': {'verificationState': 'VERIFIED'}
             }]
         }
 
     def test_store_business_data_new_business(self):
         """Test storing data for a new business"""
-        stored_businesses = store_business_data(
+        counts = store_business_data(
             self.business_data, 
             self.user.id,
             'fake-access-token'
         )
         
-        self.assertEqual(len(stored_businesses), 1)
-        business = stored_businesses[0]
+        self.assertEqual(counts, {'created': 1, 'updated': 0, 'unchanged': 0})
+        business = Business.objects.get(business_id='locations/test-business-1')
         
         self.assertEqual(business.business_name, 'Test Business')
-        self.assertEqual(business.business_id, 'test-business-1')
+        self.assertEqual(business.address, '123 Test St')
         self.assertEqual(business.user_id, self.user.id)
-        self.assertEqual(business.business_email, 'test@example.com')
+        self.assertTrue(business.is_verified)
+        self.assertTrue(business.is_connected)
         
-    def test_store_business_data_no_accounts(self):
-        """Test storing data when no business accounts exist"""
-        empty_data = {'accounts': []}
-        
-        stored_businesses = store_business_data(
-            empty_data,
+    def test_store_business_data_no_locations(self):
+        """Test storing data when the account has no locations"""
+        counts = store_business_data(
+            {'locations': []},
             self.user.id, 
             'fake-access-token'
         )
         
-        self.assertEqual(len(stored_businesses), 1)
-        business = stored_businesses[0]
-        
-        self.assertTrue(business.business_id.startswith('unvalidated-'))
-        self.assertEqual(business.business_name, 'My Business')
-        self.assertFalse(business.is_verified)
+        self.assertEqual(counts, {'created': 0, 'updated': 0, 'unchanged': 0})
+        self.assertFalse(Business.objects.exists())
         
     def test_store_business_data_update_existing(self):
         """Test updating an existing business"""
         # Create existing business
         existing = Business.objects.create(
             user=self.user,
-            business_id='test-business-1',
+            business_id='locations/test-business-1',
             business_name='Old Name',
             business_email='old@example.com'
         )
         
-        stored_businesses = store_business_data(
+        counts = store_business_data(
             self.business_data,
             self.user.id,
             'fake-access-token'
         )
         
-        self.assertEqual(len(stored_businesses), 1)
-        updated = stored_businesses[0]
+        self.assertEqual(counts, {'created': 0, 'updated': 1, 'unchanged': 0})
+        updated = Business.objects.get(business_id='locations/test-business-1')
         
         self.assertEqual(updated.id, existing.id)
         self.assertEqual(updated.business_name, 'Test Business')
-        self.assertEqual(updated.business_email, 'test@example.com')
+        self.assertEqual(updated.business_email, 'old@example.com')
+
+        # Importing the same locations again writes nothing
+        self.assertEqual(store_business_data(self.business_data, self.user.id, 'fake-access-token'),
+                         {'created': 0, 'updated': 0, 'unchanged': 1})
+
+    def test_store_business_data_agency_account(self):
+        """Hundreds of locations are stored in a handful of queries"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        locations = {'locations': [
+            {'name': f'locations/{n}', 'title': f'Branch {n}'} for n in range(300)
+        ]}
+        with CaptureQueriesContext(connection) as queries:
+            counts = store_business_data(locations, self.user.id, 'fake-access-token')
+        self.assertEqual(counts['created'], 300)
+        # One SELECT and one upsert on PostgreSQL; SQLite splits the wide INSERT further
+        self.assertLess(len(queries), 20)
         
     def test_bulk_upload_businesses(self):
         """Test bulk upload of businesses from CSV"""
@@ -124,3 +143,82 @@ class BusinessManagementTests(TestCase):
         self.assertEqual(biz1.business_email, 'test1@example.com')
         biz2 = Business.objects.get(business_name='Test Biz 2')
         self.assertEqual(biz2.business_email, 'test2@example.com')
+
+
+class UpdateBusinessTests(EmulatorMixin, TestCase):
+    def setUp(self):
+        self.start_emulator()
+        self.user = User.objects.create_user(email='owner@example.com', google_id='owner-1')
+        get_token_manager().store(self.user.id, 'token', time.time() + 3600)
+        self.addCleanup(get_token_manager().invalidate, self.user.id)
+        store_business_data({'locations': [self.dataset.locations['1000']]}, self.user.id, 'token')
+        self.business = Business.objects.get(business_id='locations/1000')
+        self.form = {
+            'business_name': self.business.business_name, 'address': self.business.address,
+            'phone': self.business.phone_number, 'website': self.business.website_url,
+            'category': self.business.category,
+        }
+
+    def submit(self, **changes):
+        from gbp_django.views import update_business
+        request = RequestFactory().post('/', data=json.dumps({**self.form, **changes}),
+                                        content_type='application/json')
+        request.user = self.user
+        return json.loads(update_business(request, self.business.business_id).content)
+
+    def test_unchanged_submission_queues_nothing(self):
+        self.assertEqual(self.business.remote_field_hashes, remote_field_hashes(self.business))
+        response = self.submit()
+        self.assertEqual((response['status'], response['changed']), ('success', []))
+        self.assertEqual(response['pending'], {'pending': False})
+        self.assertFalse(PendingLocationEdit.objects.exists())
+
+    def test_only_changed_fields_are_queued_and_sent(self):
+        response = self.submit(phone='555-9999')
+        self.assertEqual(response['changed'], ['phoneNumbers.primaryPhone'])
+        self.assertEqual((response['pending']['status'], response['pending']['fields']), ('pending', ['phone_number']))
+        self.business.refresh_from_db()
+        self.assertEqual(self.business.phone_number, '555-9999')
+        self.assertEqual(self.emulator.request_counts['PATCH business_information'], 0)
+
+        PendingLocationEdit.objects.update(push_after=timezone.now())
+        self.assertEqual(push_location_edit(PendingLocationEdit.objects.get().pk), 'applied')
+        self.assertEqual(self.emulator.request_counts['PATCH business_information'], 1)
+        self.assertEqual(self.dataset.locations['1000']['phoneNumbers'], {'primaryPhone': '555-9999'})
+        self.assertEqual(self.dataset.locations['1000']['title'], 'Business 1000')
+
+        self.form['phone'] = '555-9999'
+        self.assertEqual(self.submit()['changed'], [])
+        self.assertEqual(PendingLocationEdit.objects.count(), 1)
+
+    def test_location_patch_nests_mask_paths(self):
+        changes = location_changes(self.business, {'address': '9 New Rd', 'category': 'Florist', 'phone': None})
+        body, mask = location_patch(changes, {'storefrontAddress': {'addressLines': ['1 Old Rd', 'Suite 4']}})
+        self.assertEqual(mask, ['storefrontAddress.addressLines', 'phoneNumbers.primaryPhone'])
+        self.assertEqual(body['storefrontAddress'], {'addressLines': ['9 New Rd', 'Suite 4']})
+        self.assertNotIn('categories', body)  # category isn't written through the API
+
+    def test_address_edit_keeps_other_address_lines(self):
+        remote = self.dataset.locations['1000']['storefrontAddress']
+        remote['addressLines'].append('Suite 4')
+        self.submit(address='9 New Rd', category='Florist')
+        self.assertEqual(PendingLocationEdit.objects.get().changes, {'address': '9 New Rd'})
+        self.assertEqual(Business.objects.get(pk=self.business.pk).category, 'Florist')
+
+        PendingLocationEdit.objects.update(push_after=timezone.now())
+        self.assertEqual(push_location_edit(PendingLocationEdit.objects.get().pk), 'applied')
+        self.assertEqual(remote['addressLines'], ['9 New Rd', 'Suite 4'])
+        self.assertEqual(remote['locality'], 'Springfield')
+
+    def test_edit_then_revert_replaces_the_queued_value(self):
+        original = self.form['phone']
+        self.submit(phone='555-9999')
+        response = self.submit(phone=original)
+        self.assertEqual(response['changed'], [])
+        self.assertEqual(PendingLocationEdit.objects.get().changes, {'phone_number': original})
+        self.assertEqual(Business.objects.get(pk=self.business.pk).phone_number, original)
+
+        PendingLocationEdit.objects.update(push_after=timezone.now())
+        self.assertEqual(push_location_edit(PendingLocationEdit.objects.get().pk), 'applied')
+        self.assertEqual(self.emulator.request_counts['PATCH business_information'], 0)
+        self.assertEqual(self.dataset.locations['1000']['phoneNumbers'], {'primaryPhone': original})
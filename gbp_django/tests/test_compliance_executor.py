@@ -0,0 +1,138 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from django.utils import timezone
+from gbp_django.benchmarks.harness import create_benchmark_business
+from gbp_django.models import ComplianceAction
+from gbp_django.utils.compliance_executor import (
+    ComplianceActionExecutor, action_key, build_action_graph, parse_eta, run_compliance_plan
+)
+
+
+class RecordingRunner:
+    """Fake action runner tracking execution order and peak concurrency"""
+
+    def __init__(self, fail_targets=()):
+        self.fail_targets = set(fail_targets)
+        self.started = []
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, action):
+        self.started.append(action['target'])
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if action['target'] in self.fail_targets:
+                raise RuntimeError(f"{action['target']} failed")
+            return {'status': 'success', 'target': action['target']}
+        finally:
+            self.active -= 1
+
+
+def make_action(target, dependencies=(), **extra):
+    return {'type': 'verify', 'target': target, 'details': f'check {target}',
+            'dependencies': list(dependencies), **extra}
+
+
+class ComplianceExecutorTests(TestCase):
+    def setUp(self):
+        self.business = create_benchmark_business()
+
+    def run_plan(self, runner, plans, **kwargs):
+        calls = []
+
+        def plan(data):
+            calls.append(data)
+            return {'actions': plans[len(calls) - 1] if len(calls) <= len(plans) else []}
+
+        summary = async_to_sync(run_compliance_plan)(
+            self.business, runner, plan, initial_data={'business_id': self.business.business_id}, **kwargs
+        )
+        return summary, calls
+
+    def test_dependency_graph_resolution(self):
+        actions = [
+            make_action('website', id='a1'),
+            make_action('reviews', dependencies=['a1']),
+            make_action('posts', dependencies=[0, 'website', 'unknown']),
+        ]
+        graph = build_action_graph(actions)
+        website = action_key(actions[0])
+        self.assertEqual(graph[website], [])
+        self.assertEqual(graph[action_key(actions[1])], [website])
+        self.assertEqual(graph[action_key(actions[2])], [website])
+
+    def test_independent_actions_run_concurrently_within_limit(self):
+        runner = RecordingRunner()
+        plan = [make_action('website')] + [make_action(t, ['website']) for t in ('reviews', 'qna', 'posts', 'photos')]
+        summary, _ = self.run_plan(runner, [plan], max_parallel=2)
+
+        self.assertEqual(runner.started[0], 'website')
+        self.assertEqual(runner.peak, 2)
+        self.assertEqual(summary['completed'], 5)
+        self.assertEqual(ComplianceAction.objects.filter(run_id=summary['run_id'], status='COMPLETED').count(), 5)
+
+    def test_earliest_eta_runs_first(self):
+        runner = RecordingRunner()
+        plan = [make_action('unknown', eta=''), make_action('ten-days', eta='10 days'),
+                make_action('two-days', eta='2 days'), make_action('dated', eta='2025-01-01T00:00:00Z'),
+                make_action('low-risk', eta='90 minutes', risk_score=1), make_action('high-risk', eta='1h 30m', risk_score=8)]
+        self.run_plan(runner, [plan], max_parallel=1)
+        self.assertEqual(runner.started, ['dated', 'low-risk', 'high-risk', 'two-days', 'ten-days', 'unknown'])
+
+    def test_eta_parsing(self):
+        start = timezone.now()
+        self.assertEqual(parse_eta('12 hours', start), start + timedelta(hours=12))
+        self.assertEqual(parse_eta('1 week 2d', start), start + timedelta(days=9))
+        self.assertEqual(parse_eta('2025-03-01', start), timezone.make_aware(datetime(2025, 3, 1)))
+        self.assertIsNone(parse_eta('soon', start))
+
+    def test_failed_dependency_skips_dependents(self):
+        runner = RecordingRunner(fail_targets={'website'})
+        plan = [make_action('website'), make_action('reviews', ['website']), make_action('posts')]
+        summary, calls = self.run_plan(runner, [plan])
+
+        self.assertEqual(sorted(runner.started), ['posts', 'website'])
+        self.assertEqual((summary['completed'], summary['failed'], summary['skipped']), (1, 1, 1))
+        statuses = {f['target']: f['status'] for f in calls[1]['executed_actions']}
+        self.assertEqual(statuses, {'website': 'failed', 'reviews': 'skipped', 'posts': 'completed'})
+
+    def test_cycle_is_skipped(self):
+        runner = RecordingRunner()
+        plan = [make_action('website', ['reviews'], id='w'), make_action('reviews', ['w'], id='reviews')]
+        summary, _ = self.run_plan(runner, [plan])
+        self.assertEqual(runner.started, [])
+        self.assertEqual(summary['skipped'], 2)
+
+    def test_iterations_are_capped(self):
+        runner = RecordingRunner()
+        plans = [[make_action(f'round-{i}')] for i in range(10)]
+        summary, calls = self.run_plan(runner, plans, max_iterations=3)
+        self.assertEqual(summary['iterations'], 3)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(runner.started, ['round-0', 'round-1', 'round-2'])
+
+    def test_repeated_actions_end_the_loop(self):
+        runner = RecordingRunner()
+        summary, calls = self.run_plan(runner, [[make_action('website')], [make_action('website')]])
+        self.assertEqual(runner.started, ['website'])
+        self.assertEqual(len(calls), 2)
+
+    def test_interrupted_run_resumes_without_replanning(self):
+        """Completed actions are kept, running/pending ones are executed, then feedback continues"""
+        executor = ComplianceActionExecutor(self.business, None)
+        rows = executor.record_plan([make_action('website'), make_action('reviews'), make_action('posts')], 0)
+        ComplianceAction.objects.filter(pk=rows[0].pk).update(status='COMPLETED')
+        ComplianceAction.objects.filter(pk=rows[1].pk).update(status='RUNNING')
+
+        runner = RecordingRunner()
+        summary, calls = self.run_plan(runner, [[]])
+
+        self.assertEqual(summary['run_id'], executor.run_id)
+        self.assertEqual(sorted(runner.started), ['posts', 'reviews'])
+        self.assertIn('executed_actions', calls[0])
+        self.assertFalse(ComplianceAction.objects.exclude(status='COMPLETED').exists())
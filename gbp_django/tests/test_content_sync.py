@@ -0,0 +1,48 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from gbp_django.api.media_management import store_photos
+from gbp_django.api.post_management import store_posts
+from gbp_django.benchmarks.harness import create_benchmark_business
+from gbp_django.models import Media, Post
+
+
+def synthetic_media(count, described=()):
+    return {'mediaItems': [{
+        'name': f'accounts/1/locations/1/media/m{n}',
+        'mediaFormat': 'PHOTO',
+        'locationAssociation': {'category': 'EXTERIOR'},
+        'googleUrl': f'https://lh3.example.com/m{n}',
+        'createTime': '2024-05-01T12:00:00Z',
+        'description': 'Storefront' if n in described else '',
+    } for n in range(count)]}
+
+
+class ContentSyncTests(TestCase):
+    def setUp(self):
+        self.business = create_benchmark_business()
+
+    def test_posts_are_upserted_by_name(self):
+        page = {'localPosts': [
+            {'name': 'accounts/1/locations/1/localPosts/p1', 'summary': 'Open late', 'topicType': 'EVENT',
+             'media': [{'sourceUrl': 'https://example.com/p1.jpg'}], 'scheduledTime': '2024-06-01T09:00:00Z'},
+            {'name': 'accounts/1/locations/1/localPosts/p2', 'summary': 'Sale'},
+        ]}
+        self.assertEqual(store_posts(page, self.business.id), {'created': 2, 'updated': 0, 'unchanged': 0})
+        self.assertEqual(store_posts(page, self.business.id), {'created': 0, 'updated': 0, 'unchanged': 2})
+        page['localPosts'][1]['summary'] = 'Bigger sale'
+        self.assertEqual(store_posts(page, self.business.id), {'created': 0, 'updated': 1, 'unchanged': 1})
+        post = Post.objects.get(post_id='accounts/1/locations/1/localPosts/p1')
+        self.assertEqual((post.post_type, post.media_url, post.scheduled_at.isoformat()),
+                         ('EVENT', 'https://example.com/p1.jpg', '2024-06-01T09:00:00+00:00'))
+        self.assertEqual(Post.objects.get(post_id='accounts/1/locations/1/localPosts/p2').content, 'Bigger sale')
+
+    def test_media_library_syncs_in_a_handful_of_statements(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(store_photos(synthetic_media(1000), self.business.id, batch_size=500)['created'], 1000)
+        self.assertLess(len(queries), 20)
+
+        result = store_photos(synthetic_media(1000, described={7}), self.business.id, batch_size=500)
+        self.assertEqual(result, {'created': 0, 'updated': 1, 'unchanged': 999})
+        self.assertEqual(Media.objects.filter(business=self.business).count(), 1000)
+        self.assertEqual(Media.objects.get(media_id='accounts/1/locations/1/media/m7').description, 'Storefront')
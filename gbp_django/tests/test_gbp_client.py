@@ -0,0 +1,195 @@
+import time
+
+import requests
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from gbp_django.benchmarks.harness import ScriptedServerMixin, create_benchmark_business
+from gbp_django.api.business_management import (
+    get_location_details, get_locations_with_verification, update_business_details
+)
+from gbp_django.api.client import GBPClient, api_url, fan_out, parse_retry_after
+from gbp_django.api.quota import LocalQuotaBackend, QuotaExhausted, QuotaManager, quota_method_name
+from gbp_django.api.review_management import get_reviews, iter_reviews, store_reviews
+from gbp_django.models import Review
+
+
+@override_settings(GBP_HTTP_BACKOFF_BASE=0.001, GBP_HTTP_MAX_RETRIES=3, GBP_API_QUOTAS={})
+class GBPClientTests(ScriptedServerMixin, SimpleTestCase):
+    def setUp(self):
+        self.start_server()
+
+    def test_connections_are_reused(self):
+        for _ in range(5):
+            get_reviews('token-1', 'acc', 'loc')
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(len(self.server.client_ports), 1)
+        self.assertEqual(self.server.requests[0],
+                         ('GET', '/v4/accounts/acc/locations/loc/reviews?pageSize=50', 'Bearer token-1'))
+
+    def test_retries_rate_limits_and_server_errors(self):
+        self.server.scripts['/v4/flaky'] = [(429, {'Retry-After': '0'}), (503, {})]
+        response = GBPClient('token').get('v4', 'flaky')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.scripts['/v4/down'] = [(503, {})] * 10
+        response = GBPClient('token').get('v4', 'down')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.server.requests), 4)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            response.raise_for_status()
+
+    def test_post_only_retried_on_rate_limit(self):
+        self.server.scripts['/v4/posts'] = [(503, {})]
+        self.assertEqual(GBPClient('token').post('v4', 'posts', json={}).status_code, 503)
+        self.server.scripts['/v4/posts'] = [(429, {'Retry-After': '0'})]
+        self.assertEqual(GBPClient('token').post('v4', 'posts', json={}).status_code, 200)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_long_retry_after_is_returned_to_caller(self):
+        self.server.scripts['/v4/slow'] = [(429, {'Retry-After': '3600'})]
+        self.assertEqual(GBPClient('token').get('v4', 'slow').status_code, 429)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_retry_after_parsing(self):
+        self.assertEqual(parse_retry_after('2'), 2.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+
+    def test_default_base_urls(self):
+        with override_settings(GBP_API_BASE_URLS={}):
+            self.assertEqual(api_url('verifications', 'locations/1/verification'),
+                             'https://mybusinessverifications.googleapis.com/v1/locations/1/verification')
+
+
+def review(n):
+    return {'name': f'accounts/acc/locations/loc/reviews/r{n}', 'starRating': 5, 'comment': f'Great {n}'}
+
+
+@override_settings(GBP_API_QUOTAS={})
+class PaginationTests(ScriptedServerMixin, TestCase):
+    def setUp(self):
+        self.start_server()
+        path = '/v4/accounts/acc/locations/loc/reviews?pageSize=50'
+        self.server.bodies[path] = {'reviews': [review(1), review(2)], 'averageRating': 5, 'nextPageToken': 't2'}
+        self.server.bodies[path + '&pageToken=t2'] = {'reviews': [review(3)], 'nextPageToken': 't3'}
+        self.server.bodies[path + '&pageToken=t3'] = {'reviews': [review(4)]}
+
+    def test_get_follows_next_page_token(self):
+        data = get_reviews('token', 'acc', 'loc')
+        self.assertEqual([r['comment'] for r in data['reviews']], ['Great 1', 'Great 2', 'Great 3', 'Great 4'])
+        self.assertEqual(data['averageRating'], 5)
+        self.assertNotIn('nextPageToken', data)
+
+    def test_pages_are_streamed(self):
+        business = create_benchmark_business()
+        for page in iter_reviews('token', 'acc', 'loc'):
+            store_reviews(page, business.id)
+        self.assertEqual(Review.objects.filter(business=business).count(), 4)
+        self.assertEqual(len(self.server.requests), 3)
+
+
+@override_settings(GBP_API_QUOTAS={}, GBP_HTTP_MAX_RETRIES=0)
+class FanOutTests(ScriptedServerMixin, SimpleTestCase):
+    def test_results_keep_order_and_errors(self):
+        def slow_square(n):
+            time.sleep(0.05)
+            if n == 3:
+                raise ValueError('boom')
+            return n * n
+
+        started = time.monotonic()
+        results = fan_out(slow_square, range(8), max_workers=8)
+        self.assertLess(time.monotonic() - started, 0.3)
+        self.assertEqual([r for r, _ in results], [0, 1, 4, None, 16, 25, 36, 49])
+        self.assertIsInstance(results[3][1], ValueError)
+
+    def test_verification_failures_are_reported(self):
+        self.start_server()
+        self.server.bodies['/business_information/accounts/1/locations?pageSize=100'] = {
+            'locations': [{'name': f'locations/{n}'} for n in range(5)]
+        }
+        for n in range(5):
+            self.server.bodies[f'/verifications/locations/{n}/verification'] = {'state': 'VERIFIED', 'method': 'EMAIL'}
+        self.server.scripts['/verifications/locations/2/verification'] = [(404, {})]
+
+        data = get_locations_with_verification('token', '1')
+        self.assertEqual([loc['name'] for loc in data['locations']], [f'locations/{n}' for n in range(5)])
+        self.assertEqual([loc.get('verification_state') for loc in data['locations']],
+                         ['VERIFIED', 'VERIFIED', None, 'VERIFIED', 'VERIFIED'])
+        self.assertEqual([f['location'] for f in data['failed_verifications']], ['locations/2'])
+
+
+@override_settings(GBP_API_QUOTAS={}, GBP_RESOURCE_CACHE_TTL=600)
+class ResourceCacheTests(ScriptedServerMixin, SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.start_server()
+        self.server.bodies['/business_profile/locations/7'] = {'name': 'locations/7', 'title': 'Old title'}
+
+    def test_fresh_entries_are_served_from_cache(self):
+        self.assertEqual(get_location_details('token', 'locations/7')['title'], 'Old title')
+        self.assertEqual(get_location_details('token', 'locations/7')['title'], 'Old title')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_entries_are_not_shared_between_users(self):
+        get_location_details('token', 'locations/7', user_id=1)
+        get_location_details('other-token', 'locations/7', user_id=2)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual([h.get('Authorization') for h in self.server.headers_seen],
+                         ['Bearer token', 'Bearer other-token'])
+
+    def test_entries_outlive_token_refreshes(self):
+        get_location_details('token', 'locations/7', user_id=1)
+        self.assertEqual(get_location_details('refreshed-token', 'locations/7', user_id=1)['title'], 'Old title')
+        self.assertEqual(len(self.server.requests), 1)
+
+    @override_settings(GBP_RESOURCE_CACHE_TTL=0)
+    def test_stale_entries_are_revalidated_with_etag(self):
+        self.server.response_headers['/business_profile/locations/7'] = {'ETag': '"v1"'}
+        get_location_details('token', 'locations/7')
+        self.server.scripts['/business_profile/locations/7'] = [(304, {})]
+        self.assertEqual(get_location_details('token', 'locations/7')['title'], 'Old title')
+        self.assertEqual(self.server.headers_seen[1].get('If-None-Match'), '"v1"')
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_own_updates_invalidate(self):
+        get_location_details('token', 'locations/7')
+        update_business_details('token', 'locations/7', {'title': 'New title'})
+        self.server.bodies['/business_profile/locations/7'] = {'name': 'locations/7', 'title': 'New title'}
+        self.assertEqual(get_location_details('token', 'locations/7')['title'], 'New title')
+        self.assertEqual([r[0] for r in self.server.requests], ['GET', 'PATCH', 'GET'])
+
+    def test_updates_invalidate_other_users_copies(self):
+        get_location_details('other-token', 'locations/7', user_id=2)
+        update_business_details('token', 'locations/7', {'title': 'New title'})
+        self.server.bodies['/business_profile/locations/7'] = {'name': 'locations/7', 'title': 'New title'}
+        self.assertEqual(get_location_details('other-token', 'locations/7', user_id=2)['title'], 'New title')
+
+
+class QuotaManagerTests(SimpleTestCase):
+    def test_method_names_collapse_ids(self):
+        self.assertEqual(quota_method_name('get', 'accounts/1/locations/2/reviews'),
+                         'GET accounts/*/locations/*/reviews')
+        self.assertEqual(quota_method_name('PATCH', 'locations/9?updateMask=title'), 'PATCH locations/*')
+
+    @override_settings(GBP_API_QUOTAS={'v4': (600, 2)}, GBP_QUOTA_MAX_WAIT=5)
+    def test_calls_queue_for_quota(self):
+        """600/min is one token per 0.1s: the burst goes straight out, later calls wait their turn"""
+        quota = QuotaManager(LocalQuotaBackend())
+        started = time.monotonic()
+        for _ in range(4):
+            quota.acquire('v4', 'GET accounts/*/locations/*/reviews')
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+        quota.acquire('oauth', 'POST token')  # families without a quota are not limited
+        self.assertEqual(quota.usage(minutes=2), {'v4:GET accounts/*/locations/*/reviews': 4, 'oauth:POST token': 1})
+
+    @override_settings(GBP_API_QUOTAS={'v4': (1, 1)}, GBP_QUOTA_MAX_WAIT=1)
+    def test_fails_when_queue_is_too_long(self):
+        quota = QuotaManager(LocalQuotaBackend())
+        quota.acquire('v4', 'GET a')
+        with self.assertRaises(QuotaExhausted):
+            quota.acquire('v4', 'GET a')
+        self.assertEqual(quota.usage(minutes=2), {'v4:GET a': 1})
@@ -0,0 +1,101 @@
+import random
+
+import requests
+from django.test import SimpleTestCase, TestCase, override_settings
+from gbp_django.api.business_management import get_location_details, get_user_locations, update_business_details
+from gbp_django.api.client import GBPClient, api_url
+from gbp_django.api.review_management import get_reviews
+from gbp_django.benchmarks.harness import EmulatorMixin, create_benchmark_business
+from gbp_django.models import QandA, Review
+from gbp_django.utils.sync_engine import sync_location
+
+
+class GBPEmulatorTests(EmulatorMixin, SimpleTestCase):
+    def setUp(self):
+        self.start_emulator()
+
+    def test_base_url_setting_switches_every_family(self):
+        self.assertEqual(api_url('v4', 'accounts'), f"{self.emulator.url}/v4/accounts")
+        with override_settings(GBP_API_BASE_URLS={'v4': 'http://other/v4'}):
+            self.assertEqual(api_url('v4'), 'http://other/v4')
+            self.assertEqual(api_url('oauth', 'token'), f"{self.emulator.url}/oauth/token")
+
+    def test_locations_are_listed_across_pages(self):
+        rng = random.Random(1)
+        for _ in range(150):
+            self.dataset.add_location('100', rng)
+        locations = get_user_locations('token')['locations']
+        self.assertEqual(len(locations), 153)
+        self.assertEqual(self.emulator.request_counts['GET business_information'], 3)  # accounts + 2 pages
+
+    def test_reviews_are_paginated_newest_first(self):
+        reviews = get_reviews('token', '100', '1000')['reviews']
+        self.assertEqual(len(reviews), 120)
+        self.assertEqual(self.emulator.request_counts['GET v4'], 3)
+        response = GBPClient('token').get('v4', 'accounts/100/locations/1000/reviews',
+                                          params={'orderBy': 'updateTime desc'})
+        times = [r['updateTime'] for r in response.json()['reviews']]
+        self.assertEqual(times, sorted(times, reverse=True))
+
+    def test_location_etags_and_updates(self):
+        details = get_location_details('token', 'locations/1001')
+        self.assertEqual(details['title'], 'Business 1001')
+        response = GBPClient('token').get('business_profile', 'locations/1001',
+                                          headers={'If-None-Match': '"1001-1"'})
+        self.assertEqual(response.status_code, 304)
+        update_business_details('token', 'locations/1001', {'title': 'Renamed'})
+        self.assertEqual(self.dataset.locations['1001']['title'], 'Renamed')
+        response = GBPClient('token').get('business_profile', 'locations/1001',
+                                          headers={'If-None-Match': '"1001-1"'})
+        self.assertEqual(response.json()['title'], 'Renamed')
+
+    def test_missing_credentials_are_rejected(self):
+        response = requests.get(f"{self.emulator.url}/v4/accounts/100/locations/1000/reviews")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['error']['status'], 'UNAUTHENTICATED')
+
+    def test_injected_rate_limits_are_retried(self):
+        self.emulator.fail_next('accounts/100/locations/1000/reviews', status=429, count=2)
+        self.assertEqual(len(get_reviews('token', '100', '1000')['reviews']), 120)
+        self.assertEqual(self.emulator.request_counts['GET v4'], 5)
+
+    def test_insights_cover_the_requested_days(self):
+        response = GBPClient('token').get('v4', 'accounts/100/locations/1000/insights',
+                                          params={'startTime': '2024-03-01T00:00:00Z',
+                                                  'endTime': '2024-03-08T00:00:00Z'})
+        metrics = response.json()['locationMetrics'][0]['metricValues']
+        self.assertEqual(len(metrics[0]['dimensionalValues']), 7)
+        again = GBPClient('token').get('v4', 'accounts/100/locations/1000/insights',
+                                       params={'startTime': '2024-03-01T00:00:00Z',
+                                               'endTime': '2024-03-08T00:00:00Z'})
+        self.assertEqual(again.json(), response.json())
+
+
+class GBPEmulatorQuotaTests(EmulatorMixin, SimpleTestCase):
+    def setUp(self):
+        self.start_emulator(quota={'v4': 2})
+
+    def test_quota_exhaustion_returns_resource_exhausted(self):
+        client = GBPClient('token', max_retries=0)
+        statuses = [client.get('v4', 'accounts/100/locations/1000/media').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        response = client.get('v4', 'accounts/100/locations/1000/media')
+        self.assertEqual(response.json()['error']['status'], 'RESOURCE_EXHAUSTED')
+        self.assertIn('Retry-After', response.headers)
+        self.assertEqual(client.get('business_profile', 'locations/1000').status_code, 200)
+
+
+class GBPEmulatorSyncTests(EmulatorMixin, TestCase):
+    def setUp(self):
+        self.start_emulator(error_rate=0.05, seed=3)
+
+    def test_full_then_incremental_location_sync(self):
+        business = create_benchmark_business()
+        results = sync_location(business, '100', '1000', access_token='token')
+        self.assertFalse([name for name, result in results.items() if 'error' in result])
+        self.assertEqual(Review.objects.filter(business=business).count(), 120)
+        self.assertEqual(QandA.objects.filter(business=business).count(), 12)
+
+        self.emulator.request_counts.clear()
+        sync_location(business, '100', '1000', access_token='token', resources=['reviews'])
+        self.assertLessEqual(self.emulator.request_counts['GET v4'], 1 + sum(self.emulator.throttled.values()))
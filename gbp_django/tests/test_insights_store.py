@@ -0,0 +1,65 @@
+import time
+from datetime import date, timedelta
+
+from django.test import TestCase, override_settings
+from gbp_django.benchmarks.gbp_emulator import daily_metric_value
+from gbp_django.benchmarks.harness import EmulatorMixin, create_benchmark_business
+from gbp_django.models import Business, InsightMetric, InsightRollup
+from gbp_django.utils.insights_store import agency_series, insights_range, sync_all_insights, update_rollups
+from gbp_django.utils.token_manager import get_token_manager
+
+TODAY = date(2024, 6, 1)  # a Saturday
+
+
+@override_settings(GBP_INSIGHTS_BACKFILL_DAYS=28, GBP_INSIGHTS_REFETCH_DAYS=3)
+class InsightsStoreTests(EmulatorMixin, TestCase):
+    def setUp(self):
+        self.start_emulator()
+        first = create_benchmark_business()
+        first.business_id = 'accounts/100/locations/1000'
+        first.save()
+        self.businesses = [first, Business.objects.create(
+            user=first.user, business_name='Second', business_id='accounts/100/locations/1001', is_connected=True
+        )]
+        self.user = first.user
+        get_token_manager().store(self.user.id, 'token', time.time() + 3600)
+        self.addCleanup(get_token_manager().invalidate, self.user.id)
+
+    def test_backfill_then_incremental_fetch(self):
+        results = sync_all_insights(self.businesses, today=TODAY)
+        self.assertEqual([r['stored'] for r in results.values()], [28 * 7, 28 * 7])
+        self.assertEqual(InsightMetric.objects.count(), 2 * 28 * 7)
+        self.assertEqual(InsightMetric.objects.get(business=self.businesses[1], metric='VIEWS_MAPS',
+                                                   date=TODAY - timedelta(days=1)).value,
+                         daily_metric_value('1001', 'VIEWS_MAPS', TODAY - timedelta(days=1)))
+
+        # Only the recent days Google may still revise are asked for again
+        self.assertEqual(insights_range(self.businesses[0], today=TODAY), (TODAY - timedelta(days=3), TODAY))
+        self.assertEqual(insights_range(self.businesses[0], today=TODAY + timedelta(days=1)),
+                         (TODAY - timedelta(days=3), TODAY + timedelta(days=1)))
+        results = sync_all_insights(self.businesses, today=TODAY + timedelta(days=1))
+        self.assertEqual([r['stored'] for r in results.values()], [4 * 7, 4 * 7])
+        self.assertEqual(InsightMetric.objects.count(), 2 * 29 * 7)
+
+    def test_rollups_sum_the_agency_locations(self):
+        sync_all_insights(self.businesses, today=TODAY)
+        day = TODAY - timedelta(days=2)
+        rollup = InsightRollup.objects.get(user=self.user, metric='ACTIONS_PHONE', period='day', period_start=day)
+        self.assertEqual(rollup.value, sum(daily_metric_value(l, 'ACTIONS_PHONE', day) for l in ('1000', '1001')))
+        self.assertEqual(rollup.location_count, 2)
+
+        daily = dict(agency_series(self.user, ['VIEWS_SEARCH'])['VIEWS_SEARCH'])
+        weekly = agency_series(self.user, ['VIEWS_SEARCH'], period='week')['VIEWS_SEARCH']
+        self.assertEqual(len(weekly), 5)  # 28 days from a Saturday touch 5 weeks
+        for monday, value in weekly:
+            self.assertEqual(monday.weekday(), 0)
+            self.assertEqual(value, sum(daily.get(monday + timedelta(days=n), 0) for n in range(7)))
+
+    def test_rollups_follow_removed_locations(self):
+        sync_all_insights(self.businesses, today=TODAY)
+        self.businesses[1].delete()
+        update_rollups(self.user.id, TODAY - timedelta(days=28), TODAY)
+        day = TODAY - timedelta(days=2)
+        self.assertEqual(InsightRollup.objects.get(user=self.user, metric='VIEWS_MAPS', period='day',
+                                                   period_start=day).value,
+                         daily_metric_value('1000', 'VIEWS_MAPS', day))
@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from gbp_django.benchmarks.harness import create_benchmark_business, stubbed_models
+from gbp_django.utils import llm_reasoning
+from gbp_django.utils.llm_reasoning import compliance_cache_key, generate_compliance_reasoning
+
+
+class ComplianceReasoningCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = create_benchmark_business()
+        self.data = {
+            "business_id": self.business.business_id,
+            "business_name": self.business.business_name,
+            "website": self.business.website_url,
+            "compliance_score": self.business.compliance_score
+        }
+
+    def test_identical_input_reuses_plan(self):
+        """Unchanged input skips the reasoning model, whatever the key order"""
+        with stubbed_models() as stub:
+            first = generate_compliance_reasoning(self.data)
+            second = generate_compliance_reasoning(dict(reversed(list(self.data.items()))))
+            self.assertEqual(stub.request_counts['chat_completions'], 1)
+
+            generate_compliance_reasoning({**self.data, "compliance_score": 42})
+            self.assertEqual(stub.request_counts['chat_completions'], 2)
+
+            generate_compliance_reasoning(self.data, use_cache=False)
+            self.assertEqual(stub.request_counts['chat_completions'], 3)
+        self.assertEqual(first, second)
+        self.assertIn('steps', first)
+
+    def test_business_save_invalidates(self):
+        with stubbed_models() as stub:
+            key = compliance_cache_key(self.data)
+            generate_compliance_reasoning(self.data)
+
+            self.business.description = "Now serving breakfast"
+            self.business.save()
+            self.assertNotEqual(compliance_cache_key(self.data), key)
+
+            generate_compliance_reasoning(self.data)
+            self.assertEqual(stub.request_counts['chat_completions'], 2)
+
+    def test_policy_version_is_part_of_key(self):
+        key = compliance_cache_key(self.data)
+        original = llm_reasoning.COMPLIANCE_POLICY_VERSION
+        llm_reasoning.COMPLIANCE_POLICY_VERSION = "test-next"
+        try:
+            self.assertNotEqual(compliance_cache_key(self.data), key)
+        finally:
+            llm_reasoning.COMPLIANCE_POLICY_VERSION = original
+
+    def test_errors_are_not_cached(self):
+        with override_settings(GROQ_BASE_URL='http://127.0.0.1:9', GROQ_API_KEY='stub-key'):
+            failed = generate_compliance_reasoning(self.data)
+        self.assertTrue(failed['reasoning'].startswith('Error generating reasoning response'))
+
+        with stubbed_models() as stub:
+            result = generate_compliance_reasoning(self.data)
+            self.assertEqual(stub.request_counts['chat_completions'], 1)
+        self.assertIn('steps', result)
@@ -0,0 +1,139 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from gbp_django.api.business_management import store_business_data
+from gbp_django.benchmarks.gbp_emulator import timestamp
+from gbp_django.models import Business, PendingLocationEdit
+from gbp_django.benchmarks.harness import EmulatorMixin
+from gbp_django.utils.location_edits import (
+    pending_edit_state, push_due_location_edits, push_location_edit, queue_location_edit
+)
+from gbp_django.utils.token_manager import get_token_manager
+
+
+@override_settings(GBP_EDIT_COALESCE_SECONDS=10, GBP_EDIT_MAX_ATTEMPTS=2, GBP_EDIT_RETRY_BASE=30)
+class LocationEditQueueTests(EmulatorMixin, TestCase):
+    def setUp(self):
+        self.start_emulator()
+        user = get_user_model().objects.create_user(email='owner@example.com', google_id='owner-1')
+        get_token_manager().store(user.id, 'token', time.time() + 3600)
+        self.addCleanup(get_token_manager().invalidate, user.id)
+        store_business_data({'locations': [self.dataset.locations['1000']]}, user.id, 'token')
+        self.business = Business.objects.get(business_id='locations/1000')
+        self.remote = self.dataset.locations['1000']
+
+    def push(self):
+        PendingLocationEdit.objects.filter(status='pending').update(push_after=timezone.now())
+        return push_location_edit(PendingLocationEdit.objects.latest('created_at').pk)
+
+    def google_edits(self, **fields):
+        """Someone changes the location at Google after our last sync"""
+        self.remote.update(fields, updateTime=timestamp(timezone.now()))
+
+    def test_successive_edits_coalesce_into_one_patch(self):
+        queue_location_edit(self.business, {'phone_number': '555-0001'})
+        queue_location_edit(self.business, {'phone_number': '555-0002', 'website_url': 'https://new.example.com'},
+                            source='compliance')
+        edit = PendingLocationEdit.objects.get()
+        self.assertEqual(edit.changes, {'phone_number': '555-0002', 'website_url': 'https://new.example.com'})
+        self.assertEqual(edit.sources, ['user', 'compliance'])
+        self.assertEqual(push_location_edit(edit.pk), 'skipped')  # not due yet
+
+        self.assertEqual(self.push(), 'applied')
+        self.assertEqual(self.emulator.request_counts['PATCH business_information'], 1)
+        self.assertEqual(self.remote['phoneNumbers'], {'primaryPhone': '555-0002'})
+        self.assertEqual(self.remote['websiteUri'], 'https://new.example.com')
+        self.assertEqual(pending_edit_state(self.business), {'pending': False})
+
+    def test_edit_of_a_field_changed_at_google_is_a_conflict(self):
+        queue_location_edit(self.business, {'business_name': 'Our Name'})
+        self.google_edits(title='Owner Name')
+        self.assertEqual(self.push(), 'conflict')
+        self.assertEqual(self.emulator.request_counts['PATCH business_information'], 0)
+        self.assertEqual(self.remote['title'], 'Owner Name')
+        state = pending_edit_state(self.business)
+        self.assertEqual((state['status'], state['conflict']), ('conflict', {'business_name': 'Owner Name'}))
+
+        # Re-submitting after seeing the conflict overwrites deliberately
+        queue_location_edit(Business.objects.get(pk=self.business.pk), {'business_name': 'Our Name'})
+        self.assertEqual(self.push(), 'applied')
+        self.assertEqual(self.remote['title'], 'Our Name')
+
+    def test_changes_to_other_fields_at_google_are_not_a_conflict(self):
+        queue_location_edit(self.business, {'business_name': 'Our Name'})
+        self.google_edits(phoneNumbers={'primaryPhone': '555-7777'})
+        self.assertEqual(self.push(), 'applied')
+        self.assertEqual(self.remote['title'], 'Our Name')
+        self.assertEqual(self.remote['phoneNumbers'], {'primaryPhone': '555-7777'})
+
+    def test_failed_pushes_are_retried_then_given_up(self):
+        queue_location_edit(self.business, {'website_url': 'https://florist.example.com'})
+        self.emulator.fail_next('locations/1000', status=503, count=100)
+        self.assertEqual(self.push(), 'pending')
+        edit = PendingLocationEdit.objects.get()
+        self.assertEqual(edit.attempts, 1)
+        self.assertIn('503', edit.last_error)
+        self.assertGreater(edit.push_after, timezone.now() + timedelta(seconds=25))
+
+        # Edits made meanwhile join the retry
+        queue_location_edit(self.business, {'phone_number': '555-0003'})
+        self.assertEqual(PendingLocationEdit.objects.get().changes, {'website_url': 'https://florist.example.com', 'phone_number': '555-0003'})
+        self.assertEqual(self.push(), 'failed')
+        self.assertEqual(pending_edit_state(self.business)['status'], 'failed')
+
+    def test_reimport_keeps_edits_waiting_to_be_pushed(self):
+        queue_location_edit(self.business, {'phone_number': '555-0004'})
+        self.google_edits(title='Renamed At Google')
+        store_business_data({'locations': [self.remote]}, self.business.user_id, 'token')
+        business = Business.objects.get(pk=self.business.pk)
+        self.assertEqual((business.phone_number, business.business_name), ('555-0004', 'Renamed At Google'))
+
+        self.assertEqual(self.push(), 'applied')
+        self.assertEqual(self.remote['phoneNumbers'], {'primaryPhone': '555-0004'})
+        self.assertEqual(Business.objects.get(pk=self.business.pk).phone_number, '555-0004')
+
+    def test_reimport_keeps_conflict_detection(self):
+        queue_location_edit(self.business, {'phone_number': '555-0005'})
+        self.google_edits(phoneNumbers={'primaryPhone': '555-7777'})
+        store_business_data({'locations': [self.remote]}, self.business.user_id, 'token')
+        self.assertEqual(self.push(), 'conflict')
+        self.assertEqual(self.remote['phoneNumbers'], {'primaryPhone': '555-7777'})
+
+    def test_edit_of_a_changed_field_is_a_conflict_without_update_time(self):
+        queue_location_edit(self.business, {'business_name': 'Our Name'})
+        self.remote.pop('updateTime')
+        self.remote['title'] = 'Owner Name'
+        self.assertEqual(self.push(), 'conflict')
+        self.assertEqual(self.remote['title'], 'Owner Name')
+
+    def test_location_is_read_with_a_read_mask(self):
+        queue_location_edit(self.business, {'website_url': 'https://florist.example.com'})
+        self.assertEqual(self.push(), 'applied')
+        self.assertEqual(self.emulator.request_counts['GET business_information'], 1)
+        self.assertEqual(self.remote['websiteUri'], 'https://florist.example.com')
+
+    @override_settings(GBP_EDIT_PUSH_TIMEOUT=600)
+    def test_pushes_that_never_finish_are_taken_over(self):
+        queue_location_edit(self.business, {'phone_number': '555-0006'})
+        edit = PendingLocationEdit.objects.get()
+        # The worker died after claiming the edit
+        PendingLocationEdit.objects.filter(pk=edit.pk).update(status='pushing')
+        queue_location_edit(self.business, {'website_url': 'https://later.example.com'})
+        self.assertEqual(push_due_location_edits(), 0)  # still within the timeout
+
+        PendingLocationEdit.objects.filter(pk=edit.pk).update(updated_at=timezone.now() - timedelta(minutes=11))
+        PendingLocationEdit.objects.filter(status='pending').update(push_after=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(push_due_location_edits(), 1)
+        self.assertEqual(PendingLocationEdit.objects.get().status, 'applied')
+        self.assertEqual(self.remote['phoneNumbers'], {'primaryPhone': '555-0006'})
+        self.assertEqual(self.remote['websiteUri'], 'https://later.example.com')
+        self.assertEqual(self.emulator.request_counts['PATCH business_information'], 1)
+
+    def test_only_api_fields_can_be_queued(self):
+        with self.assertRaises(ValueError):
+            queue_location_edit(self.business, {'business_hours': {}})
+        with self.assertRaises(ValueError):
+            queue_location_edit(self.business, {'category': 'Florist'})
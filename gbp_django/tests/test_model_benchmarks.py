@@ -1,22 +1,32 @@
+import json
 import time
-import unittest
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.db import connections, OperationalError, ProgrammingError
-from django.core.management import call_command
 from django.conf import settings
-from gbp_django.utils.model_interface import GroqModel, OllamaModel
+from gbp_django.utils.model_interface import GroqModel, OllamaModel, stable_history_window
+from gbp_django.benchmarks.llm_stub_server import (
+    StubLLMServer, LatencyModel, deterministic_embedding, parse_keep_alive
+)
+from gbp_django.benchmarks.harness import (
+    create_benchmark_business, percentile, run_conversation_benchmark, run_model_benchmarks, stubbed_models
+)
+from gbp_django.benchmarks.retrieval import generate_corpus, run_retrieval_benchmark
+from gbp_django.utils.google_oauth import generate_review_response
+from gbp_django.utils.rag_utils import _parse_reply_array, generate_review_responses
 
 
 class ModelBenchmarkTests(TestCase):
-    def _database_exists(self, database_name):
-        """Check if a database exists."""
-        connection = connections['default']
-        cursor = connection.cursor()
-        try:
-            cursor.execute(f"SELECT 1 FROM pg_database WHERE datname='{database_name}'")
-            return bool(cursor.fetchone())
-        except OperationalError:
-            return False
+    """Model benchmarks against the local stub server, so they run offline and in CI."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = StubLLMServer(chat_latency='normal:20,5', embedding_latency='fixed:2', seed=42).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+        super().tearDownClass()
 
     def _extension_exists(self, extension_name):
         """Check if a database extension exists."""
@@ -25,7 +35,7 @@ class ModelBenchmarkTests(TestCase):
         try:
             cursor.execute(f"SELECT 1 FROM pg_extension WHERE extname='{extension_name}'")
             return bool(cursor.fetchone())
-        except ProgrammingError:
+        except (OperationalError, ProgrammingError):
             return False
 
     def _create_vector_extension(self):
@@ -34,7 +44,6 @@ class ModelBenchmarkTests(TestCase):
         cursor = connection.cursor()
         try:
             cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-            connection.commit()
             print("Vector extension successfully installed.")
         except Exception as e:
             print(f"Error installing vector extension: {e}")
@@ -54,13 +63,22 @@ class ModelBenchmarkTests(TestCase):
         The platform supports business verification, profile optimization, and local SEO enhancement.
         """
 
+        self.settings_override = override_settings(
+            OLLAMA_BASE_URL=self.stub.ollama_base_url,
+            GROQ_BASE_URL=self.stub.groq_base_url,
+            GROQ_API_KEY='stub-key',
+            OPENAI_BASE_URL=self.stub.openai_base_url,
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
         self.models = {
             'groq': GroqModel(),
             'ollama': OllamaModel()
         }
 
         # Ensure the vector extension is installed
-        if not self._extension_exists('vector'):
+        if connections['default'].vendor == 'postgresql' and not self._extension_exists('vector'):
             self._create_vector_extension()
 
     def test_response_generation_benchmark(self):
@@ -76,7 +94,7 @@ class ModelBenchmarkTests(TestCase):
                     responses.append({
                         'query': query,
                         'response': response,
-                        'success': bool(response and len(response) > 0)
+                        'success': bool(response and response.startswith('Stub response'))
                     })
                 except Exception as e:
                     responses.append({
@@ -102,10 +120,9 @@ class ModelBenchmarkTests(TestCase):
             print(f"Success Rate: {result['success_rate'] * 100:.1f}%")
 
         for model_name, result in results.items():
-            self.assertGreater(result['success_rate'], 0.5,
-                               f"{model_name} success rate below 50%")
-            self.assertLess(result['avg_time'], 30.0,
-                            f"{model_name} average response time exceeds 30 seconds")
+            self.assertEqual(result['success_rate'], 1.0, f"{model_name} failed against the stub server")
+            self.assertLess(result['avg_time'], 2.0,
+                            f"{model_name} average response time exceeds 2 seconds")
 
     def test_embedding_generation_benchmark(self):
         test_texts = [
@@ -152,7 +169,169 @@ class ModelBenchmarkTests(TestCase):
             print(f"Success Rate: {result['success_rate'] * 100:.1f}%")
 
         for model_name, result in results.items():
-            self.assertGreater(result['success_rate'], 0.5,
-                               f"{model_name} embedding success rate below 50%")
-            self.assertLess(result['avg_time'], 10.0,
-                            f"{model_name} average embedding time exceeds 10 seconds")
+            self.assertEqual(result['success_rate'], 1.0,
+                             f"{model_name} embedding failed against the stub server")
+            self.assertLess(result['avg_time'], 1.0,
+                            f"{model_name} average embedding time exceeds 1 second")
+
+    def test_embeddings_are_deterministic(self):
+        """Same text must always map to the same vector so runs are comparable"""
+        model = self.models['ollama']
+        first = model.generate_embedding("Coffee shop opening hours")
+        second = model.generate_embedding("Coffee shop opening hours")
+        self.assertEqual(first, second)
+        self.assertEqual(deterministic_embedding("a b"), deterministic_embedding("b a"))
+
+    def test_latency_model_is_seeded(self):
+        """Latency samples are reproducible for a given spec and seed"""
+        first = [LatencyModel('lognormal:50,0.5', seed=7).sample() for _ in range(3)]
+        second = [LatencyModel('lognormal:50,0.5', seed=7).sample() for _ in range(3)]
+        self.assertEqual(first, second)
+        with self.assertRaises(ValueError):
+            LatencyModel('poisson:3')
+
+    def test_end_to_end_benchmark_suite(self):
+        """Harness drives ingestion, RAG answers and automation paths and reports percentiles"""
+        with stubbed_models(chat_latency='fixed:5', embedding_latency='fixed:1') as stub:
+            business = create_benchmark_business()
+            results = run_model_benchmarks(business, iterations=1)
+
+        print("\n=== End-to-end Benchmark Results ===")
+        for name, row in results.items():
+            print(f"{name}: {row['throughput_per_s']}/s p50={row['p50_ms']}ms "
+                  f"p95={row['p95_ms']}ms p99={row['p99_ms']}ms errors={row['errors']}")
+
+        for name, row in results.items():
+            self.assertGreater(row['count'], 0, f"{name} produced no measurements")
+            self.assertEqual(row['errors'], 0, f"{name} raised errors")
+            self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+            self.assertLessEqual(row['p95_ms'], row['p99_ms'])
+        self.assertGreater(stub.request_counts['ollama_chat'], 0)
+        self.assertGreater(stub.request_counts['ollama_embeddings'], 0)
+
+    def test_warm_up_keeps_models_resident(self):
+        """Warm-up pays the model load once; later requests carry keep_alive and skip it"""
+        with stubbed_models(load_latency='fixed:30') as stub:
+            model = OllamaModel()
+            timings = model.warm_up()
+            self.assertTrue(all(t is not None for t in timings.values()))
+            self.assertEqual(stub.request_counts['model_loads'], 2)
+
+            model.generate_response("When are you open?", "Open 9-5")
+            model.generate_embedding("opening hours")
+            self.assertEqual(stub.request_counts['model_loads'], 2)
+            self.assertEqual(stub.keep_alive_seen[model.llm_model], settings.OLLAMA_KEEP_ALIVE)
+
+            with override_settings(OLLAMA_KEEP_ALIVE=0):
+                unpinned = OllamaModel()
+                unpinned.generate_response("When are you open?", "Open 9-5")
+                unpinned.generate_response("When are you open?", "Open 9-5")
+            self.assertEqual(stub.request_counts['model_loads'], 3)
+
+    def test_repeat_turns_reuse_prompt_prefix(self):
+        """Follow-up turns share the system prompt + history prefix and get faster"""
+        with stubbed_models(load_latency='fixed:100', prompt_eval_ms_per_token=0.2) as stub:
+            business = create_benchmark_business()
+            results = run_conversation_benchmark(business, conversations=1)
+
+        chat_log = [entry for entry in stub.prompt_eval_log if entry['model'] == 'llama3.2:1b']
+        self.assertEqual(chat_log[0]['cached_tokens'], 0)
+        for entry in chat_log[1:]:
+            self.assertGreater(entry['cached_tokens'], entry['evaluated_tokens'])
+        self.assertLess(results['repeat_turns']['p50_ms'], results['first_turn']['p50_ms'])
+
+    def test_batched_review_replies_beat_per_review_calls(self):
+        """One retrieval and one call per batch instead of a RAG round trip per review"""
+        reviews = [{'rating': 1 + i % 5, 'content': f"Review number {i} about the coffee and service"}
+                   for i in range(30)]
+        with stubbed_models(chat_latency='fixed:20', embedding_latency='fixed:2') as stub:
+            business = create_benchmark_business()
+
+            start = time.perf_counter()
+            for review in reviews:
+                generate_review_response(review['rating'], review['content'], business.business_id)
+            single_time = time.perf_counter() - start
+
+            chats_before = stub.request_counts['ollama_chat']
+            start = time.perf_counter()
+            replies = generate_review_responses(reviews, business.business_id, batch_size=10)
+            batch_time = time.perf_counter() - start
+            batch_chats = stub.request_counts['ollama_chat'] - chats_before
+
+        print(f"\nPer-review: {single_time:.2f}s, batched: {batch_time:.2f}s for {len(reviews)} reviews")
+        self.assertEqual(len(replies), len(reviews))
+        self.assertEqual(len(set(replies)), len(reviews))
+        self.assertTrue(all(reply.startswith('Stub reply') for reply in replies))
+        self.assertEqual(batch_chats, 3)
+        self.assertLess(batch_time * 5, single_time)
+
+    def test_reply_array_parsing_salvages_partial_output(self):
+        truncated = 'Sure! [{"index": 2, "reply": "Thanks B"}, {"index": 1, "reply": "Thanks A"}, {"index": 3, "rep'
+        self.assertEqual(_parse_reply_array(truncated, 3), ['Thanks A', 'Thanks B', None])
+        self.assertEqual(_parse_reply_array('["one", "two"]', 2), ['one', 'two'])
+        self.assertEqual(_parse_reply_array('no json here', 2), [None, None])
+
+    def test_history_window_moves_in_blocks(self):
+        history = [{'role': 'user' if i % 2 == 0 else 'assistant', 'content': str(i)} for i in range(20)]
+        self.assertEqual(len(stable_history_window(history[:5], 6)), 5)
+        self.assertEqual(stable_history_window(history[:11], 6)[0]['content'], '0')
+        # Prefix only moves at block boundaries, and always starts on a user turn
+        self.assertEqual(stable_history_window(history[:12], 6)[0]['content'], '6')
+        self.assertEqual(stable_history_window(history[:17], 6)[0]['content'], '6')
+        self.assertEqual(stable_history_window([], 6), [])
+
+    def test_keep_alive_parsing(self):
+        self.assertEqual(parse_keep_alive('30m'), 1800)
+        self.assertEqual(parse_keep_alive('1h30m'), 5400)
+        self.assertEqual(parse_keep_alive(300), 300)
+        self.assertIsNone(parse_keep_alive('-1'))
+        with self.assertRaises(ValueError):
+            parse_keep_alive('soon')
+
+    def test_percentile_interpolates(self):
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2.5)
+        self.assertEqual(percentile([5], 99), 5)
+        self.assertEqual(percentile([], 95), 0.0)
+
+
+class RetrievalBenchmarkTests(SimpleTestCase):
+    """Synthetic-corpus retrieval benchmark: known answers, exact-scan comparison"""
+
+    def setUp(self):
+        self.corpus = generate_corpus(num_documents=10, facts_per_document=2, seed=3)
+
+    def test_corpus_is_deterministic_with_planted_facts(self):
+        again = generate_corpus(num_documents=10, facts_per_document=2, seed=3)
+        self.assertEqual(self.corpus, again)
+        self.assertEqual(len(self.corpus['queries']), 20)
+
+        documents = {doc['file_name']: doc['text'].lower() for doc in self.corpus['documents']}
+        for query in self.corpus['queries']:
+            for keyword in query['keywords']:
+                self.assertIn(keyword, documents[query['file_name']])
+
+    def test_benchmark_reports_quality_and_latency(self):
+        report = run_retrieval_benchmark(self.corpus, [
+            {'name': 'exact'},
+            {'name': 'ivf_all_lists', 'index': 'ivf', 'nlist': 4, 'nprobe': 4},
+            {'name': 'ivf_one_list', 'index': 'ivf', 'nlist': 4, 'nprobe': 1, 'merge': 'max'},
+        ])
+        json.dumps(report)
+
+        exact, ivf_all, ivf_one = report['results']
+        self.assertGreaterEqual(exact['recall_at_k']['20'], 0.9)
+        self.assertGreater(exact['mrr'], 0.0)
+        self.assertEqual(exact['overlap_with_exact'], 1.0)
+        # Probing every list is an exact search
+        self.assertEqual(ivf_all['overlap_with_exact'], 1.0)
+        self.assertEqual(ivf_all['recall_at_k'], exact['recall_at_k'])
+        self.assertLessEqual(ivf_one['overlap_with_exact'], 1.0)
+        self.assertEqual(ivf_one['duplicate_results'], 0)
+        # Concatenating four rephrasings returns every chunk up to four times
+        self.assertGreater(exact['duplicate_results'], 0)
+        for row in report['results']:
+            self.assertIn('p95_ms', row['latency'])
+
+    def test_unknown_index_rejected(self):
+        with self.assertRaises(ValueError):
+            run_retrieval_benchmark(self.corpus, [{'name': 'bad', 'index': 'hnsw'}])
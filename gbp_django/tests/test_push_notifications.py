@@ -0,0 +1,57 @@
+import json
+
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from gbp_django.api.client import resource_cache_key
+from gbp_django.api.notifications import pubsub_push
+from gbp_django.benchmarks.harness import create_benchmark_business
+from gbp_django.benchmarks.pubsub_publisher import build_push_envelope, notification
+from gbp_django.utils.push_notifications import claim_sync, notification_target, release_sync
+
+
+@override_settings(GBP_PUSH_VERIFICATION_TOKEN='secret', GBP_PUSH_COALESCE_SECONDS=30)
+class PushNotificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = create_benchmark_business()
+        self.business.business_id = 'locations/456'
+        self.business.save()
+
+    def push(self, payload, token='secret'):
+        request = RequestFactory().post(f'/api/google/notifications/?token={token}',
+                                        data=json.dumps(build_push_envelope(payload)),
+                                        content_type='application/json')
+        return pubsub_push(request)
+
+    def test_rejects_wrong_token(self):
+        self.assertEqual(self.push(notification('NEW_REVIEW', 'accounts/1/locations/456'), 'guess').status_code, 403)
+
+    def test_malformed_messages_are_acknowledged(self):
+        request = RequestFactory().post('/api/google/notifications/?token=secret', data='{}',
+                                        content_type='application/json')
+        self.assertEqual(pubsub_push(request).status_code, 204)
+
+    def test_location_updates_invalidate_cached_details(self):
+        cache.set(resource_cache_key('locations/456'), {'data': {}, 'fetched_at': 0})
+        response = self.push({'type': 'GOOGLE_UPDATE', 'location': 'accounts/1/locations/456'})
+        self.assertEqual(json.loads(response.content)['status'], 'invalidated')
+        self.assertIsNone(cache.get(resource_cache_key('locations/456')))
+
+    def test_unknown_locations_and_types_are_ignored(self):
+        response = self.push(notification('NEW_REVIEW', 'accounts/1/locations/999'))
+        self.assertEqual(json.loads(response.content)['status'], 'unknown_location')
+        response = self.push({'type': 'SOMETHING_NEW', 'location': 'accounts/1/locations/456'})
+        self.assertEqual(json.loads(response.content)['status'], 'ignored')
+
+    def test_notification_target(self):
+        self.assertEqual(notification_target({'type': 'NEW_REVIEW', 'review': 'accounts/1/locations/456/reviews/r9'}),
+                         ('NEW_REVIEW', '1', '456'))
+        self.assertEqual(notification_target({'notificationType': 'NEW_QUESTION', 'locationName': 'locations/7'}),
+                         ('NEW_QUESTION', None, '7'))
+
+    def test_bursts_coalesce_until_the_sync_starts(self):
+        self.assertTrue(claim_sync(self.business.pk, ['reviews']))
+        self.assertFalse(claim_sync(self.business.pk, ['reviews']))
+        self.assertTrue(claim_sync(self.business.pk, ['questions']))
+        release_sync(self.business.pk, ['reviews'])
+        self.assertTrue(claim_sync(self.business.pk, ['reviews']))
@@ -0,0 +1,73 @@
+import time
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from gbp_django.api.business_management import store_business_data
+from gbp_django.api.qa_management import store_questions_and_answers
+from gbp_django.benchmarks.harness import EmulatorMixin, create_benchmark_business, stubbed_models
+from gbp_django.models import Business, QandA
+from gbp_django.utils.google_oauth import update_qa
+from gbp_django.utils.token_manager import get_token_manager
+
+
+def synthetic_questions(count, answered=()):
+    questions = []
+    for n in range(count):
+        question = {'name': f'accounts/1/locations/1/questions/q{n}', 'text': f'Question {n}?'}
+        if n in answered:
+            question['topAnswers'] = [{'text': f'Answer {n}'}]
+        questions.append(question)
+    return {'questions': questions}
+
+
+class QandASyncTests(TestCase):
+    def setUp(self):
+        self.business = create_benchmark_business()
+
+    def test_resync_does_not_duplicate(self):
+        for _ in range(3):
+            store_questions_and_answers(synthetic_questions(5), self.business.id)
+        self.assertEqual(QandA.objects.count(), 5)
+        self.assertEqual(QandA.objects.get(question_id='accounts/1/locations/1/questions/q3').question, 'Question 3?')
+
+    def test_answered_state_changes_are_batched(self):
+        store_questions_and_answers(synthetic_questions(100, answered={0}), self.business.id)
+        with CaptureQueriesContext(connection) as queries:
+            result = store_questions_and_answers(synthetic_questions(100, answered={1, 2}), self.business.id)
+        self.assertEqual(result, {'created': 0, 'updated': 3, 'unchanged': 97})
+        self.assertEqual(list(QandA.objects.filter(answered=True).order_by('question_id')
+                              .values_list('answer', flat=True)), ['Answer 1', 'Answer 2'])
+        self.assertEqual(QandA.objects.get(question_id='accounts/1/locations/1/questions/q0').answer, '')
+        # SELECT + upsert, plus the transaction savepoint
+        self.assertLessEqual(len(queries), 4)
+
+
+class AnswerQuestionsTests(EmulatorMixin, TestCase):
+    def setUp(self):
+        self.start_emulator()
+        user = get_user_model().objects.create_user(email='owner@example.com', google_id='owner-1')
+        get_token_manager().store(user.id, 'token', time.time() + 3600)
+        self.addCleanup(get_token_manager().invalidate, user.id)
+        store_business_data({'locations': [self.dataset.locations['1000']]}, user.id, 'token')
+        self.business = Business.objects.get(business_id='locations/1000')
+        self.remote = {q['name']: q for q in self.dataset.questions['1000'] if not q.get('topAnswers')}
+        store_questions_and_answers({'questions': list(self.remote.values())}, self.business.id)
+
+    def test_generated_answers_are_posted(self):
+        with stubbed_models():
+            update_qa(self.business)
+        answered = QandA.objects.filter(business=self.business, answered=True)
+        self.assertEqual(answered.count(), len(self.remote))
+        for qa in answered:
+            self.assertTrue(qa.answer.startswith('Stub response'))
+            self.assertEqual(self.remote[qa.question_id]['topAnswers'][0]['text'], qa.answer)
+
+    def test_failed_answers_are_not_posted(self):
+        def unavailable(payload):
+            raise RuntimeError('model unavailable')
+
+        with stubbed_models(responder=unavailable):
+            update_qa(self.business)
+        self.assertEqual(self.emulator.request_counts['POST v4'], 0)
+        self.assertFalse(QandA.objects.filter(business=self.business, answered=True).exists())
@@ -0,0 +1,133 @@
+import time
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from gbp_django.api.business_management import store_business_data
+from gbp_django.api.review_management import store_reviews
+from gbp_django.benchmarks.harness import EmulatorMixin, create_benchmark_business, stubbed_models
+from gbp_django.models import Business, Review, Task
+from gbp_django.tasks.automation_manager import AutomationManager
+from gbp_django.tasks.scheduler import claim_due_tasks, run_scheduled_task
+from gbp_django.utils.google_oauth import respond_to_reviews
+from gbp_django.utils.token_manager import get_token_manager
+
+RATINGS = ['ONE', 'TWO', 'THREE', 'FOUR', 'FIVE']
+
+
+def synthetic_reviews(count, edited=()):
+    reviews = []
+    for n in range(count):
+        review = {
+            'name': f'accounts/1/locations/1/reviews/r{n}',
+            'reviewer': {'displayName': f'Reviewer {n}'},
+            'starRating': RATINGS[n % 5],
+            'comment': f'Review number {n}' + (' (edited)' if n in edited else ''),
+        }
+        if n % 3 == 0:
+            review['reviewReply'] = {'comment': f'Thanks {n}'}
+        reviews.append(review)
+    return {'reviews': reviews}
+
+
+class ReviewSyncTests(TestCase):
+    def setUp(self):
+        self.business = create_benchmark_business()
+
+    def test_store_reviews_upserts_only_changes(self):
+        self.assertEqual(store_reviews(synthetic_reviews(5), self.business.id),
+                         {'created': 5, 'updated': 0, 'unchanged': 0})
+        first = Review.objects.get(review_id='accounts/1/locations/1/reviews/r0')
+        self.assertEqual((first.rating, first.responded, first.response), (1, True, 'Thanks 0'))
+
+        self.assertEqual(store_reviews(synthetic_reviews(6, edited={2}), self.business.id),
+                         {'created': 1, 'updated': 1, 'unchanged': 4})
+        self.assertEqual(Review.objects.get(review_id='accounts/1/locations/1/reviews/r2').content,
+                         'Review number 2 (edited)')
+        self.assertEqual(Review.objects.count(), 6)
+
+    def test_benchmark_10k_reviews(self):
+        """10k inserts then 10k re-syncs (10% edited) in a bounded number of queries"""
+        count = 10000
+        with CaptureQueriesContext(connection) as insert_queries:
+            started = time.perf_counter()
+            result = store_reviews(synthetic_reviews(count), self.business.id, batch_size=500)
+            insert_s = time.perf_counter() - started
+        self.assertEqual(result['created'], count)
+
+        edited = set(range(0, count, 10))
+        with CaptureQueriesContext(connection) as update_queries:
+            started = time.perf_counter()
+            result = store_reviews(synthetic_reviews(count, edited=edited), self.business.id, batch_size=500)
+            update_s = time.perf_counter() - started
+        self.assertEqual(result, {'created': 0, 'updated': len(edited), 'unchanged': count - len(edited)})
+        self.assertEqual(Review.objects.filter(content__endswith='(edited)').count(), len(edited))
+
+        # One SELECT and one upsert per batch of 500 on PostgreSQL (SQLite splits the
+        # INSERTs further) instead of ~2 queries per review, i.e. ~20,000
+        self.assertLess(len(insert_queries), count // 50)
+        self.assertLess(len(update_queries), count // 50)
+        print(f"\n[BENCHMARK] store_reviews: {count} inserts in {insert_s:.2f}s ({len(insert_queries)} queries), "
+              f"{count} re-syncs in {update_s:.2f}s ({len(update_queries)} queries)")
+
+
+class ReviewAutomationTests(EmulatorMixin, TestCase):
+    def setUp(self):
+        self.start_emulator()
+        user = get_user_model().objects.create_user(email='owner@example.com', google_id='owner-1')
+        get_token_manager().store(user.id, 'token', time.time() + 3600)
+        self.addCleanup(get_token_manager().invalidate, user.id)
+        store_business_data({'locations': [self.dataset.locations['1000']]}, user.id, 'token')
+        self.business = Business.objects.get(business_id='locations/1000')
+        remote = [review for review in self.dataset.reviews['1000'] if 'reviewReply' not in review][:4]
+        store_reviews({'reviews': remote}, self.business.id)
+        self.remote = {review['name']: review for review in remote}
+
+    def monitor(self, automation):
+        Business.objects.filter(pk=self.business.pk).update(reviews_automation=automation)
+        with stubbed_models() as stub:
+            AutomationManager(Business.objects.get(pk=self.business.pk)).monitor_reviews()
+        return stub.request_counts['ollama_chat']
+
+    def test_auto_replies_are_posted_once(self):
+        self.assertEqual(self.monitor('auto'), 1)
+        self.assertEqual(self.emulator.request_counts['PUT v4'], 4)
+        for review in Review.objects.filter(business=self.business):
+            self.assertTrue(review.responded)
+            self.assertEqual(self.remote[review.review_id]['reviewReply']['comment'], review.response)
+            self.assertTrue(review.response.startswith('Stub reply'))
+
+        self.assertEqual(self.monitor('auto'), 0)
+        self.assertEqual(self.emulator.request_counts['PUT v4'], 4)
+
+    def test_manual_drafts_are_sent_once(self):
+        self.assertEqual(self.monitor('manual'), 1)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(Review.objects.filter(draft_response__isnull=True).count(), 0)
+        self.assertEqual(self.monitor('manual'), 0)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(self.emulator.request_counts['PUT v4'], 0)
+
+    def test_approval_drafts_are_posted_when_the_window_passes(self):
+        self.monitor('approval')
+        self.monitor('approval')
+        self.assertEqual(Task.objects.filter(business=self.business, task_type='REVIEW').count(), 4)
+        self.assertEqual(self.emulator.request_counts['PUT v4'], 0)
+
+        claimed = claim_due_tasks(now=timezone.now() + timedelta(hours=25))
+        self.assertEqual(len(claimed), 4)
+        self.assertEqual([run_scheduled_task(pk) for pk in claimed], ['COMPLETED'] * 4)
+        self.assertEqual(self.emulator.request_counts['PUT v4'], 4)
+        self.assertEqual(Review.objects.filter(responded=True).count(), 4)
+
+    def test_reviews_awaiting_approval_are_not_answered_directly(self):
+        self.monitor('approval')
+        draft = Review.objects.filter(business=self.business).first()
+        Review.objects.filter(pk=draft.pk).update(draft_response=None)
+        with stubbed_models():
+            respond_to_reviews(Business.objects.get(pk=self.business.pk))
+        self.assertEqual(self.emulator.request_counts['PUT v4'], 1)
+        self.assertEqual(list(Review.objects.filter(responded=True)), [draft])
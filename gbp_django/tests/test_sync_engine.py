@@ -0,0 +1,67 @@
+from django.test import TestCase, override_settings
+from gbp_django.benchmarks.harness import ScriptedServerMixin, create_benchmark_business
+from gbp_django.models import Post, Review, SyncWatermark
+from gbp_django.utils.sync_engine import sync_location, sync_resource
+
+REVIEWS = '/v4/accounts/acc/locations/loc/reviews?orderBy=updateTime+desc&pageSize=50'
+POSTS = '/v4/accounts/acc/locations/loc/localPosts?pageSize=100'
+
+
+def review(n, day):
+    return {'name': f'accounts/acc/locations/loc/reviews/r{n}', 'starRating': 'FIVE',
+            'comment': f'Review {n}', 'updateTime': f'2024-05-{day:02d}T10:00:00Z'}
+
+
+@override_settings(GBP_API_QUOTAS={}, GBP_HTTP_MAX_RETRIES=0)
+class SyncEngineTests(ScriptedServerMixin, TestCase):
+    def setUp(self):
+        self.start_server()
+        self.business = create_benchmark_business()
+        self.server.bodies[REVIEWS] = {'reviews': [review(3, 3), review(2, 2)], 'nextPageToken': 't2'}
+        self.server.bodies[REVIEWS + '&pageToken=t2'] = {'reviews': [review(1, 1)]}
+
+    def sync(self, name):
+        return sync_resource(self.business, name, 'token', 'acc', 'loc')
+
+    def test_steady_state_reads_only_new_items(self):
+        self.assertEqual(self.sync('reviews')['stored'], 3)
+        watermark = SyncWatermark.objects.get(business=self.business, resource='reviews')
+        self.assertEqual(watermark.last_update_time.isoformat(), '2024-05-03T10:00:00+00:00')
+        self.assertEqual(len(self.server.requests), 2)
+
+        # One new review on top; the listing stops at the first one we already have
+        self.server.bodies[REVIEWS] = {'reviews': [review(4, 4), review(3, 3), review(2, 2)], 'nextPageToken': 't2'}
+        metrics = self.sync('reviews')
+        self.assertEqual((metrics['fetched'], metrics['stored']), (3, 1))
+        self.assertGreater(metrics['lag_seconds'], 0)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(Review.objects.filter(business=self.business).count(), 4)
+
+    def test_unordered_resources_store_only_newer_items(self):
+        self.server.bodies[POSTS] = {'localPosts': [
+            {'name': 'p1', 'summary': 'Old', 'updateTime': '2024-05-01T00:00:00Z'},
+            {'name': 'p2', 'summary': 'New', 'updateTime': '2024-05-05T00:00:00Z'},
+        ]}
+        SyncWatermark.objects.create(business=self.business, resource='posts',
+                                     last_update_time='2024-05-02T00:00:00Z')
+        self.assertEqual(self.sync('posts')['stored'], 1)
+        self.assertEqual(list(Post.objects.values_list('post_id', flat=True)), ['p2'])
+
+    def test_interrupted_run_resumes_from_page_token(self):
+        resumed = '/v4/accounts/acc/locations/loc/reviews?orderBy=updateTime+desc&pageToken=t2&pageSize=50'
+        self.server.bodies[resumed] = {'reviews': [review(1, 1)]}
+        SyncWatermark.objects.create(business=self.business, resource='reviews', page_token='t2')
+        self.assertEqual(self.sync('reviews')['stored'], 1)
+        self.assertEqual([r[1] for r in self.server.requests], [resumed])
+        self.assertEqual(SyncWatermark.objects.get(business=self.business, resource='reviews').page_token, '')
+
+    def test_expired_page_token_restarts_listing(self):
+        SyncWatermark.objects.create(business=self.business, resource='reviews', page_token='gone')
+        self.server.scripts['/v4/accounts/acc/locations/loc/reviews'] = [(400, {})]
+        self.assertEqual(self.sync('reviews')['stored'], 3)
+
+    def test_failures_are_reported_per_resource(self):
+        self.server.scripts['/v4/accounts/acc/locations/loc/media'] = [(500, {})]
+        results = sync_location(self.business, 'acc', 'loc', access_token='token')
+        self.assertIn('error', results['media'])
+        self.assertEqual(results['reviews']['stored'], 3)
@@ -0,0 +1,31 @@
+import importlib
+import sys
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+TASK_MODULES = ['gbp_django.tasks.automation_manager', 'gbp_django.tasks.tasks']
+
+
+class TaskModuleImportTests(TestCase):
+    def test_task_modules_import_quickly_without_queries(self):
+        importlib.import_module('gbp_django.models')  # imported by Django at setup anyway
+        for name in TASK_MODULES:
+            sys.modules.pop(name, None)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for name in TASK_MODULES:
+                importlib.import_module(name)
+            elapsed = time.perf_counter() - started
+        self.assertEqual([q['sql'] for q in queries.captured_queries], [])
+        self.assertLess(elapsed, 0.5)
+
+    def test_beat_schedule_names_registered_tasks(self):
+        from gbp_django.celery import app
+
+        importlib.import_module('gbp_django.tasks.tasks')
+        for entry in settings.CELERY_BEAT_SCHEDULE.values():
+            self.assertIn(entry['task'], app.tasks)
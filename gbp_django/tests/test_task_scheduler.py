@@ -0,0 +1,106 @@
+import time
+from datetime import timedelta
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from gbp_django.benchmarks.harness import create_benchmark_business
+from gbp_django.models import Business, Task
+from gbp_django.tasks.scheduler import Lease, claim_due_tasks, dispatch_due_tasks, run_scheduled_task, stale_tasks
+
+
+class DueTaskScannerTests(TestCase):
+    def setUp(self):
+        self.business = create_benchmark_business()
+        self.now = timezone.now()
+
+    def task(self, hours_ago=1, **fields):
+        fields.setdefault('frequency', 'DAILY')
+        fields.setdefault('task_type', 'REVIEW')
+        return Task.objects.create(business=self.business, next_run=self.now - timedelta(hours=hours_ago), **fields)
+
+    def test_claims_only_due_tasks_and_advances_next_run(self):
+        due = self.task()
+        self.task(hours_ago=-1)  # not due yet
+        self.task(is_active=False)
+        self.task(status='PAUSED')
+
+        self.assertEqual(claim_due_tasks(now=self.now), [due.pk])
+        due.refresh_from_db()
+        self.assertEqual(due.status, 'RUNNING')
+        self.assertEqual(due.next_run, self.now - timedelta(hours=1) + timedelta(days=1))
+        # A second scanner finds nothing left to claim
+        self.assertEqual(claim_due_tasks(now=self.now), [])
+
+    def test_missed_runs_are_skipped_not_replayed(self):
+        task = self.task(hours_ago=24 * 10, frequency='WEEKLY')
+        claim_due_tasks(now=self.now)
+        task.refresh_from_db()
+        self.assertEqual(task.next_run, self.now - timedelta(days=10) + timedelta(weeks=2))
+
+    def test_tasks_of_unverified_businesses_are_paused(self):
+        other = Business.objects.create(user=self.business.user, business_name='Unverified', business_id='locations/9')
+        task = Task.objects.create(business=other, task_type='REVIEW', next_run=self.now - timedelta(minutes=5))
+        self.assertEqual(claim_due_tasks(now=self.now), [])
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'PAUSED')
+
+    def test_dispatch_drains_in_batches(self):
+        for n in range(5):
+            self.task(hours_ago=n + 1)
+        self.assertEqual(dispatch_due_tasks(batch_size=2, now=self.now), 5)
+        self.assertEqual(Task.objects.filter(status='RUNNING').count(), 5)
+
+    @override_settings(GBP_TASK_MAX_RETRIES=2)
+    def test_runs_return_recurring_tasks_to_pending(self):
+        recurring = self.task()
+        one_off = self.task(frequency='CUSTOM')
+        failing = self.task()
+        Task.objects.filter(pk=failing.pk).update(task_type='QA')  # monitor_questions is broken for now
+        claim_due_tasks(now=self.now)
+
+        self.assertEqual(run_scheduled_task(recurring.pk), 'PENDING')
+        self.assertEqual(run_scheduled_task(one_off.pk), 'COMPLETED')
+        self.assertIsNone(Task.objects.get(pk=one_off.pk).next_run)
+        self.assertEqual(run_scheduled_task(failing.pk), 'PENDING')
+        self.assertEqual(Task.objects.get(pk=failing.pk).retry_count, 1)
+        self.assertEqual(run_scheduled_task(recurring.pk), 'skipped')  # already finished
+
+    @override_settings(GBP_TASK_CLAIM_TIMEOUT=600, GBP_TASK_CLAIM_TIMEOUTS={'QA': 3600})
+    def test_claims_that_never_finish_are_dispatched_again(self):
+        task = self.task()
+        claim_due_tasks(now=self.now)
+        task.refresh_from_db()
+        advanced = task.next_run
+
+        # The worker never reported back; within the timeout the claim still holds
+        self.assertEqual(claim_due_tasks(now=self.now + timedelta(minutes=5)), [])
+        later = self.now + timedelta(minutes=11)
+        self.assertEqual(claim_due_tasks(now=later), [task.pk])
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.last_run, task.next_run), ('RUNNING', later, advanced))
+
+        self.assertEqual(run_scheduled_task(task.pk), 'PENDING')
+        self.assertEqual(Task.objects.get(pk=task.pk).next_run, advanced)
+
+    @override_settings(GBP_TASK_CLAIM_TIMEOUT=600, GBP_TASK_CLAIM_TIMEOUTS={'QA': 3600})
+    def test_claim_timeout_is_per_task_type(self):
+        claimed_at = self.now - timedelta(minutes=30)
+        review = self.task(status='RUNNING', last_run=claimed_at)
+        self.task(task_type='QA', status='RUNNING', last_run=claimed_at)
+        self.assertEqual(list(stale_tasks(self.now)), [review])
+
+
+class LeaseTests(TransactionTestCase):
+    """The lease is renewed from another thread, which needs committed rows"""
+
+    @override_settings(GBP_TASK_CLAIM_TIMEOUTS={'REVIEW': 0.6})
+    def test_running_tasks_renew_their_claim(self):
+        task = Task.objects.create(business=create_benchmark_business(), task_type='REVIEW',
+                                   status='RUNNING', last_run=timezone.now())
+        with Lease(task) as lease:
+            time.sleep(0.9)
+            self.assertEqual(list(stale_tasks()), [])
+            # Another scanner takes the task over anyway
+            Task.objects.filter(pk=task.pk).update(last_run=timezone.now())
+            time.sleep(0.5)
+        self.assertTrue(lease.lost)
@@ -0,0 +1,111 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from gbp_django.models import Business
+from gbp_django.benchmarks.harness import EmulatorMixin, ScriptedServerMixin
+from gbp_django.utils.token_manager import TokenManager, TokenUnavailable, get_token_manager
+
+User = get_user_model()
+
+
+@override_settings(GBP_API_QUOTAS={}, GBP_TOKEN_REFRESH_MARGIN=300)
+class TokenManagerTests(ScriptedServerMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.start_server()
+        self.server.bodies['/oauth/token'] = {'access_token': 'fresh-token', 'expires_in': 3600}
+        self.manager = TokenManager()
+        self.user = User.objects.create_user(email='owner@example.com', password='x',
+                                             google_refresh_token='refresh-1')
+
+    def test_cached_tokens_need_no_database_read(self):
+        self.manager.store(self.user.id, 'login-token', timezone.now() + timedelta(hours=1))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.manager.get_token(self.user.id), 'login-token')
+            # Another process sees it through the shared cache
+            self.assertEqual(TokenManager().get_token(self.user.id), 'login-token')
+        self.assertEqual(self.server.requests, [])
+
+    def test_valid_stored_token_is_used_before_refreshing(self):
+        User.objects.filter(pk=self.user.id).update(google_access_token='stored-token',
+                                                    google_token_expiry=timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.manager.get_token(self.user.id), 'stored-token')
+        self.assertEqual(self.server.requests, [])
+
+    def test_expired_token_is_refreshed_and_saved(self):
+        self.assertEqual(self.manager.get_token(self.user.id), 'fresh-token')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.google_access_token, 'fresh-token')
+        self.assertGreater(self.user.google_token_expiry, timezone.now() + timedelta(minutes=50))
+        self.assertEqual([r[1] for r in self.server.requests], ['/oauth/token'])
+
+    def test_missing_refresh_token(self):
+        User.objects.filter(pk=self.user.id).update(google_refresh_token=None)
+        with self.assertRaises(TokenUnavailable):
+            self.manager.get_token(self.user.id)
+
+
+@override_settings(GBP_API_QUOTAS={}, GBP_TOKEN_REFRESH_MARGIN=300)
+class TokenRefreshThreadTests(ScriptedServerMixin, TransactionTestCase):
+    """Refreshes on other threads need committed rows, hence TransactionTestCase"""
+
+    def setUp(self):
+        cache.clear()
+        self.start_server()
+        self.server.bodies['/oauth/token'] = {'access_token': 'fresh-token', 'expires_in': 3600}
+        self.manager = TokenManager()
+        self.user = User.objects.create_user(email='agency@example.com', password='x',
+                                             google_refresh_token='refresh-1')
+
+    def test_token_near_expiry_is_served_while_refreshing(self):
+        self.manager.store(self.user.id, 'old-token', time.time() + 60)
+        self.assertEqual(self.manager.get_token(self.user.id), 'old-token')
+        deadline = time.monotonic() + 5
+        while self.manager.get_token(self.user.id) == 'old-token' and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.manager.get_token(self.user.id), 'fresh-token')
+
+    def test_concurrent_refreshes_are_coalesced(self):
+        user = self.user
+        # Separate managers stand in for separate worker processes sharing the cache
+        managers = [TokenManager() for _ in range(10)]
+        tokens = []
+
+        def fetch(manager):
+            tokens.append(manager.get_token(user.id))
+
+        threads = [threading.Thread(target=fetch, args=(m,)) for m in managers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(tokens, ['fresh-token'] * 10)
+        self.assertEqual(len(self.server.requests), 1)
+
+
+class OAuthCallbackTests(EmulatorMixin, TestCase):
+    def setUp(self):
+        from allauth.socialaccount.models import SocialApp
+
+        self.start_emulator()
+        SocialApp.objects.create(provider='google', name='Google', client_id='client-id', secret='secret')
+        session = self.client.session
+        session['oauth_state'] = 'state-1'
+        session.save()
+
+    def test_code_is_exchanged_and_user_signed_in(self):
+        response = self.client.get('/google/callback/', {'code': 'auth-code', 'state': 'state-1'})
+        self.assertRedirects(response, '/dashboard/', fetch_redirect_response=False)
+        self.assertEqual(self.emulator.request_counts['POST oauth'], 1)
+
+        user = User.objects.get(email='owner@example.com')
+        self.addCleanup(get_token_manager().invalidate, user.id)
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.id)
+        self.assertTrue(user.google_access_token.startswith('emulated-'))
+        self.assertEqual(get_token_manager().get_token(user.id), user.google_access_token)
+        self.assertEqual(Business.objects.filter(user=user).count(), 3)
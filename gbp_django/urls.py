@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth.decorators import login_required
 from . import views
-from gbp_django.api import automation
+from gbp_django.api import automation, notifications
 from django.conf import settings
 from django.conf.urls.static import static
 from allauth.account.views import LoginView
@@ -27,6 +27,8 @@ urlpatterns = [
     path('api/business/<str:business_id>/knowledge/', views.add_knowledge, name='add_knowledge'),
     path('api/business/<str:business_id>/update/',
          views.update_business, name='update_business'),
+    path('api/business/<str:business_id>/pending-edits/',
+         views.business_pending_edits, name='business_pending_edits'),
     path('api/business/<str:business_id>/automation/',
          views.update_automation_settings, name='update_automation'),
     path('api/business/bulk-upload/',
@@ -49,6 +51,7 @@ urlpatterns = [
     path('api/generate-content/', views.generate_content, name='generate_content'),
     path('api/business/<str:business_id>/seo-health/', views.get_seo_health, name='get_seo_health'),
     path('api/automation/fallback/<str:business_id>/', automation.automation_fallback, name='automation_fallback'),
+    path('api/google/notifications/', notifications.pubsub_push, name='google_notifications'),
 ]
 
 # Serve static files
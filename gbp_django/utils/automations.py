@@ -49,7 +49,9 @@ class GoogleBusinessAPIHandler:
     def _build_service(self):
         try:
             creds = Credentials.from_authorized_user_file(self.credentials_file)
-            self.service = build('mybusiness', 'v4', credentials=creds)
+            base_url = os.getenv("GBP_API_BASE_URL")  # e.g. the local emulator
+            client_options = {"api_endpoint": f"{base_url.rstrip('/')}/v4/"} if base_url else None
+            self.service = build('mybusiness', 'v4', credentials=creds, client_options=client_options)
             logging.info("Google Business Profile API service built successfully.")
         except Exception as e:
             logging.error(f"Error building API service: {e}")
@@ -529,126 +531,68 @@ class BusinessProfileManager:
 
     async def run_structured_compliance_flow(self) -> None:
         """
-        Execute the compliance flow step-by-step using the reasoning model.
+        Execute the compliance flow using the reasoning model. Independent actions of a plan
+        run concurrently; unfinished runs resume from their persisted state.
         """
         logging.info("[COMPLIANCE] Running structured compliance flow for all businesses.");
-        from model_interface import get_llm_model
-        from llm_reasoning import get_compliance_policy
-
-        llm = get_llm_model()
-        pre_prompt = get_compliance_policy()
-
+        from functools import partial
+        from asgiref.sync import sync_to_async
         from gbp_django.models import Business
-        for business in Business.objects.all():
-            business_url = self.businesses.get(business.business_id)
-            if not business_url:
-                continue
+        from gbp_django.utils.compliance_executor import run_compliance_plan
+        from gbp_django.utils.llm_reasoning import generate_compliance_reasoning
 
-            logging.info(f"[COMPLIANCE] Initiating reasoning model for business {business.business_id}");
-            logging.info(f"[COMPLIANCE] Starting structured compliance flow for business {business.business_id}");
-            prompt = (
-                f"Business ID: {business.business_id}\n"
-                f"Business Name: {business.business_name}\n"
-                f"Website: {business.website_url}\n"
-                f"Compliance Score: {business.compliance_score}\n"
-                "Generate a structured plan with actions to ensure compliance. "
-                "Prioritize updating missing or invalid mandatory details first, then content compliance."
-            )
-            logging.info(f"[REASONER] Executing structured reasoning with prompt: {prompt}")
-            logging.info("[REASONER] Prompting reasoning model now...")
-            from gbp_django.utils.llm_reasoning import generate_compliance_reasoning
-            reasoning_result = generate_compliance_reasoning({
-                "business_id": business.business_id,
-                "business_name": business.business_name,
-                "website": business.website_url,
-                "compliance_score": business.compliance_score
-            })
-            logging.info(f"[{business.business_id} Structured Compliance] Reasoning output: {reasoning_result}")
-            logging.info(
-                f"[COMPLIANCE] Structured compliance actions generated for business {business.business_id}: {len(reasoning_result.get('actions', []))} actions")
-
-            # Pass the first instruction to the fallback agent and log the result.
-            agent = self.fallback_agents.get(business.business_id)
-            if agent:
-                firstInst = None
-                for item in reasoning_result.get("actions", []):
-                    if item.get("type") == "instruction":
-                        firstInst = item
-                        break
-                if firstInst:
-                    logging.info(
-                        f"[{business.business_id} Instruction] Passing first instruction to agent: " + firstInst.get(
-                            "details"))
-                    try:
-                        instruction_result = await agent.execute_instruction(firstInst.get("details"))
-                        logging.info(
-                            f"[{business.business_id} Instruction] Execution result: " + str(instruction_result))
-                        reasoning_result.get("actions", []).remove(firstInst)
-                    except Exception as ex:
-                        logging.error(f"[{business.business_id} Instruction] Error executing instruction: " + str(ex))
-                else:
-                    logging.info(f"[{business.business_id} Instruction] No instruction action found.")
-            else:
+        businesses = await sync_to_async(list)(Business.objects.filter(business_id__in=list(self.businesses)))
+        for business in businesses:
+            business_url = self.businesses[business.business_id]
+            if not self.fallback_agents.get(business.business_id):
                 logging.error(f"No fallback agent found for business {business.business_id}")
+                continue
 
-            actions = reasoning_result.get("actions", [])
-            while actions:
-                for action in actions:
-                    logging.debug(f"Structured compliance action: {action}")
-                    action_type = action.get("type")
-                    target = action.get("target")
-                    details = action.get("details")
-                    logging.info(f"[{business.business_id} Compliance Action] {action_type} on {target}: {details}")
-                    agent = self.fallback_agents.get(business.business_id)
-                    if not agent:
-                        logging.error(f"No fallback agent found for business {business.business_id}")
-                        continue
-                    try:
-                        if target == "website" and action_type in ("update", "fallback_update"):
-                            new_website = details  # Parse details as needed
-                            logging.info(
-                                f"[{business.business_id}][AGENT] Initiating fallback update for website: {new_website}")
-                            result = await agent.update_business_info(business_url,
-                                                                      getattr(business, "hours", "Mon-Fri 09:00-17:00"),
-                                                                      new_website)
-                            logging.info(f"[{business.business_id}][AGENT] Fallback update result: {result}")
-                        elif target in ["reviews", "qna", "posts", "photos"] and action_type in (
-                                "verify", "fallback_verify"):
-                            logging.info(
-                                f"[{business.business_id}][AGENT] Initiating fallback compliance check for target: {target}")
-                            result = await agent.compliance_check(business_url)
-                            logging.info(f"[{business.business_id}][AGENT] Fallback compliance check result: {result}")
-                        elif action_type == "alert":
-                            input(
-                                f"[{business.business_id}] Intervention required for {target}: {details}. Press Enter after action.")
-                        elif action_type == "log":
-                            logging.info(f"[{business.business_id} LOG] {details}")
-                        elif action_type == "instruction":
-                            logging.info(f"[{business.business_id}][AGENT] Executing instruction: {details}")
-                            if hasattr(agent, "execute_instruction"):
-                                result = await agent.execute_instruction(details)
-                                logging.info(f"[{business.business_id}][AGENT] Instruction result: {result}")
-                            else:
-                                logging.info(
-                                    f"[{business.business_id}][AGENT] No execute_instruction method available; skipping instruction.")
-                    except Exception as e:
-                        logging.error(
-                            f"[{business.business_id}] Error executing fallback action {action_type} on {target}: {e}")
-                    logging.info(f"[{business.business_id} Compliance] Completed action: {action_type} on {target}")
-                # Feed back the executed actions to the reasoning model to get next instructions.
-                feedback_data = {
+            logging.info(f"[COMPLIANCE] Starting structured compliance flow for business {business.business_id}");
+            summary = await run_compliance_plan(
+                business,
+                partial(self._run_compliance_action, business, business_url),
+                generate_compliance_reasoning,
+                initial_data={
                     "business_id": business.business_id,
-                    "executed_actions": actions
+                    "business_name": business.business_name,
+                    "website": business.website_url,
+                    "compliance_score": business.compliance_score
                 }
-                logging.info(
-                    f"[{business.business_id} Feedback] Sending executed actions to reasoning model: {feedback_data}")
-                new_reasoning = generate_compliance_reasoning(feedback_data)
-                actions = new_reasoning.get("actions", [])
-                if not actions:
-                    logging.info(
-                        f"[{business.business_id} Feedback] No further actions received from reasoning model. Exiting feedback loop.")
-                    break
-            logging.info("[COMPLIANCE] Structured compliance flow completed.")
+            )
+            logging.info(f"[{business.business_id} Structured Compliance] Run summary: {summary}")
+        logging.info("[COMPLIANCE] Structured compliance flow completed.")
+
+    async def _run_compliance_action(self, business, business_url: str, action: dict):
+        """Execute one structured compliance action through the fallback agent."""
+        action_type = action.get("type")
+        target = action.get("target")
+        details = action.get("details")
+        agent = self.fallback_agents[business.business_id]
+        result = None
+        if target == "website" and action_type in ("update", "fallback_update"):
+            new_website = details  # Parse details as needed
+            logging.info(f"[{business.business_id}][AGENT] Initiating fallback update for website: {new_website}")
+            result = await agent.update_business_info(business_url,
+                                                      getattr(business, "hours", "Mon-Fri 09:00-17:00"),
+                                                      new_website)
+        elif target in ["reviews", "qna", "posts", "photos"] and action_type in ("verify", "fallback_verify"):
+            logging.info(f"[{business.business_id}][AGENT] Initiating fallback compliance check for target: {target}")
+            result = await agent.compliance_check(business_url)
+        elif action_type == "alert":
+            # Blocking prompt; keep it off the event loop so other actions continue
+            await asyncio.to_thread(
+                input, f"[{business.business_id}] Intervention required for {target}: {details}. Press Enter after action.")
+        elif action_type == "log":
+            logging.info(f"[{business.business_id} LOG] {details}")
+        elif action_type == "instruction":
+            logging.info(f"[{business.business_id}][AGENT] Executing instruction: {details}")
+            if hasattr(agent, "execute_instruction"):
+                result = await agent.execute_instruction(details)
+            else:
+                logging.info(f"[{business.business_id}][AGENT] No execute_instruction method available; skipping instruction.")
+        logging.info(f"[{business.business_id} Compliance] Completed action: {action_type} on {target}: {result}")
+        return result
 
     async def run_compliance_checks(self) -> None:
         tasks = [self.fallback_agents[biz_id].compliance_check(self.businesses[biz_id]) for biz_id in self.businesses]
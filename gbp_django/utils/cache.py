@@ -1,4 +1,6 @@
 import hashlib
+import json
+import time
 from functools import wraps
 from django.core.cache import cache
 
@@ -50,3 +52,30 @@ def invalidate_cache(pattern):
     """
     keys = cache.keys(f"cache:{pattern}*")
     cache.delete_many(keys)
+
+def stable_hash(*parts):
+    """
+    sha256 of ``parts`` serialised as canonical JSON, so dict key order and
+    whitespace don't change the result
+    """
+    canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def get_generation(namespace, key):
+    """
+    Current generation token for ``key``. Entries whose cache key embeds the token are
+    invalidated together by bump_generation, without needing to enumerate cache keys
+    (which most backends can't do).
+    """
+    generation_key = f"generation:{namespace}:{key}"
+    generation = cache.get(generation_key)
+    if generation is None:
+        # Start from a fresh token (not 0) so an evicted counter can't resurrect old entries
+        generation = time.time_ns()
+        if not cache.add(generation_key, generation, None):
+            generation = cache.get(generation_key, generation)
+    return generation
+
+def bump_generation(namespace, key):
+    """Orphan every entry keyed on the current generation of ``key``"""
+    cache.set(f"generation:{namespace}:{key}", time.time_ns(), None)
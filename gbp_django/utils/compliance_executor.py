@@ -0,0 +1,282 @@
+"""
+Dependency-aware execution of compliance reasoning plans.
+
+The reasoning model emits actions carrying ``dependencies``, ``risk_score`` and
+``eta``. Actions are arranged into a DAG and independent ones run concurrently
+(bounded by COMPLIANCE_MAX_PARALLEL_ACTIONS). Every action is persisted as a
+ComplianceAction row, so an interrupted run resumes with its unfinished actions
+instead of asking the model for a new plan, and the plan/feedback loop is capped
+at COMPLIANCE_MAX_ITERATIONS rounds.
+"""
+import asyncio
+import json
+import logging
+import re
+import uuid
+from datetime import datetime, time, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .cache import stable_hash
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('COMPLETED', 'FAILED', 'SKIPPED')
+
+
+def action_key(action: Dict) -> str:
+    """Stable identity for an action, so re-emitted actions are recognised within a run"""
+    return stable_hash(action.get("type"), action.get("target"), action.get("details"))[:32]
+
+
+def build_action_graph(actions: List[Dict]) -> Dict[str, List[str]]:
+    """
+    Map each action's key to the keys of the actions it depends on.
+
+    A dependency may name another action's ``id``, its position in the plan, or a
+    target (meaning every earlier action on that target). Unresolvable references
+    are logged and ignored rather than blocking the action.
+    """
+    keys = [action_key(action) for action in actions]
+    ids = {str(action["id"]): key for action, key in zip(actions, keys) if action.get("id") is not None}
+    graph = {}
+    for position, (action, key) in enumerate(zip(actions, keys)):
+        resolved = []
+        for dependency in action.get("dependencies") or []:
+            if str(dependency) in ids:
+                matches = [ids[str(dependency)]]
+            elif str(dependency).isdigit() and int(dependency) < len(actions):
+                matches = [keys[int(dependency)]]
+            else:
+                matches = [keys[i] for i in range(position) if actions[i].get("target") == dependency]
+            if not matches:
+                logger.warning(f"Ignoring unknown dependency {dependency!r} of {action.get('type')} on {action.get('target')}")
+            resolved.extend(match for match in matches if match != key and match not in resolved)
+        graph[key] = resolved
+    return graph
+
+
+ETA_UNITS = {'w': 'weeks', 'd': 'days', 'h': 'hours', 'm': 'minutes', 's': 'seconds'}
+ETA_DURATION = re.compile(r'(\d+(?:\.\d+)?)\s*(weeks?|w|days?|d|hours?|hrs?|h|minutes?|mins?|m|seconds?|secs?|s)\b')
+
+
+def parse_eta(value: str, start: datetime) -> Optional[datetime]:
+    """
+    When an action's free-text ``eta`` falls: a timestamp or date, or a duration
+    such as "2 days" or "1h 30m" counted from ``start``. None if it can't be read.
+    """
+    value = (value or '').strip().lower()
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value.upper())
+    except ValueError:
+        moment = None
+    if moment is None:
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        moment = datetime.combine(day, time.min) if day else None
+    if moment is not None:
+        return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+    parts = ETA_DURATION.findall(value)
+    if not parts:
+        return None
+    return start + sum((timedelta(**{ETA_UNITS[unit[0]]: float(amount)}) for amount, unit in parts), timedelta())
+
+
+def _priority(row) -> tuple:
+    # Earliest eta first (unreadable ones last), then the lowest-risk actions
+    eta = parse_eta(row.eta, row.created_at or timezone.now())
+    return (eta is None, eta.timestamp() if eta else 0, row.risk_score if row.risk_score is not None else 10)
+
+
+def _json_safe(value):
+    return json.loads(json.dumps(value, default=str))
+
+
+class ComplianceActionExecutor:
+    """Runs the actions of one compliance run for a business and records their state."""
+
+    def __init__(self, business, run_action: Callable[[Dict], Awaitable], run_id: Optional[str] = None,
+                 max_parallel: Optional[int] = None):
+        self.business = business
+        self.run_action = run_action
+        self.run_id = run_id or uuid.uuid4().hex
+        self.max_parallel = max(1, max_parallel or settings.COMPLIANCE_MAX_PARALLEL_ACTIONS)
+
+    @classmethod
+    def resume(cls, business, run_action, max_parallel=None):
+        """
+        Executor for the business's unfinished run, or None. Returns the executor and
+        the iteration that was interrupted.
+        """
+        from ..models import ComplianceAction
+
+        unfinished = ComplianceAction.objects.filter(business=business).exclude(
+            status__in=TERMINAL_STATUSES
+        ).order_by('-created_at').first()
+        if unfinished is None:
+            return None, 0
+        return cls(business, run_action, run_id=unfinished.run_id, max_parallel=max_parallel), unfinished.iteration
+
+    def record_plan(self, actions: List[Dict], iteration: int) -> List:
+        """Persist new actions; actions already seen in this run are not repeated."""
+        from ..models import ComplianceAction
+
+        graph = build_action_graph(actions)
+        seen = set(ComplianceAction.objects.filter(run_id=self.run_id).values_list('action_key', flat=True))
+        rows = []
+        for action in actions:
+            key = action_key(action)
+            if key in seen:
+                continue
+            seen.add(key)
+            risk_score = action.get("risk_score")
+            rows.append(ComplianceAction(
+                business=self.business,
+                run_id=self.run_id,
+                iteration=iteration,
+                action_key=key,
+                action_type=str(action.get("type") or ""),
+                target=str(action.get("target") or ""),
+                payload=_json_safe(action),
+                dependencies=graph[key],
+                risk_score=int(risk_score) if isinstance(risk_score, (int, float)) else None,
+                eta=str(action.get("eta") or "")
+            ))
+        ComplianceAction.objects.bulk_create(rows)
+        return rows
+
+    def _load_unfinished(self) -> List:
+        from ..models import ComplianceAction
+
+        # RUNNING rows were interrupted mid-flight and are run again
+        return list(ComplianceAction.objects.filter(run_id=self.run_id).exclude(status__in=TERMINAL_STATUSES))
+
+    def _finished_keys(self) -> tuple:
+        from ..models import ComplianceAction
+
+        finished = ComplianceAction.objects.filter(run_id=self.run_id, status__in=TERMINAL_STATUSES)
+        done = {key for key, status in finished.values_list('action_key', 'status') if status == 'COMPLETED'}
+        return done, set(finished.values_list('action_key', flat=True)) - done
+
+    def _save(self, row, **fields):
+        for name, value in fields.items():
+            setattr(row, name, value)
+        row.save(update_fields=list(fields) + ['updated_at'])
+
+    async def execute(self) -> List:
+        """
+        Run every unfinished action of the run, dependencies first, at most
+        ``max_parallel`` at a time. Actions whose dependencies failed are skipped,
+        as are actions caught in a dependency cycle. Returns the rows that were run.
+        """
+        pending = {row.action_key: row for row in await sync_to_async(self._load_unfinished)()}
+        done, failed = await sync_to_async(self._finished_keys)()
+        executed = []
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        running = {}
+
+        async def run(row):
+            async with semaphore:
+                await sync_to_async(self._save)(row, status='RUNNING', started_at=timezone.now())
+                logger.info(f"[{self.business.business_id} Compliance Action] {row.action_type} on {row.target}")
+                try:
+                    result = await self.run_action(row.payload)
+                except Exception as e:
+                    logger.error(f"[{self.business.business_id}] Error executing {row.action_type} on {row.target}: {e}")
+                    await sync_to_async(self._save)(row, status='FAILED', error_message=str(e),
+                                                    completed_at=timezone.now())
+                    return row
+                await sync_to_async(self._save)(row, status='COMPLETED', result=_json_safe(result),
+                                                completed_at=timezone.now())
+                return row
+
+        while pending or running:
+            blocked = [row for row in pending.values() if any(dep in failed for dep in row.dependencies)]
+            for row in blocked:
+                del pending[row.action_key]
+                failed.add(row.action_key)
+                await sync_to_async(self._save)(row, status='SKIPPED', error_message="A dependency failed")
+                executed.append(row)
+
+            ready = sorted((row for row in pending.values()
+                            if not any(dep in pending or dep in running for dep in row.dependencies)),
+                           key=_priority)
+            for row in ready:
+                del pending[row.action_key]
+                running[row.action_key] = asyncio.create_task(run(row))
+
+            if not running:
+                # Nothing can start and nothing is in flight: the rest wait on each other
+                for row in pending.values():
+                    await sync_to_async(self._save)(row, status='SKIPPED', error_message="Dependency cycle")
+                    executed.append(row)
+                break
+
+            finished, _ = await asyncio.wait(running.values(), return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                row = task.result()
+                del running[row.action_key]
+                (done if row.status == 'COMPLETED' else failed).add(row.action_key)
+                executed.append(row)
+        return executed
+
+
+def _feedback(business_id: str, rows: List) -> Dict:
+    return {
+        "business_id": business_id,
+        "executed_actions": [
+            {**row.payload, "status": row.status.lower(), "result": row.result, "error": row.error_message}
+            for row in rows
+        ]
+    }
+
+
+async def run_compliance_plan(business, run_action: Callable[[Dict], Awaitable], plan: Callable[[Dict], Dict],
+                              initial_data: Dict, max_iterations: Optional[int] = None,
+                              max_parallel: Optional[int] = None) -> Dict:
+    """
+    Plan, execute and feed results back to the reasoning model until it returns no
+    new actions or ``max_iterations`` rounds have run. An unfinished run for the
+    business is resumed from its persisted state rather than planned again.
+
+    Args:
+        business: Business the plan is for.
+        run_action: Coroutine function executing a single action dict.
+        plan: Reasoning call (e.g. generate_compliance_reasoning) taking the prompt data.
+        initial_data: Prompt data for the first plan of a new run.
+    """
+    max_iterations = max_iterations or settings.COMPLIANCE_MAX_ITERATIONS
+    executor, iteration = await sync_to_async(ComplianceActionExecutor.resume)(business, run_action, max_parallel)
+    if executor:
+        logger.info(f"[{business.business_id} Compliance] Resuming run {executor.run_id} at iteration {iteration}")
+    else:
+        executor = ComplianceActionExecutor(business, run_action, max_parallel=max_parallel)
+        reasoning_result = await sync_to_async(plan)(initial_data)
+        await sync_to_async(executor.record_plan)(reasoning_result.get("actions", []), iteration)
+
+    counts = {status.lower(): 0 for status in TERMINAL_STATUSES}
+    while True:
+        rows = await executor.execute()
+        for row in rows:
+            counts[row.status.lower()] += 1
+        iteration += 1
+        if iteration >= max_iterations:
+            logger.info(f"[{business.business_id} Compliance] Stopping after {iteration} iterations")
+            break
+        if not rows:
+            break
+        # Feed back the executed actions to the reasoning model to get next instructions
+        reasoning_result = await sync_to_async(plan)(_feedback(business.business_id, rows))
+        new_rows = await sync_to_async(executor.record_plan)(reasoning_result.get("actions", []), iteration)
+        if not new_rows:
+            logger.info(f"[{business.business_id} Feedback] No further actions received from reasoning model.")
+            break
+    return {"run_id": executor.run_id, "iterations": iteration, **counts}
@@ -7,9 +7,10 @@ def generate_embedding(text: str) -> Optional[List[float]]:
     """Generate embeddings using configured model"""
     return get_llm_model().generate_embedding(text)
 
-def generate_response(query: str, context: str, chat_history: List[Dict[str, str]] = None) -> str:
+def generate_response(query: str, context: str, chat_history: List[Dict[str, str]] = None,
+                      system_prompt: Optional[str] = None) -> str:
     """Generate response using configured model"""
-    return get_llm_model().generate_response(query, context, chat_history)
+    return get_llm_model().generate_response(query, context, chat_history, system_prompt=system_prompt)
 
 def update_business_embedding(business) -> bool:
     """Update embedding for a business profile"""
@@ -1,4 +1,5 @@
 import os
+import re
 import magic
 import docx
 import PyPDF2
@@ -75,6 +76,89 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+MAX_CHUNK_SIZE = 2000  # Optimized for LLM context window
+MIN_CHUNK_SIZE = 200   # Ensure meaningful semantic chunks
+OVERLAP_SIZE = 100     # Add overlap between chunks for context continuity
+
+def split_paragraphs(text_content: str) -> List[str]:
+    """Split text on blank lines, joining wrapped lines within a paragraph"""
+    text_content = text_content.replace('\r\n', '\n').replace('\r', '\n')
+
+    paragraphs = []
+    current_para = []
+
+    for line in text_content.split('\n'):
+        line = line.strip()
+        if line:
+            current_para.append(line)
+        elif current_para:
+            paragraphs.append(' '.join(current_para))
+            current_para = []
+
+    if current_para:
+        paragraphs.append(' '.join(current_para))
+
+    return [p for p in paragraphs if p.strip()]
+
+def _split_long_paragraph(para: str, max_size: int) -> List[str]:
+    """Break a paragraph longer than max_size on sentence (then word) boundaries"""
+    if len(para) <= max_size:
+        return [para]
+
+    pieces = []
+    current = ""
+    for sentence in re.split(r'(?<=[.!?])\s+', para):
+        words = sentence.split(' ') if len(sentence) > max_size else [sentence]
+        for part in words:
+            if current and len(current) + 1 + len(part) > max_size:
+                pieces.append(current)
+                current = part
+            else:
+                current = f"{current} {part}" if current else part
+    if current:
+        pieces.append(current)
+    return pieces
+
+def chunk_paragraphs(paragraphs: List[str], max_chunk_size: int = MAX_CHUNK_SIZE,
+                     min_chunk_size: int = MIN_CHUNK_SIZE, overlap_size: int = OVERLAP_SIZE) -> List[str]:
+    """Pack paragraphs into chunks of at most max_chunk_size characters with a trailing overlap"""
+    chunks = []
+    current_chunk = []
+    current_length = 0
+    last_overlap = ""
+
+    pieces = []
+    for para in paragraphs:
+        pieces.extend(_split_long_paragraph(para, max_chunk_size))
+
+    for para in pieces:
+        para_length = len(para)
+
+        # Check if adding this paragraph would exceed max size
+        if current_length + para_length > max_chunk_size:
+            if current_chunk and sum(len(p) for p in current_chunk) >= min_chunk_size:
+                # current_chunk already starts with the previous overlap
+                chunks.append(' '.join(current_chunk))
+
+                # Store last part of current chunk for overlap
+                overlap_text = ' '.join(current_chunk[-2:]) if len(current_chunk) > 1 else current_chunk[-1]
+                last_overlap = overlap_text[-overlap_size:] if len(overlap_text) > overlap_size else overlap_text
+
+            # Start new chunk with overlap
+            current_chunk = [last_overlap, para] if last_overlap else [para]
+            current_length = len(last_overlap) + para_length if last_overlap else para_length
+        else:
+            current_chunk.append(para)
+            current_length += para_length
+
+    # Add final chunk if it meets minimum size
+    if current_chunk:
+        final_chunk = ' '.join(current_chunk)
+        if len(final_chunk) >= min_chunk_size:
+            chunks.append(final_chunk)
+
+    return chunks
+
 def store_file_content(business_id: str, file_obj: Any, filename: str) -> Dict[str, Any]:
     """Store file content and generate embeddings with extensive error handling and chunking"""
     print(f"[INFO] Starting file processing for {filename} (Business ID: {business_id})")
@@ -147,10 +231,10 @@ def store_file_content(business_id: str, file_obj: Any, filename: str) -> Dict[s
             
             # Clean and normalize text content
             if isinstance(text_content, str):
-                text_content = text_content.replace('\r', '\n')
+                text_content = text_content.replace('\r\n', '\n').replace('\r', '\n')
                 text_content = text_content.replace('\t', ' ')
+                # Blank lines are kept: they are the paragraph boundaries used for chunking
                 text_content = '\n'.join(line.strip() for line in text_content.split('\n'))
-                text_content = '\n'.join(filter(None, text_content.split('\n')))  # Remove empty lines
             else:
                 raise ValueError("Processed content is not a string")
             
@@ -160,72 +244,15 @@ def store_file_content(business_id: str, file_obj: Any, filename: str) -> Dict[s
             print(f"Cleaned text content length: {len(text_content)} characters")
                 
             # Enhanced content chunking with optimized sizes for RAG
-            MAX_CHUNK_SIZE = 2000  # Optimized for LLM context window
-            MIN_CHUNK_SIZE = 200   # Ensure meaningful semantic chunks
-            OVERLAP_SIZE = 100     # Add overlap between chunks for context continuity
-            chunks = []
-            
-            # Enhanced text preprocessing
-            text_content = text_content.replace('\r\n', '\n').replace('\r', '\n')
-            
-            # Split on multiple newlines while preserving structure
-            paragraphs = []
-            current_para = []
-            
-            for line in text_content.split('\n'):
-                line = line.strip()
-                if line:
-                    current_para.append(line)
-                elif current_para:
-                    paragraphs.append(' '.join(current_para))
-                    current_para = []
-                    
-            if current_para:
-                paragraphs.append(' '.join(current_para))
-                
-            # Filter out any remaining empty paragraphs
-            paragraphs = [p for p in paragraphs if p.strip()]
-            
+            paragraphs = split_paragraphs(text_content)
+
             print(f"\nStarting content chunking:")
             print(f"Total content length: {len(text_content)} characters")
             print(f"Found {len(paragraphs)} paragraphs")
-            
-            # Improved chunking with overlap and semantic boundaries
-            current_chunk = []
-            current_length = 0
-            last_overlap = ""
-            
-            for para in paragraphs:
-                para_length = len(para)
-                
-                # Check if adding this paragraph would exceed max size
-                if current_length + para_length > MAX_CHUNK_SIZE:
-                    if current_chunk and sum(len(p) for p in current_chunk) >= MIN_CHUNK_SIZE:
-                        # Add overlap from previous chunk if available
-                        if last_overlap:
-                            current_chunk.insert(0, last_overlap)
-                        
-                        chunk_text = ' '.join(current_chunk)
-                        chunks.append(chunk_text)
-                        print(f"Created chunk of {len(chunk_text)} characters")
-                        
-                        # Store last part of current chunk for overlap
-                        overlap_text = ' '.join(current_chunk[-2:]) if len(current_chunk) > 1 else current_chunk[-1]
-                        last_overlap = overlap_text[-OVERLAP_SIZE:] if len(overlap_text) > OVERLAP_SIZE else overlap_text
-                        
-                    # Start new chunk with overlap
-                    current_chunk = [last_overlap, para] if last_overlap else [para]
-                    current_length = len(last_overlap) + para_length if last_overlap else para_length
-                else:
-                    current_chunk.append(para)
-                    current_length += para_length
-            
-            # Add final chunk if it meets minimum size
-            if current_chunk:
-                final_chunk = ' '.join(current_chunk)
-                if len(final_chunk) >= MIN_CHUNK_SIZE:
-                    chunks.append(final_chunk)
-                    print(f"Created final chunk of {len(final_chunk)} characters")
+
+            chunks = chunk_paragraphs(paragraphs)
+            for chunk in chunks:
+                print(f"Created chunk of {len(chunk)} characters")
             
             print(f"Created {len(chunks)} chunks for processing")
             
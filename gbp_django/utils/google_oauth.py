@@ -2,12 +2,14 @@ import os
 import random
 from datetime import datetime, timedelta
 from django.conf import settings
+from django.utils import timezone
 from ..api.media_management import upload_photo as api_upload_photo
 from ..api.post_management import create_post as api_create_post
-from ..api.qa_management import answer_question, post_question
+from ..api.qa_management import answer_question as api_answer_question, post_question
 from ..api.review_management import respond_to_review
 from ..models import Business, Review, QandA
 from ..utils.logging_utils import log_api_request
+from .token_manager import get_access_token
 
 def upload_photo(business):
     """
@@ -19,7 +21,7 @@ def upload_photo(business):
     print(f"   - Verified Status: {business.is_verified}")
     try:
         # Get access token from business user
-        access_token = business.user.google_access_token
+        access_token = get_access_token(business.user_id)
         
         # Example photo data - this should be customized per business
         photo_data = {
@@ -60,7 +62,7 @@ def generate_post(business):
     Generate and create a post on Google Business Profile
     """
     try:
-        access_token = business.user.google_access_token
+        access_token = get_access_token(business.user_id)
         
         # Example post data - should be customized per business
         post_data = {
@@ -103,36 +105,47 @@ def update_qa(business):
     Update Q&A section on Google Business Profile
     """
     try:
-        access_token = business.user.google_access_token
+        access_token = get_access_token(business.user_id)
         
-        # Get existing Q&A
-        existing_qa = QandA.objects.filter(business=business, answered=False)
+        # Only questions synced from Google can be answered there
+        existing_qa = QandA.objects.filter(business=business, answered=False, question_id__isnull=False)
         
-        for qa in existing_qa:
-            # Example answer data
-            answer_data = {
-                "answer": {
-                    "text": generate_answer(qa.question, business.id)
+        answered = []
+        try:
+            for qa in existing_qa:
+                answer_text = generate_answer(qa.question, business.business_id)
+                if not answer_text or answer_text in FAILED_ANSWERS:
+                    # Left unanswered so the next run tries again
+                    print(f"[WARNING] No answer generated for question {qa.question_id}")
+                    continue
+                answer_data = {
+                    "answer": {
+                        "text": answer_text
+                    }
                 }
-            }
-            
-            result = answer_question(
-                access_token=access_token,
-                account_id=business.business_id,
-                location_id=business.business_id,
-                question_id=qa.id,
-                answer_data=answer_data
-            )
-            
-            qa.answered = True
-            qa.save()
-            
-            log_api_request(
-                user_id=business.user.id,
-                business_id=business.id,
-                action_type='qa_update',
-                details=f'Answered question: {qa.question}'
-            )
+                
+                result = api_answer_question(
+                    access_token=access_token,
+                    account_id=business.business_id,
+                    location_id=business.business_id,
+                    question_id=qa.question_id,
+                    answer_data=answer_data
+                )
+                
+                qa.answer = answer_text
+                qa.answered = True
+                qa.updated_at = timezone.now()
+                answered.append(qa)
+                
+                log_api_request(
+                    user_id=business.user.id,
+                    business_id=business.id,
+                    action_type='qa_update',
+                    details=f'Answered question: {qa.question}'
+                )
+        finally:
+            # One UPDATE for everything answered so far, even if a later answer failed
+            QandA.objects.bulk_update(answered, ['answer', 'answered', 'updated_at'])
         
         return "Q&A updates completed"
     except Exception as e:
@@ -150,22 +163,26 @@ def respond_to_reviews(business):
     Respond to new reviews on Google Business Profile
     """
     try:
-        access_token = business.user.google_access_token
+        access_token = get_access_token(business.user_id)
         
-        # Get unresponded reviews
-        unresponded_reviews = Review.objects.filter(
+        # Get unresponded reviews; drafted ones wait on the owner (AutomationManager.monitor_reviews)
+        unresponded_reviews = list(Review.objects.filter(
             business=business,
-            responded=False
+            responded=False,
+            draft_response__isnull=True
+        ))
+        if not unresponded_reviews:
+            return "Review responses completed"
+        
+        # One knowledge base lookup and one LLM call per batch instead of per review
+        response_texts = generate_review_responses(
+            [{'rating': review.rating, 'content': review.content} for review in unresponded_reviews],
+            business.business_id
         )
         
-        for review in unresponded_reviews:
-            # Generate appropriate response based on rating
-            response_text = generate_review_response(
-                review.rating, 
-                review.content,
-                business.id
-            )
-            
+        for review, response_text in zip(unresponded_reviews, response_texts):
+            if not response_text:
+                continue  # no reply could be generated; tried again next time
             response_data = {
                 "comment": response_text
             }
@@ -200,7 +217,7 @@ def respond_to_reviews(business):
         )
         raise
 
-from .rag_utils import answer_question
+from .rag_utils import FAILED_ANSWERS, answer_question, generate_review_responses
 
 def generate_answer(question, business_id):
     """Generate context-aware answers using RAG"""
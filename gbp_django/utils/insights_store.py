@@ -0,0 +1,136 @@
+"""
+Stored Business Profile insights.
+
+Daily metric values are kept per location in InsightMetric (one row per location,
+metric and day). Each ingestion run only asks Google for the days after the newest
+stored one, re-reading the last GBP_INSIGHTS_REFETCH_DAYS because Google revises
+recent figures; a new location is backfilled GBP_INSIGHTS_BACKFILL_DAYS. After
+storing, the per-user daily and weekly sums in InsightRollup are recomputed for
+the affected days only, so agency charts read a handful of precomputed rows
+instead of aggregating every location's history.
+"""
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from ..api.insights import DAILY_METRICS, get_daily_metrics
+from ..models import Business, InsightMetric, InsightRollup
+from .sync_engine import location_path_ids
+
+logger = logging.getLogger(__name__)
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def insights_range(business, today: Optional[date] = None) -> Optional[Tuple[date, date]]:
+    """Days [start, end) to fetch for a location, or None if it is up to date"""
+    today = today or timezone.now().date()
+    earliest = today - timedelta(days=settings.GBP_INSIGHTS_BACKFILL_DAYS)
+    latest = InsightMetric.objects.filter(business=business).aggregate(latest=Max('date'))['latest']
+    start = earliest if latest is None else max(earliest, latest + timedelta(days=1 - settings.GBP_INSIGHTS_REFETCH_DAYS))
+    return (start, today) if start < today else None
+
+
+def store_daily_metrics(business, rows: Iterable[Tuple[str, date, int]]) -> int:
+    """Upsert (metric, date, value) rows of a location; returns the number of rows written"""
+    metrics = [InsightMetric(business=business, metric=metric, date=day, value=value) for metric, day, value in rows]
+    InsightMetric.objects.bulk_create(
+        metrics,
+        batch_size=settings.INSIGHTS_SYNC_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['business', 'metric', 'date'],
+        update_fields=['value']
+    )
+    return len(metrics)
+
+
+@transaction.atomic
+def update_rollups(user_id: int, start: date, end: date) -> int:
+    """
+    Recompute a user's daily and weekly rollups for the days [start, end), widened to
+    whole weeks. Returns the number of rollup rows written.
+    """
+    start, end = week_start(start), week_start(end - timedelta(days=1)) + timedelta(days=7)
+    metrics = InsightMetric.objects.filter(business__user_id=user_id, date__gte=start, date__lt=end)
+    daily = metrics.values('metric', 'date').annotate(total=Sum('value'), locations=Count('business', distinct=True))
+    weekly = (metrics.annotate(week=TruncWeek('date')).values('metric', 'week')
+              .annotate(total=Sum('value'), locations=Count('business', distinct=True)))
+
+    rollups = [InsightRollup(user_id=user_id, metric=row['metric'], period='day', period_start=row['date'],
+                             value=row['total'], location_count=row['locations']) for row in daily]
+    rollups += [InsightRollup(user_id=user_id, metric=row['metric'], period='week', period_start=row['week'],
+                              value=row['total'], location_count=row['locations']) for row in weekly]
+    # Days whose locations were all removed keep no stale sums
+    InsightRollup.objects.filter(user_id=user_id, period_start__gte=start, period_start__lt=end).delete()
+    InsightRollup.objects.bulk_create(rollups, batch_size=settings.INSIGHTS_SYNC_BATCH_SIZE)
+    return len(rollups)
+
+
+def sync_location_insights(business, account_id: Optional[str] = None, location_id: Optional[str] = None,
+                           access_token: Optional[str] = None, today: Optional[date] = None,
+                           rollup: bool = True) -> Dict:
+    """
+    Fetch and store the days of insights a location is missing. With ``rollup``,
+    the owner's rollups are refreshed too; batch callers pass False and refresh once.
+    """
+    from .token_manager import get_access_token
+
+    days = insights_range(business, today)
+    if not days:
+        return {'stored': 0}
+    if not location_id:
+        account_id, location_id = location_path_ids(business)
+    access_token = access_token or get_access_token(business.user_id)
+    stored = store_daily_metrics(business, get_daily_metrics(access_token, account_id, location_id, *days))
+    if rollup and stored:
+        update_rollups(business.user_id, *days)
+    logger.info(f"Stored {stored} insights values for {business.business_id} ({days[0]} to {days[1]})")
+    return {'start': days[0], 'end': days[1], 'stored': stored}
+
+
+def sync_all_insights(businesses: Optional[Iterable] = None, today: Optional[date] = None) -> Dict[str, Dict]:
+    """
+    Ingest insights for every connected location (or the given ones), then refresh
+    each affected user's rollups once over the union of fetched days. A failed
+    location is reported with an ``error`` and doesn't stop the rest.
+    """
+    if businesses is None:
+        businesses = Business.objects.filter(is_connected=True)
+    results = {}
+    touched = defaultdict(list)
+    for business in businesses:
+        try:
+            result = sync_location_insights(business, today=today, rollup=False)
+        except Exception as e:
+            logger.error(f"Insights sync failed for {business.business_id}: {e}")
+            results[business.business_id] = {'error': str(e)}
+            continue
+        results[business.business_id] = result
+        if result['stored']:
+            touched[business.user_id] += [result['start'], result['end']]
+    for user_id, days in touched.items():
+        update_rollups(user_id, min(days), max(days))
+    return results
+
+
+def agency_series(user, metrics: Optional[List[str]] = None, period: str = 'day', start: Optional[date] = None,
+                  end: Optional[date] = None) -> Dict[str, List[Tuple[date, int]]]:
+    """Per metric, (period start, value) points of a user's rollups in [start, end), oldest first"""
+    rollups = InsightRollup.objects.filter(user=user, period=period, metric__in=metrics or DAILY_METRICS)
+    if start:
+        rollups = rollups.filter(period_start__gte=start)
+    if end:
+        rollups = rollups.filter(period_start__lt=end)
+    series = defaultdict(list)
+    for metric, period_start, value in rollups.order_by('period_start').values_list('metric', 'period_start', 'value'):
+        series[metric].append((period_start, value))
+    return dict(series)
@@ -1,6 +1,9 @@
 import json
 import logging
 from typing import Dict
+from django.conf import settings
+from django.core.cache import cache
+from gbp_django.utils.cache import bump_generation, get_generation, stable_hash
 from gbp_django.utils.model_interface import get_llm_model
 
 # Updated Compliance Reasoning Policy for the Reasoning Model:
@@ -30,6 +33,9 @@ from gbp_django.utils.model_interface import get_llm_model
 #   "questions": [ "Any clarifying questions the agent has, if applicable." ]
 # }
 
+# Bump when the policy prompt or the output schema changes; cached plans are keyed on it
+COMPLIANCE_POLICY_VERSION = "3.0"
+
 COMPLIANCE_REASONING_PROMPT = """**Compliance Orchestration Protocol v3.0**
 
 Your objective is to guide the browser-use agent through the complete compliance process for a Google Business Profile. Follow these priorities:
@@ -85,7 +91,7 @@ def generate_reasoning_response(pre_prompt: str, prompt: str) -> Dict:
             response = llm.structured_reasoning(pre_prompt, full_prompt)
         else:
             from groq import Groq
-            client = Groq()
+            client = Groq(api_key=settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL)
             completion = client.chat.completions.create(
                 model="deepseek-r1-distill-llama-70b",
                 messages=[{
@@ -123,15 +129,55 @@ def generate_reasoning_response(pre_prompt: str, prompt: str) -> Dict:
     return response
 
 
-def generate_compliance_reasoning(data: Dict) -> Dict:
+def compliance_cache_key(data: Dict) -> str:
+    """
+    Cache key for a compliance plan: policy version and prompt, the canonicalised input,
+    and the business's cache generation (bumped whenever the business changes).
+    """
+    business_id = data.get("business_id") or "_global"
+    generation = get_generation("compliance", business_id)
+    digest = stable_hash(COMPLIANCE_POLICY_VERSION, get_compliance_policy(), data)
+    return f"compliance:reasoning:{business_id}:{generation}:{digest}"
+
+
+def invalidate_compliance_reasoning(business_id: str) -> None:
+    """Drop every cached compliance plan for the business."""
+    bump_generation("compliance", business_id)
+
+
+def _is_cacheable(result: Dict) -> bool:
+    # Failed calls must be retried next time, not replayed from the cache
+    return (isinstance(result, dict) and "error" not in result
+            and not str(result.get("reasoning", "")).startswith("Error generating reasoning response"))
+
+
+def generate_compliance_reasoning(data: Dict, use_cache: bool = True) -> Dict:
     """
     Generate reasoning output specifically for compliance checks.
 
+    Identical inputs (regardless of key order) reuse the cached plan for
+    COMPLIANCE_REASONING_CACHE_TTL seconds, until the policy version changes or the
+    business is saved.
+
     Args:
         data (Dict): Compliance data to be analyzed.
+        use_cache (bool): Set to False to force a fresh run of the reasoning model.
 
     Returns:
         Dict: Structured reasoning analysis with step-by-step instructions and any clarifying questions.
     """
     prompt = json.dumps(data, indent=2)
-    return generate_reasoning_response(get_compliance_policy(), prompt)
+    ttl = settings.COMPLIANCE_REASONING_CACHE_TTL
+    if not use_cache or not ttl:
+        return generate_reasoning_response(get_compliance_policy(), prompt)
+
+    key = compliance_cache_key(data)
+    cached = cache.get(key)
+    if cached is not None:
+        logging.info(f"Compliance reasoning cache hit for business {data.get('business_id')}")
+        return cached
+
+    response = generate_reasoning_response(get_compliance_policy(), prompt)
+    if _is_cacheable(response):
+        cache.set(key, response, ttl)
+    return response
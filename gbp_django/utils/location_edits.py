@@ -0,0 +1,254 @@
+"""
+Write-behind queue for edits of a location's Business Profile fields.
+
+Edits made in the app (update_business, compliance fixes, automations) are saved
+locally at once and queued as a PendingLocationEdit instead of calling Google in
+the request. Edits arriving while one is pending merge into it, the latest value
+of a field winning, so a burst of edits costs one PATCH. The worker pushes the
+merged edit after GBP_EDIT_COALESCE_SECONDS, sending only fields that differ
+from what Google last had.
+
+Before writing, the location is re-read. If its ``updateTime`` moved past the
+one the edit was based on and Google's value of an edited field changed
+meanwhile (an owner edit in the Google UI, a Google suggestion), the edit is
+marked ``conflict`` rather than overwriting it; when Google gives no
+``updateTime`` the edited fields are compared with the sync baseline instead.
+Failed pushes are retried with exponential backoff up to GBP_EDIT_MAX_ATTEMPTS.
+
+A push holds its edit in ``pushing``; one still there GBP_EDIT_PUSH_TIMEOUT seconds
+later (the worker died) is taken over by the next push or sweep, with the edits
+queued meanwhile merged in.
+"""
+import logging
+from datetime import timedelta
+from typing import Dict, Optional
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..api.business_management import (
+    LOCATION_EDIT_FIELDS, _business_row, field_hash, location_field_changes, location_patch,
+    update_business_details
+)
+from ..api.client import GBPClient
+from ..models import Business, PendingLocationEdit
+from .sync_engine import location_path_ids
+
+logger = logging.getLogger(__name__)
+
+EDITABLE_FIELDS = {field for field, _, _ in LOCATION_EDIT_FIELDS}
+OPEN_STATUSES = ('pending', 'pushing')
+
+# locations.get answers 400 without a readMask; this covers the editable fields
+# and the address lines location_patch keeps
+LOCATION_READ_MASK = ','.join(dict.fromkeys(
+    ['name', 'storefrontAddress'] + [mask.split('.')[0] for _, _, mask in LOCATION_EDIT_FIELDS]))
+
+
+def queue_location_edit(business: Business, changes: Dict[str, object], source: str = 'user') -> PendingLocationEdit:
+    """
+    Save ``changes`` (values keyed by Business field) locally and queue them for
+    Google, merging into the location's pending edit if there is one.
+    """
+    unknown = set(changes) - EDITABLE_FIELDS
+    if unknown:
+        raise ValueError(f"Fields not editable through the API: {', '.join(sorted(unknown))}")
+
+    with transaction.atomic():
+        for field, value in changes.items():
+            setattr(business, field, value)
+        business.save()
+
+        edit = (PendingLocationEdit.objects.select_for_update()
+                .filter(business=business, status='pending').order_by('created_at').first())
+        if edit:
+            edit.changes = {**edit.changes, **changes}
+            if source not in edit.sources:
+                edit.sources = edit.sources + [source]
+            edit.save(update_fields=['changes', 'sources', 'updated_at'])
+            return edit
+
+        edit = PendingLocationEdit.objects.create(
+            business=business,
+            changes=dict(changes),
+            sources=[source],
+            base_update_time=business.remote_update_time,
+            push_after=timezone.now() + timedelta(seconds=settings.GBP_EDIT_COALESCE_SECONDS)
+        )
+        transaction.on_commit(lambda: schedule_push(edit.pk, settings.GBP_EDIT_COALESCE_SECONDS))
+    return edit
+
+
+def queued_fields(business: Business) -> set:
+    """Fields with a value in one of the location's edits not yet written to Google"""
+    edits = PendingLocationEdit.objects.filter(business=business, status__in=OPEN_STATUSES)
+    return {field for changes in edits.values_list('changes', flat=True) for field in changes}
+
+
+def schedule_push(edit_pk: int, countdown: float) -> None:
+    from ..tasks.tasks import push_location_edit_task
+    push_location_edit_task.apply_async(args=[edit_pk], countdown=countdown)
+
+
+def _stale_push(now=None) -> Q:
+    """Edits left in 'pushing' longer than a push can take"""
+    now = now or timezone.now()
+    return Q(status='pushing', updated_at__lte=now - timedelta(seconds=settings.GBP_EDIT_PUSH_TIMEOUT))
+
+
+def _merge_newer(edit: PendingLocationEdit) -> None:
+    """Fold the location's edits queued after ``edit`` into it; the newer values win"""
+    newer = list(PendingLocationEdit.objects.select_for_update()
+                 .filter(business=edit.business, status='pending').exclude(pk=edit.pk))
+    for other in newer:
+        edit.changes = {**edit.changes, **other.changes}
+        edit.sources = edit.sources + [s for s in other.sources if s not in edit.sources]
+    PendingLocationEdit.objects.filter(pk__in=[other.pk for other in newer]).delete()
+
+
+def _claim(edit_pk: int) -> Optional[PendingLocationEdit]:
+    """
+    Move a due pending edit to 'pushing' so edits queued from now on start a new
+    one, or take over a push that never finished.
+    """
+    with transaction.atomic():
+        edit = (PendingLocationEdit.objects.select_for_update().select_related('business')
+                .filter(Q(status='pending') | _stale_push(), pk=edit_pk).first())
+        if not edit:
+            return None
+        if edit.status == 'pushing':
+            logger.warning(f"Push of edit {edit.pk} started at {edit.updated_at} never finished; pushing it again")
+            _merge_newer(edit)
+        elif edit.push_after > timezone.now():
+            # Retried early (e.g. by the sweep); the scheduled push will handle it
+            return None
+        edit.status = 'pushing'
+        edit.attempts += 1
+        edit.save(update_fields=['status', 'changes', 'sources', 'attempts', 'updated_at'])
+        return edit
+
+
+def _conflicts(edit: PendingLocationEdit, remote: Dict) -> Dict[str, object]:
+    """
+    Edited fields whose value at Google changed since the edit's base state. The
+    field values are compared unless ``updateTime`` shows nothing changed.
+    """
+    remote_time = parse_datetime(remote['updateTime']) if remote.get('updateTime') else None
+    if remote_time and edit.base_update_time and remote_time <= edit.base_update_time:
+        return {}
+    business = edit.business
+    current = _business_row(remote, business.user)
+    synced = business.remote_field_hashes or {}
+    return {
+        field: getattr(current, field)
+        for field, value in edit.changes.items()
+        # A value Google already has (e.g. from a push whose response was lost) is no conflict
+        if field in synced and current.remote_field_hashes[field] not in (synced[field], field_hash(value))
+    }
+
+
+def _record_remote_state(business: Business, hashes: Dict[str, str], update_time) -> None:
+    # A queryset update: the local fields didn't change, so save signals have nothing to do
+    business.remote_field_hashes, business.remote_update_time = hashes, update_time
+    Business.objects.filter(pk=business.pk).update(remote_field_hashes=hashes, remote_update_time=update_time)
+
+
+def push_location_edit(edit_pk: int, access_token: Optional[str] = None) -> str:
+    """
+    Write one pending edit to Google. Returns the edit's resulting status, or
+    'skipped' if it isn't due or was already handled.
+    """
+    from .token_manager import TokenUnavailable, get_access_token
+
+    edit = _claim(edit_pk)
+    if not edit:
+        return 'skipped'
+    business = edit.business
+    try:
+        _, location_id = location_path_ids(business)
+        name = f"locations/{location_id}"
+        access_token = access_token or get_access_token(business.user_id)
+
+        response = GBPClient(access_token).get('business_information', name,
+                                                params={'readMask': LOCATION_READ_MASK})
+        response.raise_for_status()
+        remote = response.json()
+        conflicts = _conflicts(edit, remote)
+        if conflicts:
+            # Google's newer values become the sync baseline, so re-submitting the
+            # edit is a deliberate overwrite
+            current = _business_row(remote, business.user)
+            _record_remote_state(business, current.remote_field_hashes, current.remote_update_time)
+            edit.status, edit.conflict = 'conflict', conflicts
+            edit.save(update_fields=['status', 'conflict', 'updated_at'])
+            logger.warning(f"Edit {edit.pk} of {business.business_id} conflicts with changes at Google: "
+                           f"{', '.join(conflicts)}")
+            return edit.status
+
+        changes = location_field_changes(business, edit.changes)
+        if changes:
+            update_data, update_mask = location_patch(changes, remote)
+            result = update_business_details(access_token, name, update_data, update_mask=update_mask)
+            update_time = result.get('updateTime') if isinstance(result, dict) else None
+            _record_remote_state(
+                business,
+                {**business.remote_field_hashes, **{field: field_hash(value) for field, value, _ in changes}},
+                parse_datetime(update_time) if update_time else timezone.now()
+            )
+    except (requests.exceptions.RequestException, TokenUnavailable, ValueError) as e:
+        return _retry_later(edit, e)
+
+    edit.status, edit.applied_at, edit.last_error = 'applied', timezone.now(), None
+    edit.save(update_fields=['status', 'applied_at', 'last_error', 'updated_at'])
+    logger.info(f"Pushed edit {edit.pk} of {business.business_id}: {[mask for _, _, mask in changes] or 'no changes'}")
+    return edit.status
+
+
+def _retry_later(edit: PendingLocationEdit, error: Exception) -> str:
+    edit.last_error = str(error)
+    if edit.attempts >= settings.GBP_EDIT_MAX_ATTEMPTS or isinstance(error, ValueError):
+        edit.status = 'failed'
+        edit.save(update_fields=['status', 'last_error', 'updated_at'])
+        logger.error(f"Giving up on edit {edit.pk} of {edit.business.business_id}: {error}")
+        return edit.status
+
+    delay = settings.GBP_EDIT_RETRY_BASE * 2 ** (edit.attempts - 1)
+    with transaction.atomic():
+        # Edits queued during the failed push merge back in
+        _merge_newer(edit)
+        edit.status = 'pending'
+        edit.push_after = timezone.now() + timedelta(seconds=delay)
+        edit.save(update_fields=['status', 'changes', 'sources', 'push_after', 'last_error', 'updated_at'])
+    transaction.on_commit(lambda: schedule_push(edit.pk, delay))
+    logger.warning(f"Edit {edit.pk} of {edit.business.business_id} failed ({error}); retrying in {delay}s")
+    return edit.status
+
+
+def push_due_location_edits() -> int:
+    """
+    Push every pending edit that is due, e.g. ones whose scheduled task was lost,
+    and every push that never finished
+    """
+    due = PendingLocationEdit.objects.filter(Q(status='pending', push_after__lte=timezone.now()) | _stale_push())
+    return sum(push_location_edit(pk) != 'skipped' for pk in due.values_list('pk', flat=True))
+
+
+def pending_edit_state(business: Business) -> Dict:
+    """What the UI shows about a location's unpushed or problematic edits"""
+    edit = PendingLocationEdit.objects.filter(business=business).order_by('-created_at').first()
+    if not edit or edit.status == 'applied':
+        return {'pending': False}
+    return {
+        'pending': edit.status in ('pending', 'pushing'),
+        'status': edit.status,
+        'fields': sorted(edit.changes),
+        'queued_at': edit.created_at.isoformat(),
+        'push_after': edit.push_after.isoformat(),
+        'attempts': edit.attempts,
+        'error': edit.last_error,
+        'conflict': edit.conflict,
+    }
@@ -11,10 +11,35 @@ import traceback
 
 logger = logging.getLogger(__name__)
 
+# Start of the text generate_response returns when no model could answer
+MODEL_ERROR_REPLY = "I'm having trouble generating a response right now."
+
+
+def stable_history_window(chat_history: Optional[List[Dict[str, str]]], window: Optional[int] = None) -> List[
+    Dict[str, str]]:
+    """
+    Trim chat history in whole blocks of ``window`` messages.
+
+    A sliding "last N messages" window changes the start of the prompt on every turn,
+    which defeats the model server's prompt prefix cache. Dropping history a block at a
+    time keeps the prefix identical until the next block boundary.
+    """
+    if not chat_history:
+        return []
+    window = window or settings.LLM_HISTORY_WINDOW
+    start = max(0, (len(chat_history) // window - 1) * window)
+    return [{'role': m['role'], 'content': m['content']} for m in chat_history[start:]]
+
 
 class LLMInterface(ABC):
     @abstractmethod
-    def generate_response(self, query: str, context: str, chat_history: Optional[List[Dict[str, str]]] = None) -> str:
+    def generate_response(self, query: str, context: str, chat_history: Optional[List[Dict[str, str]]] = None,
+                          system_prompt: Optional[str] = None) -> str:
+        """
+        Answer ``query``. With ``system_prompt`` the (stable) system prompt is sent first and
+        the per-turn ``context`` travels with the user message; without it ``context`` is the
+        system prompt.
+        """
         pass
 
     @abstractmethod
@@ -26,8 +51,8 @@ class GroqModel(LLMInterface):
     def structured_reasoning(self, pre_prompt: str, prompt: str, max_tokens: int = 2000) -> dict:
         """Execute structured reasoning with pre-prompt and prompt, returning JSON-formatted actions."""
         print(f"\n[COMPLIANCE ENGINE] Initializing reasoning pipeline")
-        print(
-            f"[COMPLIANCE CONTEXT] Business ID: {prompt.split('business_id: ')[1].split('\n')[0] if 'business_id' in prompt else 'Unknown'}")
+        context_id = prompt.split('business_id: ')[1].split('\n')[0] if 'business_id: ' in prompt else 'Unknown'
+        print(f"[COMPLIANCE CONTEXT] Business ID: {context_id}")
         print(f"[MODEL SETUP] Using deepseek-r1-distill-llama-70b-specdec")
         system_msg = {
             "role": "system",
@@ -72,7 +97,7 @@ class GroqModel(LLMInterface):
             return {"error": "API request failed", "details": str(e)}
 
     def __init__(self):
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
+        self.client = Groq(api_key=settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL)
         self.model_name = "llama-3.3-70b-versatile"
         self.embedding_model = "text-embedding-3-small"
 
@@ -94,18 +119,14 @@ class GroqModel(LLMInterface):
             logger.error(f"Error generating embedding: {str(e)}")
             return None
 
-    def _prepare_messages(self, query: str, context: str, chat_history: Optional[List[Dict[str, str]]] = None) -> List[
-        Dict[str, str]]:
-        messages = [{'role': 'system', 'content': context}]
-        if chat_history:
-            formatted_history = [{'role': m['role'], 'content': m['content']} for m in chat_history[-5:]]
-            messages.extend(formatted_history)
-        messages.append({'role': 'user', 'content': query})
-        return messages
+    def _prepare_messages(self, query: str, context: str, chat_history: Optional[List[Dict[str, str]]] = None,
+                          system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+        return _build_messages(query, context, chat_history, system_prompt, system_prompt or context)
 
-    def generate_response(self, query: str, context: str, chat_history: Optional[List[Dict[str, str]]] = None) -> str:
+    def generate_response(self, query: str, context: str, chat_history: Optional[List[Dict[str, str]]] = None,
+                          system_prompt: Optional[str] = None) -> str:
         try:
-            messages = self._prepare_messages(query, context, chat_history)
+            messages = self._prepare_messages(query, context, chat_history, system_prompt)
             for msg in messages:
                 print(f"Role: {msg['role']}, Content: {msg['content'][:500]}...")
             start_time = time.time()
@@ -125,7 +146,7 @@ class GroqModel(LLMInterface):
             if settings.OLLAMA_ENABLED:
                 try:
                     ollama_model = OllamaModel()
-                    fallback_resp = ollama_model.generate_response(query, context, chat_history)
+                    fallback_resp = ollama_model.generate_response(query, context, chat_history, system_prompt)
                     if fallback_resp:
                         return fallback_resp
                 except Exception as ollama_ex:
@@ -133,68 +154,81 @@ class GroqModel(LLMInterface):
             if settings.OPENAI_API_KEY:
                 try:
                     openai_model = OpenAIModel()
-                    fallback_resp = openai_model.generate_response(query, context, chat_history)
+                    fallback_resp = openai_model.generate_response(query, context, chat_history, system_prompt)
                     if fallback_resp:
                         return fallback_resp
                 except Exception as openai_ex:
                     logger.error(f"OpenAI fallback failed: {str(openai_ex)}")
-            return f"I'm having trouble generating a response right now. Please try again later. (Error: {str(e)})"
+            return f"{MODEL_ERROR_REPLY} Please try again later. (Error: {str(e)})"
 
 
 class OllamaModel(LLMInterface):
     def __init__(self):
-        self.base_url = "http://localhost:11434/api"
+        self.base_url = settings.OLLAMA_BASE_URL.rstrip('/')
         self.embedding_model = "nomic-embed-text"
         self.llm_model = "llama3.2:1b"
+        self.keep_alive = settings.OLLAMA_KEEP_ALIVE
+        # Changing num_ctx between requests forces Ollama to reload the model, so always send the same value
+        self.chat_options = {"num_ctx": settings.OLLAMA_NUM_CTX}
 
-    def _prepare_messages(self, query: str, context: str, chat_history: Optional[List[Dict[str, str]]] = None) -> List[
-        Dict[str, str]]:
-        memory_summary = []
-        formatted_history = []
-        if chat_history:
-            current_topic = []
-            for msg in chat_history[-10:]:
-                current_topic.append(msg['content'])
-                if len(current_topic) >= 3:
-                    summary = f"• Previous discussion about: {' '.join(current_topic)[:100]}..."
-                    memory_summary.append(summary)
-                    current_topic = []
-            if current_topic:
-                summary = f"• Recent exchange about: {' '.join(current_topic)[:100]}..."
-                memory_summary.append(summary)
-            formatted_history = [{'role': m['role'], 'content': m['content']} for m in chat_history[-5:]]
-        system_prompt = (
+    def _prepare_messages(self, query: str, context: str, chat_history: Optional[List[Dict[str, str]]] = None,
+                          system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+        if system_prompt is None:
+            system_prompt = (
                 "You are an AI assistant for a business automation platform. "
-                "Use the provided context and memory summaries to generate accurate, professional responses.\n\n"
+                "Use the provided context and conversation history to generate accurate, professional responses.\n\n"
                 f"Business Context: {context}\n\n"
-                f"Memory Summaries:\n" + "\n".join(memory_summary) + "\n\n"
-                                                                     "Instructions: Provide a helpful response based on the context and history."
-        )
-        messages = [{'role': 'system', 'content': system_prompt}]
-        if formatted_history:
-            messages.extend(formatted_history)
-        messages.append({'role': 'user', 'content': query})
-        return messages
+                "Instructions: Provide a helpful response based on the context and history."
+            )
+        return _build_messages(query, context, chat_history, system_prompt, system_prompt)
 
-    def generate_response(self, query: str, context: str, chat_history: Optional[List[Dict[str, str]]] = None) -> str:
+    def warm_up(self) -> Dict[str, Optional[float]]:
+        """Load the chat and embedding models ahead of the first real request; returns load time per model."""
+        timings = {}
+        for model, endpoint, payload in (
+                (self.llm_model, "chat", {"messages": [], "options": self.chat_options}),
+                (self.embedding_model, "embeddings", {"prompt": "warm-up", "options": {"temperature": 0, "num_ctx": 8192}}),
+        ):
+            start_time = time.time()
+            try:
+                response = requests.post(
+                    f"{self.base_url}/{endpoint}",
+                    json={"model": model, "keep_alive": self.keep_alive, **payload},
+                    timeout=settings.OLLAMA_WARM_UP_TIMEOUT
+                )
+                response.raise_for_status()
+                timings[model] = time.time() - start_time
+                logger.info(f"Ollama model {model} warmed up in {timings[model]:.2f}s (keep_alive={self.keep_alive})")
+            except Exception as e:
+                timings[model] = None
+                logger.warning(f"Ollama warm-up failed for {model}: {str(e)}")
+        return timings
+
+    def generate_response(self, query: str, context: str, chat_history: Optional[List[Dict[str, str]]] = None,
+                          system_prompt: Optional[str] = None) -> str:
         try:
-            messages = self._prepare_messages(query, context, chat_history)
+            messages = self._prepare_messages(query, context, chat_history, system_prompt)
             start_time = time.time()
             response = requests.post(
                 f"{self.base_url}/chat",
-                json={"model": self.llm_model, "messages": messages, "stream": False},
+                json={"model": self.llm_model, "messages": messages, "stream": False,
+                      "keep_alive": self.keep_alive, "options": self.chat_options},
                 timeout=30
             )
             if response.status_code == 404:
                 response = requests.post(
                     f"{self.base_url}/generate",
-                    json={"model": self.llm_model, "prompt": query, "context": context, "stream": False},
+                    json={"model": self.llm_model, "system": messages[0]["content"],
+                          "prompt": messages[-1]["content"], "stream": False,
+                          "keep_alive": self.keep_alive, "options": self.chat_options},
                     timeout=30
                 )
             response.raise_for_status()
             latency = time.time() - start_time
-            logger.info(f"Ollama response generated in {latency:.2f}s using {self.llm_model}")
             response_data = response.json()
+            logger.info(f"Ollama response generated in {latency:.2f}s using {self.llm_model} "
+                        f"(load {response_data.get('load_duration', 0) / 1e9:.2f}s, "
+                        f"{response_data.get('prompt_eval_count', 'n/a')} prompt tokens evaluated)")
             if "message" in response_data:
                 return response_data["message"]["content"].strip()
             elif "response" in response_data:
@@ -203,7 +237,7 @@ class OllamaModel(LLMInterface):
                 return str(response_data).strip()
         except Exception as e:
             logger.error(f"Error generating response with Ollama: {str(e)}")
-            return f"I'm having trouble generating a response right now. (Error: {str(e)})"
+            return f"{MODEL_ERROR_REPLY} (Error: {str(e)})"
 
     def generate_embedding(self, text: str) -> Optional[List[float]]:
         try:
@@ -213,7 +247,8 @@ class OllamaModel(LLMInterface):
             start_time = time.time()
             response = requests.post(
                 f"{self.base_url}/embeddings",
-                json={"model": self.embedding_model, "prompt": text, "options": {"temperature": 0, "num_ctx": 8192}},
+                json={"model": self.embedding_model, "prompt": text, "keep_alive": self.keep_alive,
+                      "options": {"temperature": 0, "num_ctx": 8192}},
                 timeout=30
             )
             response.raise_for_status()
@@ -241,14 +276,13 @@ class OpenAIModel(LLMInterface):
         self.embedding_model = "text-embedding-3-small"
         self.llm_model = "gpt-3.5-turbo"
         openai.api_key = settings.OPENAI_API_KEY
+        if settings.OPENAI_BASE_URL:
+            openai.api_base = settings.OPENAI_BASE_URL
 
-    def generate_response(self, query: str, context: str, chat_history: Optional[List[Dict[str, str]]] = None) -> str:
+    def generate_response(self, query: str, context: str, chat_history: Optional[List[Dict[str, str]]] = None,
+                          system_prompt: Optional[str] = None) -> str:
         try:
-            messages = [{"role": "system", "content": context}]
-            if chat_history:
-                for msg in chat_history[-5:]:
-                    messages.append({"role": msg["role"], "content": msg["content"]})
-            messages.append({"role": "user", "content": query})
+            messages = _build_messages(query, context, chat_history, system_prompt, system_prompt or context)
             start_time = time.time()
             response = openai.ChatCompletion.create(
                 model=self.llm_model,
@@ -281,6 +315,18 @@ class OpenAIModel(LLMInterface):
             return None
 
 
+def _build_messages(query: str, context: str, chat_history: Optional[List[Dict[str, str]]],
+                    system_prompt: Optional[str], system_content: str) -> List[Dict[str, str]]:
+    """Stable prefix first (system prompt, block-windowed history), per-turn content last."""
+    messages = [{'role': 'system', 'content': system_content}]
+    messages.extend(stable_history_window(chat_history))
+    if system_prompt is not None and context:
+        messages.append({'role': 'user', 'content': f"{context}\n\nQuestion: {query}"})
+    else:
+        messages.append({'role': 'user', 'content': query})
+    return messages
+
+
 def get_llm_model() -> LLMInterface:
     try:
         return OllamaModel()
@@ -1,7 +1,5 @@
 from datetime import datetime, timedelta
 from django.utils import timezone
-from django.conf import settings
-import requests
 import json
 import logging
 
@@ -40,45 +38,20 @@ def refresh_oauth_token(user):
     """
     Refresh OAuth token if expired or about to expire
     Returns True if token was refreshed, False if not needed
-    
-    Includes enhanced validation, debugging, and business data fetching
+
+    Goes through the token manager, so concurrent callers for the same user share
+    one refresh instead of each hitting Google.
     """
-    try:
-        # Enhanced token validation
-        if is_token_expired(user.google_token_expiry):
-            logger.debug(f"Token expired or near expiry for user {user.email}")
-            logger.debug(f"Current token expiry: {user.google_token_expiry}")
-            
-            logger.info(f"Refreshing OAuth token for user {user.email}")
-            
-            response = requests.post(
-                'https://oauth2.googleapis.com/token',
-                data={
-                    'client_id': settings.GOOGLE_OAUTH2_CLIENT_ID,
-                    'client_secret': settings.GOOGLE_OAUTH2_CLIENT_SECRET,
-                    'refresh_token': user.google_refresh_token,
-                    'grant_type': 'refresh_token'
-                }
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"Token refresh failed: {response.text}")
-                return False
-                
-            data = response.json()
-            user.google_access_token = data['access_token']
-            user.google_token_expiry = timezone.now() + \
-                                     timedelta(seconds=data['expires_in'])
-            user.save(update_fields=['google_access_token', 
-                                   'google_token_expiry'])
-            
-            logger.info(f"Successfully refreshed token for {user.email}")
-            logger.debug(f"New token expiry: {user.google_token_expiry}")
-            logger.debug(f"Token length: {len(user.google_access_token)}")
-            return True
-            
+    from .token_manager import TokenUnavailable, get_token_manager
+
+    if not is_token_expired(user.google_token_expiry):
         return False
-        
-    except Exception as e:
+    try:
+        logger.info(f"Refreshing OAuth token for user {user.email}")
+        get_token_manager().refresh(user.id)
+    except TokenUnavailable as e:
         logger.error(f"Error refreshing token: {str(e)}")
         return False
+    user.refresh_from_db(fields=['google_access_token', 'google_refresh_token', 'google_token_expiry'])
+    logger.debug(f"New token expiry: {user.google_token_expiry}")
+    return True
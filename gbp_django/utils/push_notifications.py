@@ -0,0 +1,123 @@
+"""
+Push-based ingestion of Business Profile notifications.
+
+Google publishes account notifications (new review, new question, location
+updated by Google, ...) to a Pub/Sub topic configured with the Notifications API.
+A push subscription delivers them to ``/api/google/notifications/``, which turns
+each one into a targeted incremental sync (utils.sync_engine) of the affected
+location instead of waiting for the periodic sweep, which remains as a slow
+safety net. Bursts of notifications for one location collapse into a single sync.
+
+``python -m gbp_django.benchmarks.pubsub_publisher`` stands in for Pub/Sub locally.
+"""
+import base64
+import json
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from ..api.client import invalidate_resource
+from ..models import Business
+from .sync_engine import LOCATION_NAME_RE, location_path_ids
+
+logger = logging.getLogger(__name__)
+
+# Notification type -> resources to re-sync for the location
+NOTIFICATION_RESOURCES: Dict[str, Tuple[str, ...]] = {
+    'NEW_REVIEW': ('reviews',),
+    'UPDATED_REVIEW': ('reviews',),
+    'NEW_QUESTION': ('questions',),
+    'UPDATED_QUESTION': ('questions',),
+    'NEW_ANSWER': ('questions',),
+    'UPDATED_ANSWER': ('questions',),
+    'NEW_CUSTOMER_MEDIA': ('media',),
+}
+
+# Notification types meaning the location itself changed at Google
+LOCATION_UPDATE_TYPES = {'GOOGLE_UPDATE', 'UPDATED_LOCATION_STATE', 'VOICE_OF_MERCHANT_UPDATED', 'DUPLICATE_LOCATION'}
+
+
+class InvalidNotification(ValueError):
+    """The push request body is not a Pub/Sub message carrying a notification."""
+
+
+def decode_push_envelope(body: bytes) -> Dict:
+    """The notification carried by a Pub/Sub push request body"""
+    try:
+        envelope = json.loads(body)
+        data = base64.b64decode(envelope['message']['data'])
+        notification = json.loads(data)
+    except (KeyError, TypeError, ValueError) as e:
+        raise InvalidNotification(f"Malformed push message: {e}") from e
+    if not isinstance(notification, dict):
+        raise InvalidNotification("Notification payload is not an object")
+    return notification
+
+
+def notification_target(notification: Dict) -> Tuple[str, Optional[str], Optional[str]]:
+    """(type, account id, location id) of a notification; the ids are None if absent"""
+    kind = notification.get('notificationType') or notification.get('type') or ''
+    names = [notification.get(key) for key in ('location', 'locationName', 'review', 'question', 'answer', 'media')]
+    for name in filter(None, names):
+        match = LOCATION_NAME_RE.search(name)
+        if match:
+            return kind, match.group('account'), match.group('location')
+    return kind, None, None
+
+
+def find_business(account_id: Optional[str], location_id: str) -> Optional[Business]:
+    names = [f"locations/{location_id}"]
+    if account_id:
+        names.append(f"accounts/{account_id}/locations/{location_id}")
+    return Business.objects.filter(Q(business_id__in=names) | Q(google_location_id__in=names)).first()
+
+
+def claim_sync(business_pk: int, resources: Iterable[str]) -> bool:
+    """
+    Whether a sync of these resources should be queued: False while one queued by
+    an earlier notification in the last GBP_PUSH_COALESCE_SECONDS hasn't started.
+    """
+    key = f"gbp:push:pending:{business_pk}:{','.join(sorted(resources))}"
+    return cache.add(key, 1, settings.GBP_PUSH_COALESCE_SECONDS)
+
+
+def release_sync(business_pk: int, resources: Iterable[str]) -> None:
+    """Called by the sync task as it starts, so later notifications queue another run"""
+    cache.delete(f"gbp:push:pending:{business_pk}:{','.join(sorted(resources))}")
+
+
+def handle_notification(notification: Dict) -> Dict:
+    """
+    Act on one notification: invalidate cached location data and/or queue a targeted
+    sync. Returns what was done; unknown types and locations are ignored (and
+    acknowledged) rather than redelivered forever.
+    """
+    kind, account_id, location_id = notification_target(notification)
+    resources = NOTIFICATION_RESOURCES.get(kind, ())
+    if not location_id or (not resources and kind not in LOCATION_UPDATE_TYPES):
+        logger.info(f"Ignoring notification {kind or 'without type'} for {location_id or 'no location'}")
+        return {'status': 'ignored', 'type': kind}
+
+    business = find_business(account_id, location_id)
+    if not business:
+        logger.warning(f"Notification {kind} for unknown location {location_id}")
+        return {'status': 'unknown_location', 'type': kind, 'location': location_id}
+
+    if kind in LOCATION_UPDATE_TYPES:
+        from .llm_reasoning import invalidate_compliance_reasoning
+        invalidate_resource(f"locations/{location_id}")
+        invalidate_compliance_reasoning(business.business_id)
+        return {'status': 'invalidated', 'type': kind, 'business': business.business_id}
+
+    queued = claim_sync(business.pk, resources)
+    if queued:
+        from ..tasks.tasks import sync_location_task
+        sync_location_task.apply_async(
+            args=[business.pk, account_id or location_path_ids(business)[0], location_id, list(resources)],
+            countdown=settings.GBP_PUSH_COALESCE_SECONDS
+        )
+    return {'status': 'queued' if queued else 'coalesced', 'type': kind,
+            'business': business.business_id, 'resources': list(resources)}
@@ -1,10 +1,54 @@
+import json
+import time
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
 import numpy as np
 import tiktoken
+from django.conf import settings
 from django.db.models import Q
 from pgvector.django import CosineDistance, L2Distance
 from ..models import Business, FAQ, KnowledgeChunk
 from .embeddings import generate_embedding, generate_response
+from .model_interface import MODEL_ERROR_REPLY
+
+
+@lru_cache(maxsize=1)
+def _get_token_encoding():
+    """Load the tokenizer once; None when it cannot be fetched (e.g. offline benchmark runs)."""
+    try:
+        return tiktoken.encoding_for_model('gpt-3.5-turbo')  # Adjust based on your LLM
+    except Exception as e:
+        print(f"[WARNING] Token encoding unavailable, falling back to character budget: {str(e)}")
+        return None
+
+
+def trim_context_to_token_limit(context: str, query: str, max_tokens: int = 4096, reserve: int = 500) -> str:
+    """Trim context so query + context leave ``reserve`` tokens for the response."""
+    encoding = _get_token_encoding()
+    if encoding is None:
+        # Roughly four characters per token for English text
+        available_chars = max(0, (max_tokens - reserve) * 4 - len(query))
+        return context[:available_chars]
+
+    available_tokens = max(0, max_tokens - len(encoding.encode(query)) - reserve)
+    context_tokens = encoding.encode(context)
+    if len(context_tokens) > available_tokens:
+        print(f"[DEBUG] Trimmed context to fit within token limit: {available_tokens} tokens")
+        return encoding.decode(context_tokens[:available_tokens])
+    return context
+
+# Query rephrasings embedded and searched separately; results are pooled
+QUERY_PROMPT_TEMPLATES = [
+    "{query}",
+    "Information about: {query}",
+    "Details regarding: {query}",
+    "Find content related to: {query}",
+]
+
+def build_query_prompts(query: str, fan_out: Optional[int] = None) -> List[str]:
+    """Return the first ``fan_out`` query rephrasings (all of them by default)."""
+    templates = QUERY_PROMPT_TEMPLATES[:fan_out] if fan_out else QUERY_PROMPT_TEMPLATES
+    return [template.format(query=query) for template in templates]
 
 def search_knowledge_base(query: str, business_id: str, top_k: int = 20, min_similarity: float = 0.4) -> List[Dict[str, Any]]:
     print(f"\n[DEBUG] Searching knowledge base for query: {query}")
@@ -15,12 +59,7 @@ def search_knowledge_base(query: str, business_id: str, top_k: int = 20, min_sim
     print(f"[DEBUG] Minimum similarity threshold: {min_similarity}")
 
     query_embeddings = []
-    prompts = [
-        query,
-        f"Information about: {query}",
-        f"Details regarding: {query}",
-        f"Find content related to: {query}"
-    ]
+    prompts = build_query_prompts(query)
     
     for prompt in prompts:
         embedding = generate_embedding(prompt)
@@ -134,6 +173,50 @@ TASK_TEMPLATES = {
 
 import traceback  # Add this import at the top
 
+def build_business_system_prompt(business: Business) -> str:
+    """
+    System prompt for chats about ``business``.
+
+    Only contains data that is stable between turns (serialised deterministically), so
+    consecutive requests share a byte-identical prefix.
+    """
+    profile = {
+        "profile": {
+            "name": business.business_name,
+            "category": business.category,
+            "location": business.address,
+            "website": business.website_url,
+            "phone": business.phone_number,
+            "verification_status": 'Verified' if business.is_verified else 'Not Verified',
+            "profile_completion": f"{business.calculate_profile_completion()}%",
+        },
+        "automation_settings": {
+            "posts": business.posts_automation,
+            "reviews": business.reviews_automation,
+            "qa": business.qa_automation,
+        },
+        "content_sources": [
+            {"type": "file", "name": doc.file_name}
+            for doc in business.knowledge_files.filter(deleted_at__isnull=True).order_by('id')
+        ],
+    }
+    return (
+        "You are an AI assistant for a business automation platform. "
+        "Use the following business profile and the knowledge base context supplied with each "
+        "question to craft your response.\n\n"
+        f"BUSINESS PROFILE:\n{json.dumps(profile, indent=2, sort_keys=True, default=str)}\n\n"
+        "Response Requirements:\n"
+        "- Prioritize information from the knowledge base\n"
+        "- Maintain professional tone matching business profile\n"
+        "- Acknowledge uncertainties clearly\n"
+        "- Cite sources from knowledge base when possible"
+    )
+
+# What answer_question returns when it could not answer; never worth posting publicly
+BUSINESS_NOT_FOUND = "Business not found"
+ANSWER_FAILED = "I apologize, but I encountered an error while trying to answer your question."
+FAILED_ANSWERS = (BUSINESS_NOT_FOUND, ANSWER_FAILED)
+
 def answer_question(query: str, business_id: str, chat_history: List[Dict[str, str]] = None) -> str:
     print(f"\n[INFO] Starting RAG process for query: '{query}'")
     try:
@@ -148,7 +231,7 @@ def answer_question(query: str, business_id: str, chat_history: List[Dict[str, s
             print(f"[DEBUG] Found business: {business.business_name}")
         except Business.DoesNotExist:
             print(f"[ERROR] No business found with ID: {business_id}")
-            return "Business not found"
+            return BUSINESS_NOT_FOUND
 
         # Get relevant context
         context = get_relevant_context(query, business_id)
@@ -156,107 +239,29 @@ def answer_question(query: str, business_id: str, chat_history: List[Dict[str, s
         # Ensure context is not empty
         if not context.strip():
             context = "No relevant context found in the knowledge base."
-        # Prepare business context
-        business_context = (
-            f"Name: {business.business_name}\n"
-            f"Category: {business.category}\n"
-            f"Location: {business.address}\n"
-            f"Website: {business.website_url}\n"
-            f"Phone: {business.phone_number}\n"
-            f"Verification Status: {'Verified' if business.is_verified else 'Not Verified'}\n"
-            f"Profile Completion: {business.calculate_profile_completion()}%\n"
-        )
 
         # Trim context to fit within token limit
-        encoding = tiktoken.encoding_for_model('gpt-3.5-turbo')  # Adjust based on your LLM
-        max_tokens = 4096  # Max tokens for gpt-3.5-turbo
-        query_tokens = len(encoding.encode(query))
-        context_tokens = len(encoding.encode(context))
-        available_tokens = max_tokens - query_tokens - 500  # Reserve tokens for response and overhead
-
-        if context_tokens > available_tokens:
-            # Trim context to fit within token limit
-            trimmed_context = encoding.decode(encoding.encode(context)[:available_tokens])
-            print(f"[DEBUG] Trimmed context to fit within token limit: {available_tokens} tokens")
-        else:
-            trimmed_context = context
-
-        # Assemble the full context
-        full_context = (
-            f"You are an AI assistant for a business automation platform. "
-            f"Use the following information to craft your response:\n\n"
-            f"1. BUSINESS PROFILE:\n{business_context}\n\n"
-            f"2. KNOWLEDGE BASE:\n{trimmed_context}\n\n"
-            f"3. CHAT HISTORY:\nNo previous chat history.\n\n"
-            "Response Requirements:\n"
-            "- Prioritize information from the knowledge base\n"
-            "- Maintain professional tone matching business profile\n"
-            "- Acknowledge uncertainties clearly\n"
-            "- Cite sources from knowledge base when possible"
-        )
+        trimmed_context = trim_context_to_token_limit(context, query)
 
-        # Trim context to fit within token limit
-        encoding = tiktoken.encoding_for_model('gpt-3.5-turbo')  # Adjust based on your LLM
-        max_tokens = 4096  # Max tokens for gpt-3.5-turbo
-        query_tokens = len(encoding.encode(query))
-        context_tokens = len(encoding.encode(context))
-        available_tokens = max_tokens - query_tokens - 500  # Reserve tokens for response and overhead
-
-        if context_tokens > available_tokens:
-            # Trim context to fit within token limit
-            trimmed_context = encoding.decode(encoding.encode(context)[:available_tokens])
-            print(f"[DEBUG] Trimmed context to fit within token limit: {available_tokens} tokens")
-        else:
-            trimmed_context = context
+        # The business profile is the same on every turn, so it goes in the system prompt where
+        # the model server can reuse its cached prefix; the per-query knowledge base context
+        # travels with the question instead
         print("[INFO] Building context for LLM response...")
-        business_context = {
-            "profile": {
-                "name": business.business_name,
-                "category": business.category,
-                "location": business.address,
-                "website": business.website_url,
-                "phone": business.phone_number,
-                "verification_status": 'Verified' if business.is_verified else 'Not Verified',
-                "profile_completion": f"{business.calculate_profile_completion()}%",
-            },
-            "automation_settings": {
-                "posts": business.posts_automation,
-                "reviews": business.reviews_automation,
-                "qa": business.qa_automation,
-            },
-            # Assuming you have a way to get summaries
-            "content_sources": [
-                {"type": "file", "name": doc.file_name, "summary": getattr(doc, 'summary', 'No summary available')}
-                for doc in business.knowledge_files.all()
-            ]
-        }
-
-        full_context = (
-            f"{business_context}\n\n"
+        system_prompt = build_business_system_prompt(business)
+        turn_context = (
             f"📚 Knowledge Base Context:\n"
             f"{'-' * 40}\n"
-            f"{trimmed_context}\n\n"
-            f"💬 Recent Chat Context:\n"
-            f"{'-' * 40}\n"
+            f"{trimmed_context}"
         )
 
-        # Add recent chat context
-        if chat_history:
-            recent_chats = chat_history[-5:]  # Get last 5 exchanges
-            chat_context = []
-            for msg in recent_chats:
-                prefix = "👤 User:" if msg['role'] == 'user' else "🤖 Assistant:"
-                chat_context.append(f"{prefix} {msg['content']}")
-            full_context += '\n'.join(chat_context)
-        else:
-            full_context += "No previous chat history.\n"
-
-        print("[DEBUG] Final context length:", len(full_context))
-        print("[DEBUG] Full context:\n", full_context)
+        print("[DEBUG] System prompt length:", len(system_prompt))
+        print("[DEBUG] Turn context length:", len(turn_context))
 
         # Generate response using chat history
-        response = generate_response(query, full_context, chat_history)
+        response = generate_response(query, turn_context, chat_history, system_prompt=system_prompt)
         print("[DEBUG] Generated response:", response)
+        if not response or response.startswith(MODEL_ERROR_REPLY):
+            return ANSWER_FAILED
 
         # Store the interaction in chat history
         if chat_history is not None:
@@ -272,7 +277,109 @@ def answer_question(query: str, business_id: str, chat_history: List[Dict[str, s
     except Exception as e:
         print(f"[ERROR] Exception in answer_question: {str(e)}")
         traceback.print_exc()  # This will print the stack trace
-        return "I apologize, but I encountered an error while trying to answer your question."
+        return ANSWER_FAILED
+
+def _parse_reply_array(text: str, expected: int) -> List[Optional[str]]:
+    """
+    Pull replies out of a JSON array answer. Items are decoded one at a time so a reply
+    cut off by the token limit only loses the unfinished items; anything missing or
+    malformed comes back as None.
+    """
+    replies = [None] * expected
+    start = text.find('[')
+    if start == -1:
+        return replies
+
+    decoder = json.JSONDecoder()
+    position = start + 1
+    item_number = 0
+    while position < len(text):
+        while position < len(text) and text[position] in ' \t\r\n,':
+            position += 1
+        if position >= len(text) or text[position] == ']':
+            break
+        try:
+            item, position = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            break
+
+        if isinstance(item, str):
+            index, reply = item_number, item
+        elif isinstance(item, dict):
+            index, reply = item.get('index', item_number + 1), item.get('reply')
+            index = index - 1 if isinstance(index, int) else None  # prompt numbers reviews from 1
+        else:
+            index, reply = None, None
+        if index is not None and 0 <= index < expected and isinstance(reply, str) and reply.strip():
+            replies[index] = reply.strip()
+        item_number += 1
+    return replies
+
+def generate_review_responses(reviews: List[Dict[str, Any]], business_id: str,
+                              batch_size: Optional[int] = None) -> List[Optional[str]]:
+    """
+    Generate replies for many reviews of one business, in input order; None where no
+    reply could be generated.
+
+    Reviews are dicts with ``rating`` and ``content``. The knowledge base is searched once
+    for the whole set, and each LLM call answers up to ``batch_size`` reviews as a JSON
+    array. Reviews missing from the array fall back to a single-review call that uses the
+    same context.
+    """
+    if not reviews:
+        return []
+    batch_size = batch_size or settings.REVIEW_REPLY_BATCH_SIZE
+    business = Business.objects.get(business_id=business_id)
+
+    retrieval_query = "Customer review feedback: " + " ".join(
+        (review.get('content') or '')[:200] for review in reviews[:batch_size]
+    )
+    context = get_relevant_context(retrieval_query, business_id)
+    if not context.strip():
+        context = "No relevant context found in the knowledge base."
+    knowledge = (
+        f"📚 Knowledge Base Context:\n"
+        f"{'-' * 40}\n"
+        f"{trim_context_to_token_limit(context, retrieval_query)}"
+    )
+    system_prompt = build_business_system_prompt(business)
+
+    replies = []
+    for offset in range(0, len(reviews), batch_size):
+        batch = reviews[offset:offset + batch_size]
+        listing = json.dumps([
+            {'index': number, 'rating': review.get('rating'), 'review': review.get('content') or ''}
+            for number, review in enumerate(batch, 1)
+        ], ensure_ascii=False, indent=1)
+        instructions = (
+            f"Write a reply to each of the {len(batch)} customer reviews below. "
+            "Maintain a professional tone, address the specific feedback and offer a solution if needed. "
+            "Return ONLY a valid JSON array with one object per review, in the same order: "
+            '[{"index": 1, "reply": "..."}]\n\n'
+            f"Reviews:\n{listing}"
+        )
+
+        start_time = time.time()
+        batch_replies = _parse_reply_array(
+            generate_response(instructions, knowledge, None, system_prompt=system_prompt) or '', len(batch)
+        )
+        fallbacks = 0
+        for review, reply in zip(batch, batch_replies):
+            if reply is None:
+                fallbacks += 1
+                reply = generate_response(
+                    "Generate an appropriate professional response to this review: " + (review.get('content') or ''),
+                    f"{knowledge}\n\nReview rating: {review.get('rating')}/5",
+                    None,
+                    system_prompt=system_prompt
+                )
+                if reply and reply.startswith(MODEL_ERROR_REPLY):
+                    reply = None
+            replies.append(reply)
+        print(f"[INFO] Generated {len(batch)} review replies for {business_id} in "
+              f"{time.time() - start_time:.2f}s ({fallbacks} needed a single-review fallback)")
+
+    return replies
 
 def add_to_knowledge_base(business_id: str, question: str, answer: str) -> Optional[FAQ]:
     """Add new QA pair to knowledge base"""
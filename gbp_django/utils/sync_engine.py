@@ -0,0 +1,169 @@
+"""
+Incremental sync of a location's reviews, questions, posts and media.
+
+Each (business, resource) pair keeps a SyncWatermark holding the newest
+``updateTime`` stored so far. Reviews and questions are listed newest-first
+(``orderBy=updateTime desc``) and listing stops at the first item older than the
+watermark, so a steady-state run costs one page plus the changes. Posts and media
+cannot be ordered by the API; their pages are still listed, but only items newer
+than the watermark are handed to the store functions.
+
+The next page token is saved after every page, so a run interrupted by quota or
+a worker restart resumes where it stopped instead of starting over.
+"""
+import logging
+import re
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import requests
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..api.media_management import iter_photos, store_photos
+from ..api.post_management import iter_posts, store_posts
+from ..api.qa_management import iter_questions, store_questions_and_answers
+from ..api.review_management import iter_reviews, store_reviews
+from ..models import SyncWatermark
+
+logger = logging.getLogger(__name__)
+
+
+class SyncResource(NamedTuple):
+    iterate: Callable  # (access_token, account_id, location_id, page_size, params) -> pages
+    store: Callable  # (page, business_id) -> {'created', 'updated', 'unchanged'}
+    items_key: str
+    page_size: int
+    ordered: bool  # the API can list newest-first by updateTime
+
+
+RESOURCES: Dict[str, SyncResource] = {
+    'reviews': SyncResource(iter_reviews, store_reviews, 'reviews', 50, True),
+    'questions': SyncResource(iter_questions, store_questions_and_answers, 'questions', 10, True),
+    'posts': SyncResource(iter_posts, store_posts, 'localPosts', 100, False),
+    'media': SyncResource(iter_photos, store_photos, 'mediaItems', 100, False),
+}
+
+
+LOCATION_NAME_RE = re.compile(r'(?:accounts/(?P<account>[^/]+)/)?locations/(?P<location>[^/]+)')
+
+
+def location_path_ids(business) -> Tuple[str, str]:
+    """
+    (account id, location id) for v4 paths of a business. Locations imported from the
+    Business Information API carry no account, in which case Google's "-" wildcard is used.
+    """
+    match = LOCATION_NAME_RE.search(business.google_location_id or business.business_id or '')
+    if not match:
+        raise ValueError(f"Business {business.business_id} is not linked to a Google location")
+    account = match.group('account') or (business.google_account_id or '').split('/')[-1] or '-'
+    return account, match.group('location')
+
+
+def item_update_time(item: Dict):
+    """When the item last changed at Google (media items only have a createTime)"""
+    value = item.get('updateTime') or item.get('createTime')
+    return parse_datetime(value) if value else None
+
+
+def sync_resource(business, name: str, access_token: str, account_id: str, location_id: str) -> Dict:
+    """
+    Bring one resource of a location up to date and advance its watermark.
+    Returns metrics of the run; raises on API failure, keeping the saved progress.
+    """
+    spec = RESOURCES[name]
+    watermark, _ = SyncWatermark.objects.get_or_create(business=business, resource=name)
+    since = watermark.last_update_time
+    resumed = bool(watermark.page_token)
+    params = {'orderBy': 'updateTime desc'} if spec.ordered else {}
+    if resumed:
+        params['pageToken'] = watermark.page_token
+
+    started = time.monotonic()
+    fetched = stored = 0
+    oldest_change = None
+    try:
+        pages = spec.iterate(access_token, account_id, location_id, spec.page_size, params)
+        for page in pages:
+            items = page.get(spec.items_key, [])
+            fetched += len(items)
+            # Items without an updateTime can't be compared, so they are always stored
+            fresh = [(item, t) for item, t in ((item, item_update_time(item)) for item in items)
+                     if since is None or t is None or t >= since]
+            if fresh:
+                counts = spec.store({spec.items_key: [item for item, _ in fresh]}, business.id)
+                stored += counts['created'] + counts['updated']
+            known = [t for _, t in fresh if t is not None]
+            if known:
+                oldest_change = min(known + ([oldest_change] if oldest_change else []))
+                if not watermark.pending_update_time or max(known) > watermark.pending_update_time:
+                    watermark.pending_update_time = max(known)
+
+            reached_known = spec.ordered and since is not None and len(fresh) < len(items)
+            watermark.page_token = '' if reached_known else page.get('nextPageToken', '')
+            watermark.save(update_fields=['page_token', 'pending_update_time', 'updated_at'])
+            if reached_known:
+                break
+    except requests.exceptions.HTTPError as e:
+        if resumed and e.response is not None and e.response.status_code == 400:
+            # Saved page tokens don't live forever; start the listing again
+            logger.info(f"Page token for {name} of {location_id} was rejected; restarting the listing")
+            watermark.page_token = ''
+            watermark.save(update_fields=['page_token', 'updated_at'])
+            return sync_resource(business, name, access_token, account_id, location_id)
+        raise
+
+    now = timezone.now()
+    candidates = [t for t in (since, watermark.pending_update_time) if t]
+    watermark.last_update_time = max(candidates) if candidates else None
+    watermark.pending_update_time = None
+    watermark.page_token = ''
+    watermark.last_synced_at = now
+    watermark.last_duration = time.monotonic() - started
+    watermark.last_fetched = fetched
+    watermark.last_stored = stored
+    # Only meaningful once there was a previous sync to measure from
+    watermark.lag_seconds = (now - oldest_change).total_seconds() if since and oldest_change else None
+    watermark.save()
+
+    metrics = {'fetched': fetched, 'stored': stored, 'duration': watermark.last_duration,
+               'lag_seconds': watermark.lag_seconds}
+    logger.info(f"Synced {name} of {location_id}: {metrics}")
+    return metrics
+
+
+def sync_location(business, account_id: str, location_id: str, access_token: Optional[str] = None,
+                  resources: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+    """
+    Incrementally sync the given resources (default: all) of a location. A failed
+    resource is reported under its name with an ``error`` and doesn't stop the rest.
+    """
+    from .token_manager import get_access_token
+
+    access_token = access_token or get_access_token(business.user_id)
+    results = {}
+    for name in resources or RESOURCES:
+        try:
+            results[name] = sync_resource(business, name, access_token, account_id, location_id)
+        except Exception as e:
+            logger.error(f"Syncing {name} of {location_id} failed: {e}")
+            results[name] = {'error': str(e)}
+    return results
+
+
+def sync_lag_report(businesses: Optional[List] = None) -> List[Dict]:
+    """Per business and resource: when it last synced, how long it took and the lag observed"""
+    watermarks = SyncWatermark.objects.select_related('business').order_by('business_id', 'resource')
+    if businesses is not None:
+        watermarks = watermarks.filter(business__in=businesses)
+    return [{
+        'business_id': w.business.business_id,
+        'resource': w.resource,
+        'last_synced_at': w.last_synced_at,
+        'last_update_time': w.last_update_time,
+        'duration': w.last_duration,
+        'fetched': w.last_fetched,
+        'stored': w.last_stored,
+        'lag_seconds': w.lag_seconds,
+        'in_progress': bool(w.page_token),
+    } for w in watermarks]
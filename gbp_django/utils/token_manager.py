@@ -0,0 +1,189 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Tokens this close to expiry are treated as already expired
+EXPIRY_SKEW = 30
+
+TokenEntry = Tuple[str, float]  # (access token, expiry as a unix timestamp)
+
+
+class TokenUnavailable(Exception):
+    """The user has no usable Google access token and it could not be refreshed."""
+
+
+def token_cache_key(user_id) -> str:
+    return f"gbp:oauth:token:{user_id}"
+
+
+def refresh_lock_key(user_id) -> str:
+    return f"gbp:oauth:refresh-lock:{user_id}"
+
+
+def _usable(entry: Optional[TokenEntry], margin: float = EXPIRY_SKEW) -> bool:
+    return bool(entry) and entry[1] - time.time() > margin
+
+
+class TokenManager:
+    """
+    Hands out Google access tokens per user without a database read on the hot path.
+    Tokens live in process memory and in the shared cache (Redis when REDIS_URL is
+    set), so a refresh made by any web or worker process is seen by all of them.
+
+    A token within GBP_TOKEN_REFRESH_MARGIN seconds of expiry is still returned while
+    a background thread refreshes it; an unknown or expired token is refreshed inline.
+    Refreshes are single-flight per user: a thread lock inside the process and a
+    cache lock across processes, with everyone else waiting for the winner's token.
+    """
+
+    def __init__(self):
+        self._tokens: Dict[int, TokenEntry] = {}
+        self._locks: Dict[int, threading.Lock] = {}
+        self._refreshing = set()
+        self._guard = threading.Lock()
+
+    def get_token(self, user_id) -> str:
+        """A valid access token for the user; raises TokenUnavailable"""
+        entry = self._lookup(user_id)
+        if _usable(entry, settings.GBP_TOKEN_REFRESH_MARGIN):
+            return entry[0]
+        if _usable(entry):
+            self._refresh_in_background(user_id)
+            return entry[0]
+        return self.refresh(user_id)
+
+    def store(self, user_id, access_token: str, expires_at) -> None:
+        """Remember a token, e.g. one just obtained by the OAuth callback"""
+        if isinstance(expires_at, datetime):
+            expires_at = expires_at.timestamp()
+        entry = (access_token, float(expires_at))
+        with self._guard:
+            self._tokens[user_id] = entry
+        cache.set(token_cache_key(user_id), entry, max(1, int(expires_at - time.time())))
+
+    def invalidate(self, user_id) -> None:
+        """Forget the user's token, e.g. after Google rejected it"""
+        with self._guard:
+            self._tokens.pop(user_id, None)
+        cache.delete(token_cache_key(user_id))
+
+    def refresh(self, user_id, force: bool = False) -> str:
+        """
+        Get a fresh token for the user, coalescing with any refresh already in flight.
+        Unless ``force`` is set, a token someone else refreshed meanwhile is reused.
+        """
+        with self._user_lock(user_id):
+            before = self._lookup(user_id)
+            if not force and _usable(before, settings.GBP_TOKEN_REFRESH_MARGIN):
+                return before[0]
+            if cache.add(refresh_lock_key(user_id), 1, settings.GBP_TOKEN_REFRESH_LOCK_TIMEOUT):
+                try:
+                    return self._refresh_from_google(user_id, use_stored=not force)
+                finally:
+                    cache.delete(refresh_lock_key(user_id))
+            return self._wait_for_refresh(user_id, before)
+
+    def _lookup(self, user_id) -> Optional[TokenEntry]:
+        with self._guard:
+            entry = self._tokens.get(user_id)
+        if _usable(entry, settings.GBP_TOKEN_REFRESH_MARGIN):
+            return entry
+        # Another process may already have refreshed it
+        shared = cache.get(token_cache_key(user_id))
+        if shared and (not entry or shared[1] > entry[1]):
+            with self._guard:
+                self._tokens[user_id] = entry = tuple(shared)
+        return entry
+
+    def _user_lock(self, user_id) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(user_id, threading.Lock())
+
+    def _wait_for_refresh(self, user_id, before: Optional[TokenEntry]) -> str:
+        deadline = time.monotonic() + settings.GBP_TOKEN_REFRESH_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            entry = cache.get(token_cache_key(user_id))
+            if entry and tuple(entry) != before and _usable(entry):
+                with self._guard:
+                    self._tokens[user_id] = tuple(entry)
+                return entry[0]
+        raise TokenUnavailable(f"Timed out waiting for another process to refresh the token of user {user_id}")
+
+    def _refresh_from_google(self, user_id, use_stored: bool = True) -> str:
+        from ..api.authentication import refresh_access_token
+
+        user = get_user_model().objects.only(
+            'google_access_token', 'google_refresh_token', 'google_token_expiry'
+        ).get(pk=user_id)
+        # Cold cache: the token saved at login (or by another process) may still be good
+        if use_stored and user.google_access_token and user.google_token_expiry:
+            stored = (user.google_access_token, user.google_token_expiry.timestamp())
+            if _usable(stored, settings.GBP_TOKEN_REFRESH_MARGIN):
+                self.store(user_id, *stored)
+                return stored[0]
+        if not user.google_refresh_token:
+            raise TokenUnavailable(f"User {user_id} has no Google refresh token")
+
+        try:
+            data = refresh_access_token(user.google_refresh_token, settings.GOOGLE_OAUTH2_CLIENT_ID,
+                                        settings.GOOGLE_OAUTH2_CLIENT_SECRET)
+        except requests.exceptions.RequestException as e:
+            raise TokenUnavailable(f"Refreshing the token of user {user_id} failed: {e}") from e
+
+        expires_at = timezone.now() + timedelta(seconds=data.get('expires_in', 3600))
+        updates = {'google_access_token': data['access_token'], 'google_token_expiry': expires_at}
+        if data.get('refresh_token'):
+            updates['google_refresh_token'] = data['refresh_token']
+        get_user_model().objects.filter(pk=user_id).update(**updates)
+        self.store(user_id, data['access_token'], expires_at)
+        logger.info(f"Refreshed Google access token for user {user_id}; expires {expires_at.isoformat()}")
+        return data['access_token']
+
+    def _refresh_in_background(self, user_id) -> None:
+        with self._guard:
+            if user_id in self._refreshing:
+                return
+            self._refreshing.add(user_id)
+
+        def run():
+            try:
+                self.refresh(user_id)
+            except Exception as e:
+                logger.warning(f"Background token refresh for user {user_id} failed: {e}")
+            finally:
+                with self._guard:
+                    self._refreshing.discard(user_id)
+                connection.close()  # threads get their own DB connection
+
+        threading.Thread(target=run, name=f"token-refresh-{user_id}", daemon=True).start()
+
+
+_manager: Optional[TokenManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_token_manager() -> TokenManager:
+    """Process-wide token manager, created on first use"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = TokenManager()
+    return _manager
+
+
+def get_access_token(user_id) -> str:
+    """A valid Google access token for the user; raises TokenUnavailable"""
+    return get_token_manager().get_token(user_id)
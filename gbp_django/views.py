@@ -29,8 +29,10 @@ from .models import (
     User, Post, QandA, Review, FAQ, Business, Notification, Task
 )
 from .api.authentication import get_access_token, get_user_info
+from .api.client import GBPClient
 from .api.business_management import (
-    store_business_data, get_locations, get_user_locations, update_business_details, get_account_details
+    store_business_data, get_locations, get_user_locations, get_account_details,
+    LOCATION_EDIT_FIELDS, location_changes
 )
 from .utils.model_interface import get_llm_model
 from .utils.rag_utils import answer_question, add_to_knowledge_base
@@ -39,6 +41,8 @@ from .utils.website_scraper import scrape_and_summarize_website
 from .utils.embeddings import update_business_embedding
 from .utils.file_processor import store_file_content, process_folder
 from .utils.email_service import EmailService
+from .utils.token_manager import get_access_token as get_user_access_token, get_token_manager
+from .utils.location_edits import pending_edit_state, queue_location_edit, queued_fields
 
 
 def send_verification_email(business):
@@ -292,11 +296,7 @@ def google_oauth_callback(request):
 
         # Validate the access token scopes
         print("[INFO] Validating OAuth token scopes...")
-        token_info_response = requests.get(
-            'https://www.googleapis.com/oauth2/v3/tokeninfo',
-            params={'access_token': access_token}
-        )
-        token_info = token_info_response.json()
+        token_info = GBPClient().get('oauth', 'tokeninfo', params={'access_token': access_token}).json()
         print(f"[DEBUG] Token Info: {json.dumps(token_info, indent=2)}")
         scopes = token_info.get('scope', '')
         if 'https://www.googleapis.com/auth/business.manage' not in scopes:
@@ -304,41 +304,6 @@ def google_oauth_callback(request):
             messages.error(request, 'Required permissions not granted. Please authorize the required scopes.')
             return redirect('login')
 
-        # Fetch account details using updated function
-        print("[DEBUG] Fetching account details using get_account_details()")
-        account_data = get_account_details(access_token)
-
-        if 'accounts' in account_data and account_data['accounts']:
-            account_id = account_data['accounts'][0]['name']
-            print(f"[INFO] Found account ID: {account_id}")
-
-            # Fetch locations using updated function
-            print("[DEBUG] Fetching user locations using get_user_locations()")
-            locations_data = get_user_locations(access_token)
-
-            if 'locations' in locations_data:
-                print(f"[INFO] Found {len(locations_data['locations'])} locations")
-                # Store the locations data
-                stored_businesses = store_business_data(locations_data, request.user.id, access_token)
-                if stored_businesses:
-                    print(f"[INFO] Successfully stored {len(stored_businesses)} business(es)")
-                    messages.success(request, f"Successfully linked {len(stored_businesses)} business(es)")
-                else:
-                    print("[INFO] No businesses were stored")
-                    messages.warning(request, "No businesses were found to import")
-            else:
-                print("[INFO] No locations found in response")
-        else:
-            print("[INFO] No accounts found in response")
-            messages.warning(request, "No Google Business Profile account found")
-            return redirect('index')
-    except requests.exceptions.RequestException as e:
-        print(f"[ERROR] Failed to fetch business details: {str(e)}")
-        if hasattr(e, 'response'):
-            print(f"Response status: {e.response.status_code}")
-            print(f"Response body: {e.response.text}")
-            print(f"Response headers: {e.response.headers}")
-
         # Now fetch user info from Google
         print("👤 Fetching Google user info...")
         user_info = get_user_info(access_token)
@@ -356,11 +321,12 @@ def google_oauth_callback(request):
         # Update user details
         user.google_id = google_id
         user.name = user_info.get('name')
-        user.profile_picture_url = user_info.get('picture')
+        user.profile_picture_url = user_info.get('picture') or ''
         user.google_access_token = access_token
         user.google_refresh_token = refresh_token
         user.google_token_expiry = timezone.now() + timedelta(seconds=tokens.get('expires_in', 3600))
         user.save()
+        get_token_manager().store(user.id, access_token, user.google_token_expiry)
 
         # Set the backend attribute
         user.backend = 'django.contrib.auth.backends.ModelBackend'
@@ -369,12 +335,41 @@ def google_oauth_callback(request):
         auth_login(request, user)
         print(f"[DEBUG] User logged in: {user.email}")
 
+        # Fetch the user's locations; a failure here doesn't undo the login
+        locations_data = {}
+        try:
+            print("[DEBUG] Fetching account details using get_account_details()")
+            account_data = get_account_details(access_token, user.id)
+
+            if 'accounts' in account_data and account_data['accounts']:
+                account_id = account_data['accounts'][0]['name']
+                print(f"[INFO] Found account ID: {account_id}")
+
+                # Fetch locations using updated function
+                print("[DEBUG] Fetching user locations using get_user_locations()")
+                locations_data = get_user_locations(access_token, user.id)
+
+                if 'locations' in locations_data:
+                    print(f"[INFO] Found {len(locations_data['locations'])} locations")
+                else:
+                    print("[INFO] No locations found in response")
+            else:
+                print("[INFO] No accounts found in response")
+                messages.warning(request, "No Google Business Profile account found")
+        except requests.exceptions.RequestException as e:
+            print(f"[ERROR] Failed to fetch business details: {str(e)}")
+            if getattr(e, 'response', None) is not None:
+                print(f"Response status: {e.response.status_code}")
+                print(f"Response body: {e.response.text}")
+                print(f"Response headers: {e.response.headers}")
+
         # Store the business data if we found any
-        if 'locations_data' in locals() and locations_data.get('locations'):
-            stored_businesses = store_business_data(locations_data, user.id, access_token)
-            if stored_businesses:
-                print(f"[INFO] Successfully stored {len(stored_businesses)} business(es)")
-                messages.success(request, f"Successfully linked {len(stored_businesses)} business(es)")
+        if locations_data and locations_data.get('locations'):
+            stored = store_business_data(locations_data, user.id, access_token)
+            linked = sum(stored.values())
+            if linked:
+                print(f"[INFO] Successfully stored {linked} business(es): {stored}")
+                messages.success(request, f"Successfully linked {linked} business(es)")
             else:
                 print("[INFO] No businesses were stored")
                 messages.warning(request, "No businesses were found to import")
@@ -410,7 +405,6 @@ import json
 
 from .utils.email_service import EmailService
 from .models import Notification, Business, KnowledgeFile
-from .api.business_management import update_business_details
 
 
 @login_required
@@ -457,7 +451,7 @@ def mark_all_notifications_read(request):
 @login_required
 @require_http_methods(["POST"])
 def handle_compliance_update(request):
-    """Handle compliance form submissions using FallbackGBPAgent"""
+    """Handle compliance form submissions: queued API edits, FallbackGBPAgent for hours and category"""
     try:
         data = json.loads(request.body)
         business_id = data.get('business_id')
@@ -468,7 +462,17 @@ def handle_compliance_update(request):
             return JsonResponse({'status': 'error', 'message': 'Missing required fields'}, status=400)
 
         business = Business.objects.get(business_id=business_id, user=request.user)
-        
+
+        # Fields the Business Information API can write go through the edit queue
+        queued_fields = {'website': 'website_url'}
+        if field in queued_fields:
+            queue_location_edit(business, {queued_fields[field]: value}, source='compliance')
+            return JsonResponse({
+                'status': 'success',
+                'message': 'Update queued for Google',
+                'pending': pending_edit_state(business)
+            })
+
         # Configure browser automation
         chrome_path = "/usr/bin/chromium"  # Common chromium path
         cookies_folder = os.path.join(os.path.dirname(__file__), "browser_cookies")
@@ -485,7 +489,6 @@ def handle_compliance_update(request):
 
         # Update business model and execute browser automation
         update_mapping = {
-            'website': ('website_url', 'https://business.google.com/'),
             'hours': ('business_hours', ''),
             'category': ('category', '')
         }
@@ -541,7 +544,8 @@ def get_time_ago(timestamp):
 def update_business(request, business_id):
     """
     Update business details. If the business ID starts with 'dummy-business-', restrict updates
-    until verification is completed. Otherwise, attempt to update both Google and local DB.
+    until verification is completed. Otherwise, update the local DB and queue the fields that
+    differ from the last-synced copy for Google (utils.location_edits).
     """
     if business_id.startswith('dummy-business-'):
         return JsonResponse({
@@ -563,58 +567,44 @@ def update_business(request, business_id):
                 'message': f'Missing required fields: {", ".join(missing_fields)}'
             }, status=400)
 
-        # Attempt to update on Google side
-        try:
-            update_business_details(
-                access_token=request.user.google_access_token,
-                account_id=business.business_id,
-                location_id=business.business_id,
-                update_data=data
-            )
-        except requests.exceptions.RequestException as e:
-            # Log the error details
-            print(f"API Error: {str(e)}")
-            if hasattr(e, 'response') and e.response is not None and hasattr(e.response, 'json'):
-                error_details = e.response.json()
-                print(f"Error details: {error_details}")
-
-            return JsonResponse({
-                'status': 'error',
-                'message': 'Failed to update Google Business Profile. Please check the API logs for details.'
-            }, status=400)
-
-        # Update local database fields
-        business.business_name = data.get('business_name', business.business_name)
-        business.address = data.get('address', business.address)
-        business.phone_number = data.get('phone', business.phone_number)
-        business.website_url = data.get('website', business.website_url)
-        business.category = data.get('category', business.category)
-
         # Update website summary if URL changed
-        old_website_url = business.website_url
         new_website_url = data.get('website')
-        if new_website_url and new_website_url != old_website_url:
+        if new_website_url and new_website_url != business.website_url:
             try:
-                summary = scrape_and_summarize_website(new_website_url)
-                business.website_summary = summary
+                business.website_summary = scrape_and_summarize_website(new_website_url)
             except Exception as e:
                 print(f"Error scraping website: {e}")
                 business.website_summary = "Error scraping website"
 
-        business.save()
-
-        # Retrieve updated business
-        updated_business = Business.objects.get(business_id=business_id, user=request.user)
+        # Fields that differ from what Google last had are queued for it; a worker
+        # pushes them, so the request doesn't wait on the API
+        changes = location_changes(business, data)
+        # A field set back to Google's value still replaces the one already queued
+        edited = queued_fields(business) | {field for field, _, _ in changes}
+        submitted = {field: data[key] for field, key, _ in LOCATION_EDIT_FIELDS if key in data and field in edited}
+        local_changed = False
+        # Category is saved locally only; it can't be written by display name
+        for field, key in [(field, key) for field, key, _ in LOCATION_EDIT_FIELDS] + [('category', 'category')]:
+            if key in data and getattr(business, field) != data[key]:
+                setattr(business, field, data[key])
+                local_changed = True
+        if submitted:
+            queue_location_edit(business, submitted, source='update_business')
+        elif local_changed:
+            business.save()
 
         return JsonResponse({
             'status': 'success',
+            'changed': [mask for _, _, mask in changes],
+            'pending': pending_edit_state(business),
             'data': {
-                'business_name': updated_business.business_name,
-                'address': updated_business.address,
-                'phone': updated_business.phone_number,
-                'website': updated_business.website_url,
-                'category': updated_business.category,
-                'website_summary': updated_business.website_summary
+                'business_name': business.business_name,
+                'address': business.address,
+                'phone': business.phone_number,
+                'website': business.website_url,
+                'category': business.category,
+                # Not a stored field; only present when the website just changed
+                'website_summary': getattr(business, 'website_summary', None)
             }
         })
 
@@ -636,6 +626,17 @@ def update_business(request, business_id):
         }, status=500)
 
 
+@login_required
+@require_http_methods(["GET"])
+def business_pending_edits(request, business_id):
+    """State of the business's edits queued for Google, for the UI to show"""
+    try:
+        business = Business.objects.get(business_id=business_id, user=request.user)
+    except Business.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Business not found'}, status=404)
+    return JsonResponse({'status': 'success', 'pending': pending_edit_state(business)})
+
+
 def dismiss_notification(request, notification_id):
     """
     Mark a specific notification as read/acknowledged by ID.
@@ -1482,19 +1483,20 @@ def get_verification_status(request, business_id):
             return JsonResponse(status)
 
         # For real businesses, fetch data from Google
-        access_token = request.user.google_access_token
+        access_token = get_user_access_token(request.user.id)
         # Fetch and store business data
         print("🔍 Fetching locations from Google API...")
-        locations_data = get_user_locations(access_token)
+        locations_data = get_user_locations(access_token, request.user.id)
         print("✅ Locations API call successful")
 
         if locations_data and locations_data.get('locations'):
             # Convert locations data into the format expected by store_business_data
             business_data = {'locations': locations_data['locations']}
-            stored_businesses = store_business_data(business_data, request.user.id, access_token)
-            if stored_businesses:
-                print(f"✅ Successfully stored {len(stored_businesses)} business(es)")
-                messages.success(request, f"Successfully linked {len(stored_businesses)} business(es)")
+            stored = store_business_data(business_data, request.user.id, access_token)
+            linked = sum(stored.values())
+            if linked:
+                print(f"✅ Successfully stored {linked} business(es): {stored}")
+                messages.success(request, f"Successfully linked {linked} business(es)")
             else:
                 print("⚠️ No businesses were stored")
                 messages.warning(request, "No businesses were found to import")
@@ -1526,11 +1528,12 @@ def ensure_user_businesses(user):
     if user.google_access_token:
         try:
             from .api.business_management import get_user_locations, store_business_data
-            locations_data = get_user_locations(user.google_access_token)
+            access_token = get_user_access_token(user.id)
+            locations_data = get_user_locations(access_token, user.id)
             if locations_data and locations_data.get('locations'):
-                stored = store_business_data(locations_data, user.id, user.google_access_token)
-                if stored:
-                    print(f"[DEBUG] Created {len(stored)} business(es) from OAuth data for user {user.email}.")
+                stored = store_business_data(locations_data, user.id, access_token)
+                if sum(stored.values()):
+                    print(f"[DEBUG] Stored business(es) from OAuth data for user {user.email}: {stored}")
                     return
             else:
                 print("[DEBUG] No locations found from OAuth API.")